@@ -0,0 +1,105 @@
+import os
+
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+class DockerActuator:
+    def __init__(self, docker_client):
+        self.docker_client = docker_client
+        self.frozen = set()
+
+    def set_cpuset(self, name: str, cpuset_cpus: str) -> None:
+        self.docker_client.api.update_container(name, cpuset_cpus=cpuset_cpus)
+
+    def pause(self, name: str) -> None:
+        self.docker_client.api.pause(name)
+
+    def unpause(self, name: str) -> None:
+        self.docker_client.api.unpause(name)
+
+    # docker keeps the authoritative cpuset, nothing cached here
+    def cpuset(self, name: str):
+        return None
+
+
+class CgroupActuator:
+    def __init__(self, docker_client, cgroup_root=CGROUP_ROOT, proc_root="/proc", fallback=None):
+        self.docker_client = docker_client
+        self.cgroup_root = cgroup_root
+        self.proc_root = proc_root
+        self.fallback = fallback if fallback is not None else DockerActuator(docker_client)
+        self.paths = dict()
+        # writes to cpuset.cpus / cgroup.freeze are invisible to docker, so remember them here
+        self.cpusets = dict()
+        self.frozen = set()
+
+    def _candidates(self, container_id: str, pid: int) -> list:
+        candidates = []
+        if pid:
+            try:
+                with open(os.path.join(self.proc_root, str(pid), "cgroup"), "r") as f:
+                    for line in f:
+                        if line.startswith("0::"):
+                            candidates.append(line[3:].strip().lstrip("/"))
+            except FileNotFoundError:
+                pass
+        # systemd cgroup driver first, then the cgroupfs driver
+        candidates.append(f"system.slice/docker-{container_id}.scope")
+        candidates.append(f"docker/{container_id}")
+        return candidates
+
+    # resolved once per container; None while the container has no cgroup yet (not started)
+    def cgroup_path(self, name: str):
+        if name in self.paths:
+            return self.paths[name]
+
+        info = self.docker_client.api.inspect_container(name)
+        for rel_path in self._candidates(info["Id"], info["State"].get("Pid", 0)):
+            path = os.path.join(self.cgroup_root, rel_path)
+            if os.path.isfile(os.path.join(path, "cpuset.cpus")):
+                self.paths[name] = path
+                return path
+        return None
+
+    def _write(self, name: str, filename: str, value: str) -> bool:
+        path = self.cgroup_path(name)
+        if path is None:
+            return False
+        try:
+            with open(os.path.join(path, filename), "w") as f:
+                f.write(value)
+        except OSError as e:
+            print(f"cgroup write to {filename} for {name} failed, falling back to docker: {e}")
+            self.paths.pop(name, None)
+            return False
+        return True
+
+    def set_cpuset(self, name: str, cpuset_cpus: str) -> None:
+        if not self._write(name, "cpuset.cpus", cpuset_cpus):
+            self.fallback.set_cpuset(name, cpuset_cpus)
+        self.cpusets[name] = cpuset_cpus
+
+    def pause(self, name: str) -> None:
+        if self._write(name, "cgroup.freeze", "1"):
+            self.frozen.add(name)
+        else:
+            self.fallback.pause(name)
+
+    def unpause(self, name: str) -> None:
+        if name in self.frozen and self._write(name, "cgroup.freeze", "0"):
+            self.frozen.discard(name)
+        else:
+            self.fallback.unpause(name)
+
+    def cpuset(self, name: str):
+        return self.cpusets.get(name)
+
+
+def make_actuator(backend: str, docker_client):
+    match backend:
+        case "docker":
+            return DockerActuator(docker_client)
+        case "cgroup":
+            return CgroupActuator(docker_client)
+    raise ValueError(f"unknown actuation backend {backend}")
@@ -0,0 +1,96 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
+
+
+class AsyncController:
+    # period is the control and logging tick (controller.CONTROL_PERIOD), the sampler keeps its own rate
+    def __init__(self, controller, max_concurrent_jobs: int = 2, period: float = 1):
+        self.controller = controller
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.period = period
+
+        # one worker per job supervisor plus sampling, memcached management and logging
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_jobs + 3, thread_name_prefix="controller")
+        # the Controller and its logger are not thread safe, actuation and log writes go through this
+        self.controller_lock = asyncio.Lock()
+        self.cpu_per_core = []
+        self.running_jobs = set()
+        self.done = asyncio.Event()
+
+    async def run_blocking(self, fn, *args, exclusive=False):
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args)
+        if not exclusive:
+            return await loop.run_in_executor(self.executor, call)
+        async with self.controller_lock:
+            return await loop.run_in_executor(self.executor, call)
+
+    def _read_cpu(self) -> list:
+        if self.controller.sampler is not None:
+            return self.controller.sampler.ewma()
+        return psutil.cpu_percent(interval=None, percpu=True)
+
+    async def sample_cpu(self):
+        while not self.done.is_set():
+            self.cpu_per_core = await self.run_blocking(self._read_cpu)
+            await asyncio.sleep(self.period)
+
+    async def manage_memcached(self):
+        while not self.done.is_set():
+            if self.cpu_per_core:
+                await self.run_blocking(self.controller.control_step, sorted(self.running_jobs),
+                                        self.cpu_per_core, exclusive=True)
+            await asyncio.sleep(self.period)
+
+    async def log_cpu(self):
+        memcached = self.controller.get_job_from_container_name("memcached")
+        while not self.done.is_set():
+            if self.cpu_per_core:
+                await self.run_blocking(self.controller.logger.log_cpu_utilisation, memcached,
+                                        self.cpu_per_core, exclusive=True)
+            await asyncio.sleep(self.period)
+
+    # event-driven controllers block here until the job exits or a period passes, others poll once
+    def _has_exited(self, job_name: str) -> bool:
+        if self.controller.state is not None:
+            return self.controller.state.wait_for_exit(job_name, timeout=self.period)
+        return self.controller.docker_client.containers.get(job_name).status == "exited"
+
+    async def supervise_job(self, job_name: str, slots: asyncio.Semaphore):
+        try:
+            # waiting for the image must not hold the controller lock
+            await self.run_blocking(self.controller.wait_until_provisioned, job_name)
+            await self.run_blocking(self.controller.start_job, job_name, exclusive=True)
+            self.running_jobs.add(job_name)
+            while not await self.run_blocking(self._has_exited, job_name):
+                if self.controller.state is None:
+                    await asyncio.sleep(self.period)
+            self.running_jobs.discard(job_name)
+            await self.run_blocking(self.controller.end_job, job_name, exclusive=True)
+        finally:
+            slots.release()
+
+    async def run_jobs(self):
+        slots = asyncio.Semaphore(self.max_concurrent_jobs)
+        supervisors = []
+        for job_name in self.controller.container_info:
+            await slots.acquire()
+            supervisors.append(asyncio.create_task(self.supervise_job(job_name, slots)))
+        await asyncio.gather(*supervisors)
+
+    async def run(self):
+        start_time = await self.run_blocking(self.controller.prepare_run)
+        psutil.cpu_percent(interval=None, percpu=True)
+
+        background = [asyncio.create_task(task()) for task in (self.sample_cpu, self.manage_memcached, self.log_cpu)]
+        try:
+            await self.run_jobs()
+        finally:
+            self.done.set()
+            await asyncio.gather(*background, return_exceptions=True)
+
+        await self.run_blocking(self.controller.finish_run, start_time)
+        self.executor.shutdown()
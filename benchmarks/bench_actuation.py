@@ -0,0 +1,78 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import actuation
+
+
+CPUSETS = ["2,3", "1,2,3"]
+
+
+class FakeDockerApi:
+    def __init__(self):
+        self.inspects = 0
+
+    def inspect_container(self, name):
+        self.inspects += 1
+        return {"Id": f"{name}-id", "State": {"Pid": 0}}
+
+
+class FakeDockerClient:
+    def __init__(self):
+        self.api = FakeDockerApi()
+
+
+def make_fake_cgroupfs(root: str, names: list) -> None:
+    for name in names:
+        path = os.path.join(root, "system.slice", f"docker-{name}-id.scope")
+        os.makedirs(path)
+        for filename, value in [("cpuset.cpus", ""), ("cgroup.freeze", "0")]:
+            with open(os.path.join(path, filename), "w") as f:
+                f.write(value)
+
+
+def bench(actuator, name: str, iterations: int) -> list:
+    latencies = []
+    for i in range(iterations):
+        begin = time.perf_counter()
+        actuator.set_cpuset(name, CPUSETS[i % len(CPUSETS)])
+        latencies.append(time.perf_counter() - begin)
+    return latencies
+
+
+def report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"{label:>8}: mean {statistics.mean(latencies) * 1e6:9.1f} us  "
+          f"p50 {statistics.median(latencies) * 1e6:9.1f} us  p99 {p99 * 1e6:9.1f} us  (n={len(latencies)})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--docker-container", default=None,
+                        help="Also time the docker backend against this (running) container")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        make_fake_cgroupfs(root, ["canneal"])
+        client = FakeDockerClient()
+        cgroup = actuation.CgroupActuator(client, cgroup_root=root)
+        report("cgroup", bench(cgroup, "canneal", args.iterations))
+        print(f"cgroup path resolved with {client.api.inspects} inspect call(s)")
+
+    if args.docker_container is not None:
+        import docker
+        docker_actuator = actuation.DockerActuator(docker.from_env())
+        report("docker", bench(docker_actuator, args.docker_container, min(args.iterations, 200)))
+    else:
+        print("  docker: skipped, pass --docker-container NAME on a host running dockerd")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import cluster
+import k8s_watch
+
+
+JOB = """apiVersion: batch/v1
+kind: Job
+metadata:
+  name: bench-{i}
+  labels:
+    bench: cluster
+spec:
+  template:
+    spec:
+      containers:
+      - image: busybox
+        name: bench
+        command: ["/bin/sh", "-c", "time true"]
+      restartPolicy: Never
+"""
+
+
+def bench(c: cluster.Cluster, jobs: int, batch: bool) -> None:
+    manifests = [JOB.format(i=i) for i in range(jobs)]
+    if batch:
+        c.create_many(manifests)
+    else:
+        for manifest in manifests:
+            c.create(manifest)
+    for i in range(jobs):
+        c.get("jobs", f"bench-{i}")
+        for pod in c.pod_names(f"job-name=bench-{i}"):
+            c.logs(pod)
+    c.delete_all("jobs", "bench=cluster")
+    c.report()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--real", action="store_true", default=False,
+                        help="Run against the cluster of the current kubeconfig instead of a fake API server "
+                             "(through the API and a fake kubectl), also through kubectl if it is installed")
+    args = parser.parse_args()
+
+    if not args.real:
+        server = k8s_watch.FakeApiServer()
+        server.start()
+        # a process per call through a fake kubectl that talks to the same server, for the subprocess cost
+        fake_kubectl = [sys.executable, cluster.__file__, server.url]
+        backends = [("api", cluster.ApiBackend(server.url)), ("kubectl", cluster.KubectlBackend(command=fake_kubectl))]
+        for name, backend in backends:
+            for batch in (False, True):
+                print(f"\nfake API server, {name}, {'one batch' if batch else 'one call per job'}")
+                bench(cluster.Cluster(backend), args.jobs, batch)
+        server.stop()
+        return
+
+    backends = [("api", cluster.Cluster(cluster.ApiBackend.from_kubeconfig()))]
+    if shutil.which("kubectl") is not None:
+        backends.append(("kubectl", cluster.Cluster(cluster.KubectlBackend())))
+    for name, c in backends:
+        print(f"\n{name}")
+        bench(c, args.jobs, batch=True)
+
+
+if __name__ == "__main__":
+    main()
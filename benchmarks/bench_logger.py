@@ -0,0 +1,49 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import scheduler_logger
+
+
+CPU = [87.5, 100.0, 99.0, 98.5]
+
+
+def bench(logger, events: int) -> tuple:
+    # per-event cost seen by the control loop, and the total including the final write
+    latencies = []
+    begin = time.perf_counter()
+    for _ in range(events):
+        t = time.perf_counter()
+        logger.log_cpu_utilisation(scheduler_logger.Job.MEMCACHED, CPU)
+        latencies.append(time.perf_counter() - t)
+    logger.end()
+    return latencies, time.perf_counter() - begin
+
+
+def report(label: str, latencies: list, total: float) -> None:
+    latencies = sorted(latencies)
+    p99 = latencies[int(0.99 * (len(latencies) - 1))]
+    print(f"{label:>14}: mean {statistics.mean(latencies) * 1e9:7.0f} ns  p50 {statistics.median(latencies) * 1e9:7.0f} ns  "
+          f"p99 {p99 * 1e9:7.0f} ns  total {total * 1e3:7.1f} ms  (n={len(latencies)})")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        for label, make in [("text", lambda path: scheduler_logger.SchedulerLogger(path)),
+                            ("buffered text", lambda path: scheduler_logger.BufferedSchedulerLogger(path)),
+                            ("buffered jsonl", lambda path: scheduler_logger.BufferedSchedulerLogger(path, log_format="jsonl"))]:
+            path = os.path.join(root, label.replace(" ", "-") + ".log")
+            report(label, *bench(make(path), args.events))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import remote
+
+
+VMS = ["client-agent-a", "client-agent-b", "client-measure"]
+
+
+def setup(pool, vm: str, commands: int) -> None:
+    pool.put(vm, "update_mcperf.sh")
+    for _ in range(commands):
+        pool.run(vm, "true")
+    pool.get(vm, "~/results.txt", os.devnull)
+
+
+def bench(pool, commands: int, concurrent: bool) -> float:
+    begin = time.perf_counter()
+    if concurrent:
+        pool.parallel(*[lambda vm=vm: setup(pool, vm, commands) for vm in VMS])
+    else:
+        for vm in VMS:
+            setup(pool, vm, commands)
+    took = time.perf_counter() - begin
+    pool.report()
+    pool.close()
+    return took
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=4, help="Remote commands per VM")
+    parser.add_argument("--connect-cost", type=float, default=0.5,
+                        help="Seconds the fake transport charges for a new connection")
+    parser.add_argument("--command-cost", type=float, default=0.02,
+                        help="Seconds the fake transport charges for a command over an open connection")
+    parser.add_argument("--ssh-host", default=None,
+                        help="Run against this ssh host (e.g. a local sshd) instead of the fake transport")
+    args = parser.parse_args()
+
+    def pool(multiplexed: bool) -> remote.RemotePool:
+        if args.ssh_host is not None:
+            return remote.RemotePool(multiplexed=True, addresses={vm: args.ssh_host for vm in VMS})
+        return remote.RemotePool(multiplexed=multiplexed,
+                                 runner=remote.FakeRunner(args.connect_cost, args.command_cost))
+
+    results = []
+    if args.ssh_host is None:
+        results.append(("gcloud", bench(pool(False), args.commands, concurrent=False)))
+    results.append(("multiplexed", bench(pool(True), args.commands, concurrent=False)))
+    results.append(("parallel", bench(pool(True), args.commands, concurrent=True)))
+    for label, took in results:
+        print(f"{label:>12}: {took:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
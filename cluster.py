@@ -0,0 +1,394 @@
+import base64
+import http.client
+import json
+import os
+import queue
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import k8s_watch
+
+
+# Cluster operations for the experiment drivers. ApiBackend talks to the API server over a pool of
+# keep-alive connections instead of starting a kubectl process (and a TLS handshake) per call;
+# KubectlBackend is the fallback when the kubeconfig cannot be used directly. Both take manifests as
+# text, so rendered templates never have to be written to disk.
+
+KINDS = {"Pod": "pods", "Job": "jobs", "Service": "services"}
+# safe to send twice, a failed one is retried once even if the server may have seen it
+IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE"}
+
+
+def load_manifest(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def manifest_meta(manifest: str) -> tuple:
+    # (kind, metadata.name) of a block style manifest like the templates in this repo
+    kind, name = None, None
+    in_metadata, metadata_indent = False, None
+    for line in manifest.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#") or stripped == "---":
+            continue
+        indent = len(line) - len(line.lstrip())
+        key, _, value = stripped.partition(":")
+        if indent == 0:
+            in_metadata = key == "metadata"
+            if key == "kind":
+                kind = value.strip().strip("\"'")
+            continue
+        if in_metadata:
+            metadata_indent = indent if metadata_indent is None else metadata_indent
+            if indent == metadata_indent and key == "name" and name is None:
+                name = value.strip().strip("\"'")
+    if kind not in KINDS or name is None:
+        raise ValueError(f"cannot tell the kind and name of manifest:\n{manifest}")
+    return kind, name
+
+
+class ApiBackend:
+    def __init__(self, server: str, ssl_context: ssl.SSLContext = None, headers: dict = None,
+                 namespace: str = "default", max_workers: int = 8):
+        url = urllib.parse.urlparse(server)
+        self.https = url.scheme == "https"
+        self.host = url.hostname
+        self.port = url.port or (443 if self.https else 80)
+        self.ssl_context = ssl_context
+        self.headers = headers if headers is not None else dict()
+        self.namespace = namespace
+        # idle connections, the last one returned is reused first
+        self.connections = queue.LifoQueue()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    @classmethod
+    def from_kubeconfig(cls, path: str = None, namespace: str = "default"):
+        # the admin kubeconfig kops writes: client certificate, bearer token or basic auth
+        import yaml
+        path = path or os.environ.get("KUBECONFIG", "~/.kube/config").split(os.pathsep)[0]
+        with open(os.path.expanduser(path)) as f:
+            config = yaml.safe_load(f)
+
+        def named(section: str, name: str) -> dict:
+            return next(entry[section[:-1]] for entry in config[section] if entry["name"] == name)
+
+        context = named("contexts", config["current-context"])
+        server_config = named("clusters", context["cluster"])
+        user = named("users", context["user"])
+
+        ssl_context = None
+        if server_config["server"].startswith("https"):
+            ssl_context = ssl.create_default_context()
+            if "certificate-authority-data" in server_config:
+                ssl_context.load_verify_locations(
+                    cadata=base64.b64decode(server_config["certificate-authority-data"]).decode())
+            elif "certificate-authority" in server_config:
+                ssl_context.load_verify_locations(cafile=server_config["certificate-authority"])
+            if server_config.get("insecure-skip-tls-verify"):
+                ssl_context.check_hostname = False
+                ssl_context.verify_mode = ssl.CERT_NONE
+
+        headers = dict()
+        if "client-certificate-data" in user:
+            # load_cert_chain only reads files
+            with tempfile.TemporaryDirectory() as tmp:
+                cert, key = os.path.join(tmp, "cert.pem"), os.path.join(tmp, "key.pem")
+                with open(cert, "wb") as f:
+                    f.write(base64.b64decode(user["client-certificate-data"]))
+                with open(key, "wb") as f:
+                    f.write(base64.b64decode(user["client-key-data"]))
+                ssl_context.load_cert_chain(cert, key)
+        elif "client-certificate" in user:
+            ssl_context.load_cert_chain(user["client-certificate"], user["client-key"])
+        elif "token" in user:
+            headers["Authorization"] = f"Bearer {user['token']}"
+        elif "username" in user:
+            credentials = base64.b64encode(f"{user['username']}:{user['password']}".encode()).decode()
+            headers["Authorization"] = f"Basic {credentials}"
+        else:
+            raise ValueError(f"unsupported kubeconfig user {context['user']}")
+        return cls(server_config["server"], ssl_context, headers, namespace)
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        if self.https:
+            return http.client.HTTPSConnection(self.host, self.port, context=self.ssl_context)
+        return http.client.HTTPConnection(self.host, self.port)
+
+    def _collection(self, resource: str) -> str:
+        return k8s_watch.COLLECTIONS[resource].format(namespace=self.namespace)
+
+    def _request(self, method: str, path: str, body=None, content_type: str = "application/json",
+                 missing_ok: bool = False):
+        headers = dict(self.headers, Accept="application/json")
+        if body is not None:
+            headers["Content-Type"] = content_type
+            body = body.encode() if isinstance(body, str) else body
+        for attempt in range(2):
+            try:
+                connection = self.connections.get_nowait()
+                pooled = True
+            except queue.Empty:
+                connection = self._new_connection()
+                pooled = False
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                # the server closed an idle pooled connection before answering: nothing was applied,
+                # any request can go again on a fresh one. Past that a POST may already have been,
+                # only idempotent requests are retried
+                stale = pooled and isinstance(e, (http.client.RemoteDisconnected, BrokenPipeError))
+                if attempt == 1 or not (stale or method in IDEMPOTENT_METHODS):
+                    raise
+                continue
+            self.connections.put(connection)
+            break
+
+        if response.status == 404 and missing_ok:
+            return None
+        if response.status >= 400:
+            try:
+                message = json.loads(data)["message"]
+            except (ValueError, KeyError):
+                message = data.decode(errors="replace")
+            raise RuntimeError(f"{method} {path}: {response.status} {message}")
+        return json.loads(data) if data else None
+
+    def create(self, manifest: str) -> dict:
+        kind, _ = manifest_meta(manifest)
+        # the API server takes yaml as it is
+        return self._request("POST", self._collection(KINDS[kind]), manifest, "application/yaml")
+
+    def create_many(self, manifests: list) -> list:
+        return list(self.executor.map(self.create, manifests))
+
+    def get(self, resource: str, name: str):
+        return self._request("GET", f"{self._collection(resource)}/{name}", missing_ok=True)
+
+    def list(self, resource: str, selector: str = None) -> list:
+        query = "?" + urllib.parse.urlencode({"labelSelector": selector}) if selector else ""
+        return self._request("GET", self._collection(resource) + query)["items"]
+
+    def delete(self, resource: str, name: str) -> None:
+        # Background: a job's pods are deleted with it, like kubectl delete does
+        self._request("DELETE", f"{self._collection(resource)}/{name}",
+                      json.dumps({"propagationPolicy": "Background"}), missing_ok=True)
+
+    def delete_all(self, resource: str, selector: str = None) -> None:
+        query = "?" + urllib.parse.urlencode({"labelSelector": selector}) if selector else ""
+        self._request("DELETE", self._collection(resource) + query, json.dumps({"propagationPolicy": "Background"}))
+
+    def stream_logs(self, pod: str):
+        # on a connection of its own, the log can be long
+        connection = self._new_connection()
+        try:
+            connection.request("GET", f"{self._collection('pods')}/{pod}/log", headers=self.headers)
+            response = connection.getresponse()
+            if response.status >= 400:
+                raise RuntimeError(f"logs of {pod}: {response.status} {response.read().decode(errors='replace')}")
+            for line in response:
+                yield line.decode()
+        finally:
+            connection.close()
+
+    def expose(self, pod: str, service: str, port: int, service_type: str = "ClusterIP", protocol: str = "TCP") -> dict:
+        # kubectl expose pod: a service selecting the pod's labels
+        labels = self.get("pods", pod)["metadata"]["labels"]
+        manifest = {"apiVersion": "v1", "kind": "Service", "metadata": {"name": service},
+                    "spec": {"type": service_type, "selector": labels,
+                             "ports": [{"port": port, "targetPort": port, "protocol": protocol}]}}
+        return self._request("POST", self._collection("services"), json.dumps(manifest))
+
+
+def json_objects(output: str) -> list:
+    # kubectl -o json prints one object per created resource back to back, not a List
+    decoder = json.JSONDecoder()
+    objects, i = [], 0
+    while True:
+        while i < len(output) and output[i].isspace():
+            i += 1
+        if i == len(output):
+            return objects
+        obj, i = decoder.raw_decode(output, i)
+        objects += obj["items"] if obj.get("kind") == "List" else [obj]
+
+
+class KubectlBackend:
+    # command: how to run kubectl, e.g. the fake one below for benchmarks
+    def __init__(self, env: dict = None, command: list = None):
+        self.env = env
+        self.command = command or ["kubectl"]
+
+    def _kubectl(self, args: list, manifest: str = None) -> str:
+        return subprocess.run(self.command + args, input=manifest, env=self.env, text=True,
+                              check=True, stdout=subprocess.PIPE).stdout
+
+    def create(self, manifest: str) -> dict:
+        return json.loads(self._kubectl(["create", "-f", "-", "-o", "json"], manifest))
+
+    def create_many(self, manifests: list) -> list:
+        # one kubectl process for the whole batch
+        return json_objects(self._kubectl(["create", "-f", "-", "-o", "json"], "\n---\n".join(manifests)))
+
+    def get(self, resource: str, name: str):
+        output = self._kubectl(["get", resource, name, "-o", "json", "--ignore-not-found"])
+        return json.loads(output) if output.strip() else None
+
+    def list(self, resource: str, selector: str = None) -> list:
+        return json.loads(self._kubectl(["get", resource, "-o", "json"] + (["-l", selector] if selector else [])))["items"]
+
+    def delete(self, resource: str, name: str) -> None:
+        self._kubectl(["delete", resource, name, "--ignore-not-found"])
+
+    def delete_all(self, resource: str, selector: str = None) -> None:
+        self._kubectl(["delete", resource] + (["-l", selector] if selector else ["--all"]))
+
+    def stream_logs(self, pod: str):
+        process = subprocess.Popen(self.command + ["logs", pod], env=self.env, text=True, stdout=subprocess.PIPE)
+        try:
+            yield from process.stdout
+        finally:
+            process.stdout.close()
+            if process.wait() != 0:
+                raise RuntimeError(f"kubectl logs {pod} exited with {process.returncode}")
+
+    def expose(self, pod: str, service: str, port: int, service_type: str = "ClusterIP", protocol: str = "TCP") -> dict:
+        return json.loads(self._kubectl(["expose", "pod", pod, "--name", service, "--type", service_type,
+                                         "--port", str(port), "--protocol", protocol, "-o", "json"]))
+
+
+class Cluster:
+    # the operations the drivers use, timed per operation
+    def __init__(self, backend):
+        self.backend = backend
+        self.timings = defaultdict(list)
+
+    def _timed(self, operation: str, call, *args):
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            self.timings[operation].append(time.perf_counter() - start)
+
+    def create(self, manifest: str) -> dict:
+        return self._timed("create", self.backend.create, manifest)
+
+    def create_many(self, manifests: list) -> list:
+        return self._timed("create_many", self.backend.create_many, manifests)
+
+    def get(self, resource: str, name: str):
+        return self._timed("get", self.backend.get, resource, name)
+
+    def list(self, resource: str, selector: str = None) -> list:
+        return self._timed("list", self.backend.list, resource, selector)
+
+    # the API returns as soon as the deletion started; like kubectl delete, wait until the objects are
+    # gone so the next run can create them under the same names
+    def _wait_gone(self, remaining, timeout: float = 300, poll: float = 0.5) -> None:
+        deadline = time.monotonic() + timeout
+        while remaining():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"objects still terminating after {timeout} s")
+            time.sleep(poll)
+
+    def delete(self, resource: str, name: str, wait: bool = True) -> None:
+        def delete():
+            self.backend.delete(resource, name)
+            if wait:
+                self._wait_gone(lambda: self.backend.get(resource, name) is not None)
+        self._timed("delete", delete)
+
+    def delete_all(self, resource: str, selector: str = None, wait: bool = True) -> None:
+        def delete_all():
+            self.backend.delete_all(resource, selector)
+            if wait:
+                self._wait_gone(lambda: len(self.backend.list(resource, selector)) > 0)
+        self._timed("delete_all", delete_all)
+
+    def expose(self, pod: str, service: str, port: int, service_type: str = "ClusterIP", protocol: str = "TCP") -> dict:
+        return self._timed("expose", self.backend.expose, pod, service, port, service_type, protocol)
+
+    def logs(self, pod: str) -> str:
+        return self._timed("logs", lambda: "".join(self.backend.stream_logs(pod)))
+
+    def pod_names(self, selector: str) -> list:
+        return [pod["metadata"]["name"] for pod in self.list("pods", selector)]
+
+    def report(self) -> None:
+        print(f"cluster operations ({type(self.backend).__name__}):")
+        for operation, timings in sorted(self.timings.items()):
+            print(f"{operation:>12}: {len(timings):4d} calls, mean {sum(timings) / len(timings) * 1000:7.1f} ms, "
+                  f"total {sum(timings):6.2f} s")
+
+
+def make_cluster(backend: str = "api", api_server: str = None, env: dict = None) -> Cluster:
+    match backend:
+        case "api":
+            if api_server is not None:
+                return Cluster(ApiBackend(api_server))
+            try:
+                return Cluster(ApiBackend.from_kubeconfig())
+            except (ImportError, OSError, KeyError, StopIteration, ValueError, ssl.SSLError) as e:
+                print(f"cannot use the kubeconfig directly ({e!r}), falling back to kubectl")
+                return Cluster(KubectlBackend(env))
+        case "kubectl":
+            return Cluster(KubectlBackend(env))
+        case _:
+            raise ValueError(f"unknown cluster backend {backend}")
+
+
+def fake_kubectl(server: str, args: list) -> None:
+    # the subset of kubectl the backend runs, against an API server without discovery or kubeconfig
+    # (k8s_watch.FakeApiServer); a process per call like kubectl, for benchmarking the subprocess path
+    api = ApiBackend(server)
+    options, flags, positional = dict(), set(), []
+    i = 0
+    while i < len(args):
+        if args[i] in ("-f", "-o", "-l", "--name", "--type", "--port", "--protocol"):
+            options[args[i]] = args[i + 1]
+            i += 2
+            continue
+        if args[i].startswith("--"):
+            flags.add(args[i])
+        else:
+            positional.append(args[i])
+        i += 1
+    command, rest = positional[0], positional[1:]
+    selector = options.get("-l")
+    match command:
+        case "create":
+            for manifest in sys.stdin.read().split("\n---\n"):
+                print(json.dumps(api.create(manifest), indent=4))
+        case "get" if len(rest) == 2:
+            obj = api.get(*rest)
+            if obj is None and "--ignore-not-found" not in flags:
+                raise SystemExit(f'Error from server (NotFound): {rest[0]} "{rest[1]}" not found')
+            if obj is not None:
+                print(json.dumps(obj, indent=4))
+        case "get":
+            print(json.dumps({"apiVersion": "v1", "kind": "List", "items": api.list(rest[0], selector)}, indent=4))
+        case "delete" if len(rest) == 2:
+            api.delete(*rest)
+        case "delete":
+            api.delete_all(rest[0], selector)
+        case "logs":
+            for line in api.stream_logs(rest[0]):
+                sys.stdout.write(line)
+        case "expose":
+            print(json.dumps(api.expose(rest[1], options["--name"], int(options["--port"]),
+                                        options.get("--type", "ClusterIP"), options.get("--protocol", "TCP")), indent=4))
+        case _:
+            raise SystemExit(f"fake kubectl: unsupported command {command}")
+
+
+if __name__ == "__main__":
+    fake_kubectl(sys.argv[1], sys.argv[2:])
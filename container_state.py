@@ -0,0 +1,183 @@
+import queue
+import threading
+import time
+
+
+# docker event action -> container status as reported by `docker ps`
+EVENT_STATUS = {
+    "create": "created",
+    "start": "running",
+    "unpause": "running",
+    "pause": "paused",
+    "die": "exited",
+}
+
+
+class ContainerState:
+    def __init__(self, name: str, status: str, cpuset_cpus: str):
+        self.name = name
+        self.status = status
+        self.cpuset_cpus = cpuset_cpus or ""
+        self.updated_ns = time.time_ns()
+        self.exit_code = None
+
+
+class DockerEventSource:
+    def __init__(self, docker_client):
+        self.docker_client = docker_client
+        self._stream = None
+
+    # subscribes right away, not on the first next(), so no event after this call is missed
+    def __iter__(self):
+        self._stream = self.docker_client.events(decode=True, filters={"type": "container"})
+        return iter(self._stream)
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+
+
+class FakeEventSource:
+    # stands in for the docker daemon: whatever is emitted here reaches the tracker
+    # in the same shape as the dicts returned by docker_client.events(decode=True)
+    def __init__(self):
+        self._events = queue.Queue()
+
+    def emit(self, action: str, name: str, **attributes) -> None:
+        attributes["name"] = name
+        self._events.put({
+            "Type": "container",
+            "Action": action,
+            "Actor": {"ID": name, "Attributes": attributes},
+            "timeNano": time.time_ns(),
+        })
+
+    def __iter__(self):
+        while True:
+            event = self._events.get()
+            if event is None:
+                return
+            yield event
+
+    def close(self):
+        self._events.put(None)
+
+
+class ContainerStateTracker:
+    def __init__(self, event_source, docker_client=None):
+        self.event_source = event_source
+        self.docker_client = docker_client
+        self.containers = dict()
+        self._cond = threading.Condition()
+        self._thread = None
+        # whatever ended the events thread early, None while it runs or after a clean stop
+        self.error = None
+
+    # one list call to seed the view, everything after that comes from events
+    def seed(self, containers=None):
+        if containers is None:
+            containers = self.docker_client.containers.list(all=True)
+        with self._cond:
+            for container in containers:
+                cpuset_cpus = container.attrs['HostConfig'].get('CpusetCpus', '')
+                self.containers[container.name] = ContainerState(container.name, container.status, cpuset_cpus)
+            self._cond.notify_all()
+
+    # subscribes to the events before returning, seed() after start() misses nothing
+    def start(self):
+        events = iter(self.event_source)
+        self._thread = threading.Thread(target=self._run, args=(events,), name="container-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.event_source.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self, events):
+        try:
+            for event in events:
+                self.handle_event(event)
+        except Exception as e:
+            print(f"container events stopped: {e!r}, falling back to polling")
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+
+    # False once the events thread is gone, the view is then no longer kept up to date
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def handle_event(self, event: dict) -> None:
+        if event.get("Type") != "container":
+            return
+        action = event.get("Action", "")
+        attributes = event.get("Actor", {}).get("Attributes", {})
+        name = attributes.get("name")
+        if name is None:
+            return
+
+        cpuset_cpus = attributes.get("cpuset-cpus")
+        if action == "update" and cpuset_cpus is None and self.docker_client is not None:
+            # the update event does not carry the new resources, so re-read just this one, outside
+            # the lock so readers of the state do not wait on the docker API
+            import docker
+            try:
+                container = self.docker_client.containers.get(name)
+                cpuset_cpus = container.attrs['HostConfig'].get('CpusetCpus', '')
+            except (docker.errors.NotFound, docker.errors.APIError) as e:
+                # removed right after the update or the daemon hiccuped, keep the cpuset we recorded
+                print(f"could not re-read {name} after update: {e}")
+
+        with self._cond:
+            if action == "destroy":
+                self.containers.pop(name, None)
+                self._cond.notify_all()
+                return
+
+            state = self.containers.get(name)
+            if state is None:
+                state = ContainerState(name, "created", attributes.get("cpuset-cpus", ""))
+                self.containers[name] = state
+
+            if action in EVENT_STATUS:
+                state.status = EVENT_STATUS[action]
+                if action == "die":
+                    state.exit_code = attributes.get("exitCode")
+            elif action == "update":
+                if cpuset_cpus is not None:
+                    state.cpuset_cpus = cpuset_cpus
+            else:
+                return
+
+            state.updated_ns = event.get("timeNano", time.time_ns())
+            self._cond.notify_all()
+
+    def status(self, name: str):
+        with self._cond:
+            state = self.containers.get(name)
+            return state.status if state is not None else None
+
+    def cpuset(self, name: str) -> str:
+        with self._cond:
+            state = self.containers.get(name)
+            return state.cpuset_cpus if state is not None else ""
+
+    # called by the controller after its own update so reads don't wait for the event
+    def set_cpuset(self, name: str, cpuset_cpus: str) -> None:
+        with self._cond:
+            if name in self.containers:
+                self.containers[name].cpuset_cpus = cpuset_cpus
+
+    def names_with_status(self, status: str) -> list:
+        with self._cond:
+            return [name for name, state in self.containers.items() if state.status == status]
+
+    def containers_on_core(self, core, status="running") -> list:
+        with self._cond:
+            return [name for name, state in self.containers.items()
+                    if state.status == status and str(core) in state.cpuset_cpus]
+
+    def wait_for_exit(self, name: str, timeout: float) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self.status(name) == "exited", timeout=timeout)
@@ -1,63 +1,97 @@
-import sys
+import copy
 import time
+import asyncio
+import argparse
 import subprocess
 
 import docker
 import psutil
 
 import scheduler_logger
+import container_state
+import cpu_sampler
+import memcached_affinity
+import actuation
+import async_controller
+import policies
+import forecasting
+import job_config
+import perf_model
+import provisioning
+import metrics
+import slo_feed
 
 
 MEMCACHED_PROCESS = "memcached"
+CONTROL_PERIOD = 1
 
 
 class Controller:
-    def __init__(self, log_file):
+    def __init__(self, log_file, event_driven=False, sample_period=None, actuation_backend="docker", policy="hysteresis",
+                 forecast_horizon=None, forecast_threshold=60, runtime_csvs=None,
+                 parallel_provisioning=False, metrics_port=None, memcached_cpu_source="host",
+                 mcperf_source=None, slo_ms=slo_feed.SLO_P95_MS, slo_horizon=10,
+                 log_backend="text", log_format="text"):
+        self.metrics = metrics.ControlLoopMetrics()
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = metrics.MetricsServer(self.metrics.registry, metrics_port)
         self.docker_client = docker.from_env()
+        self.actuator = actuation.make_actuator(actuation_backend, self.docker_client)
+        self.sampler = None
+        if sample_period is not None:
+            self.sampler = cpu_sampler.CpuSampler(period=sample_period)
+        self.state = None
+        if event_driven:
+            self.state = container_state.ContainerStateTracker(
+                container_state.DockerEventSource(self.docker_client), self.docker_client)
         self.finished = list()
         self.memcached_single_core = True
         self.memcached_num_cores = 2
-
-        self.logger = scheduler_logger.SchedulerLogger(log_file)
-        self.three_core_jobs = ["blackscholes", "vips", "ferret", "freqmine"]
-
-        self.container_info = {
-            "canneal": {
-                "image": "anakli/cca:parsec_canneal",
-                "cpuset_cpus": "2,3",
-                "num_threads": 2
-            },
-            "blackscholes": {
-                "image": "anakli/cca:parsec_blackscholes",
-                "cpuset_cpus": "1,2,3",
-                "num_threads": 3
-            },
-            "dedup": {
-                "image": "anakli/cca:parsec_dedup",
-                "cpuset_cpus": "2,3",
-                "num_threads": 2
-            },
-            "ferret": {
-                "image": "anakli/cca:parsec_ferret",
-                "cpuset_cpus": "1,2,3",
-                "num_threads": 3
-            },
-            "freqmine": {
-                "image": "anakli/cca:parsec_freqmine",
-                "cpuset_cpus": "1,2,3",
-                "num_threads": 3
-            },
-            "radix": {  # MUST BE ON 2 CORES ONLY, altfel face ca simion
-                "image": "anakli/cca:splash2x_radix",
-                "cpuset_cpus": "2,3",
-                "num_threads": 2
-            },
-            "vips": {
-                "image": "anakli/cca:parsec_vips",
-                "cpuset_cpus": "1,2,3",
-                "num_threads": 3
-            }
-        }
+        self.memcached_affinity = memcached_affinity.MemcachedAffinity(lambda: self._get_main_pid(MEMCACHED_PROCESS))
+        # "process" measures memcached's own threads instead of the busy time of its cores
+        self.memcached_sampler = None
+        if memcached_cpu_source == "process":
+            self.memcached_sampler = cpu_sampler.ProcessCpuSampler(lambda: self._get_main_pid(MEMCACHED_PROCESS),
+                                                                   period=sample_period or CONTROL_PERIOD)
+        self.actuation_times = list()
+
+        self.logger = scheduler_logger.make_logger(log_file, log_backend, log_format)
+        self.three_core_jobs = list(job_config.THREE_CORE_JOBS)
+        # with a live mcperf feed the policy also reacts to the measured tail latency
+        self.slo_feed = None
+        self.slo_horizon = slo_horizon
+        if mcperf_source is not None:
+            self.slo_feed = slo_feed.McperfFeed(mcperf_source)
+        self.policy = policies.make_policy(policy, self.three_core_jobs,
+                                           slo_ms=slo_ms if self.slo_feed is not None else None)
+
+        # decide on memcached cpu forecast_horizon seconds ahead instead of the last sample
+        self.forecast_horizon = forecast_horizon
+        self.forecaster = None
+        if forecast_horizon is not None:
+            self.forecaster = forecasting.HoltForecaster()
+            self.forecast_evaluator = forecasting.ForecastEvaluator(forecast_horizon, forecast_threshold)
+
+        self.container_info = copy.deepcopy(job_config.CONTAINER_INFO)
+        if runtime_csvs:
+            self.plan_jobs(perf_model.PerformanceModel.from_csvs(runtime_csvs))
+
+        self.provisioner = None
+        self.first_job = None
+        if parallel_provisioning:
+            self.provisioner = provisioning.Provisioner(self.docker_client, self.container_info, self.create_container,
+                                                        on_created=self._on_container_created)
+
+
+    # cores 2,3 belong to the batch jobs, core 1 is borrowed from memcached
+    def plan_jobs(self, model: perf_model.PerformanceModel):
+        plan = perf_model.plan_controller_jobs(model, list(self.container_info), ["2", "3"], ["1"])
+        for job_name, placement in plan.items():
+            self.container_info[job_name].update(placement)
+            print(f"planned {job_name}: cores {placement['cpuset_cpus']}, {placement['num_threads']} threads")
+        # updated in place, the policy holds a reference to this list
+        self.three_core_jobs[:] = [job_name for job_name, placement in plan.items() if "1" in placement["cpuset_cpus"]]
 
 
     def get_job_from_container_name(self, container_name: str):
@@ -102,57 +136,68 @@ class Controller:
             return None
 
 
-    def _set_cpu_affinity(self, pid, cpu_list):
+    def _set_cpu_affinity(self, cpu_list):
         try:
-            subprocess.run(
-                ['taskset', '-a', '-p', f'--cpu-list', cpu_list, pid],
-                check=True
-            )
-            print(f"Set CPU affinity of PID {pid} to {cpu_list}")
-        except subprocess.CalledProcessError as e:
+            took = self.memcached_affinity.set_affinity(cpu_list)
+        except OSError as e:
             print(f"Failed to set CPU affinity: {e}")
             return None
 
+        if took is None:
+            print(f"bad pid {self.memcached_affinity.pid}")
+            return None
+        self.actuation_times.append(took)
+        self.metrics.actuation_latency.observe(took, operation="affinity")
+        print(f"Set CPU affinity of PID {self.memcached_affinity.pid} to {cpu_list} in {took * 1000:.3f} ms")
+        self.logger.custom_event(self.get_job_from_container_name("memcached"),
+                                 f"affinity {cpu_list} took {took * 1000:.3f} ms")
+        return took
+
 
     def expand_memcached_to_2_cores(self):
-        pid = self._get_main_pid(MEMCACHED_PROCESS)
         self.memcached_num_cores = 2
+        self.metrics.memcached_cores.set(2)
+        self.metrics.set_cores("memcached", ["0", "1"])
         self.logger.update_cores(self.get_job_from_container_name("memcached"), ["0","1"])
-        if pid and pid != "0":
-            self._set_cpu_affinity(pid, "0-1")
-        else:
-            print(f"bad pid {pid}")
+        self._set_cpu_affinity("0-1")
 
 
     def constrain_memcached_to_1_core(self):
-        pid = self._get_main_pid(MEMCACHED_PROCESS)
         self.memcached_num_cores = 1
+        self.metrics.memcached_cores.set(1)
+        self.metrics.set_cores("memcached", ["0"])
         self.logger.update_cores(self.get_job_from_container_name("memcached"), ["0"])
-        if pid and pid != "0":
-            self._set_cpu_affinity(pid, "0")
-        else:
-            print(f"bad pid {pid}")
+        self._set_cpu_affinity("0")
 
 
     def get_containers_on_core(self, core):
+        if self.state is not None:
+            return self.state.containers_on_core(core)
         result = list()
         for container in self.docker_client.containers.list(filters={"status": "running"}):
-            if str(core) in container.attrs['HostConfig'].get('CpusetCpus', ''):
+            if str(core) in self._listed_cpuset(container):
                 result.append(container.name)
         return result
 
 
     # should only include running containers
     def get_containers_on_corei_not_corej(self, core1, core2):
+        if self.state is not None:
+            return [name for name in self.state.containers_on_core(core1)
+                    if str(core2) not in self.state.cpuset(name)]
         result = list()
         for container in self.docker_client.containers.list(filters={"status": "running"}):
-            if str(core1) in container.attrs['HostConfig'].get('CpusetCpus', '') and not str(core2) in container.attrs['HostConfig'].get('CpusetCpus', ''):
+            cpuset_cpus = self._listed_cpuset(container)
+            if str(core1) in cpuset_cpus and not str(core2) in cpuset_cpus:
                 result.append(container.name)
         return result
 
 
     # should update self.finished
     def gather_finished_containers(self):
+        if self.state is not None:
+            self.finished = self.state.names_with_status("exited")
+            return
         result = list()
         for container in self.docker_client.containers.list(all=True, filters={"status": "exited"}):
             result.append(container.name)
@@ -162,50 +207,107 @@ class Controller:
     # should first check for paused jobs on the core
     # should do nothing if everything is scheduled or finished
     def schedule_next_job(self, core: str):
-        paused_containers = self.docker_client.containers.list(all=True, filters={"status": "paused"})
-        
-        for paused_container in paused_containers:
-            cpu_info = paused_container.attrs['HostConfig']
-            cpuset_cpus = cpu_info.get("CpusetCpus")
-
-            if core in cpuset_cpus:
-                paused_container.unpause()
-                print(f"unpausing container: {paused_container.name}")
-                return
-            
-        for container in self.docker_client.containers.list(all=True):
-            if container.status == "created":
-                container.update(cpuset_cpus=core)
-                container.start()
-                self.logger.job_start(self.get_job_from_container_name(container.name), core.split(","), self.container_info[container.name]["num_threads"])
-                print(f"starting container: {container.name}")
+        for name in self.get_containers_with_status("paused"):
+            if core in self.get_cpuset(name):
+                with self.metrics.actuation_latency.time(operation="unpause"):
+                    self.actuator.unpause(name)
+                print(f"unpausing container: {name}")
                 return
 
+        for name in self.get_containers_with_status("created"):
+            self.update_container(name, core)
+            with self.metrics.docker_latency.time(operation="start"):
+                self.docker_client.api.start(name)
+            self.logger.job_start(self.get_job_from_container_name(name), core.split(","), self.container_info[name]["num_threads"])
+            print(f"starting container: {name}")
+            return
+
+
+    def get_containers_with_status(self, status: str) -> list:
+        if self.state is not None:
+            names = self.state.names_with_status(status)
+        else:
+            names = [c.name for c in self.docker_client.containers.list(all=True, filters={"status": status})]
+        # containers frozen through cgroup.freeze still look running to docker
+        if status == "paused":
+            names += [name for name in self.actuator.frozen if name not in names]
+        elif status == "running":
+            names = [name for name in names if name not in self.actuator.frozen]
+        return names
+
+
+    def get_cpuset(self, container) -> str:
+        cpuset_cpus = self.actuator.cpuset(container)
+        if cpuset_cpus is not None:
+            return cpuset_cpus
+        if self.state is not None:
+            return self.state.cpuset(container)
+        return self.docker_client.containers.get(container).attrs['HostConfig'].get('CpusetCpus', '')
+
+
+    def _listed_cpuset(self, container) -> str:
+        cpuset_cpus = self.actuator.cpuset(container.name)
+        if cpuset_cpus is not None:
+            return cpuset_cpus
+        return container.attrs['HostConfig'].get('CpusetCpus', '')
+
 
     def remove_core(self, container, core):
-        cores = self.docker_client.containers.get(container).attrs['HostConfig'].get('CpusetCpus', '').split(",")
+        cores = self.get_cpuset(container).split(",")
         if str(core) in cores:
             cores.remove(str(core))
             self.logger.update_cores(self.get_job_from_container_name(container), cores)
-            self.docker_client.containers.get(container).update(cpuset_cpus=",".join(cores))
+            self.update_container(container, ",".join(cores))
 
     def add_core(self, container, core):
-        cores = self.docker_client.containers.get(container).attrs['HostConfig'].get('CpusetCpus', '')
+        cores = self.get_cpuset(container)
         if str(core) not in cores:
             new_cores = f"{cores},{core}"
             self.logger.update_cores(self.get_job_from_container_name(container), new_cores.split(","))
             try:
-                self.docker_client.containers.get(container).update(cpuset_cpus=f"{new_cores}")
+                self.update_container(container, new_cores)
             except:
                 print("Something wrong happened. Container might have stopped before adding a core.")
 
 
     def get_per_core_cpu_usage(self) -> list:
-        cpu_per_core = psutil.cpu_percent(interval=1, percpu=True)
+        if self.sampler is not None:
+            # the first usage needs a second /proc/stat read, one sampling period after start
+            if self.sampler.wait_ready(timeout=CONTROL_PERIOD):
+                return self.sampler.ewma()
+            return psutil.cpu_percent(interval=None, percpu=True)
+        if self.state is not None:
+            # the control period was already spent in wait_for_exit, read usage since the last call
+            return psutil.cpu_percent(interval=None, percpu=True)
+        cpu_per_core = psutil.cpu_percent(interval=CONTROL_PERIOD, percpu=True)
         return cpu_per_core
     
 
+    # returns True as soon as the job exited, otherwise after one control period; the sampler
+    # runs at its own rate in the background, control and logging stay at CONTROL_PERIOD
+    def wait_for_job(self, job_name: str) -> bool:
+        if self.state is not None and self.state.is_alive():
+            return self.state.wait_for_exit(job_name, timeout=CONTROL_PERIOD)
+        if self.state is not None or self.sampler is not None:
+            time.sleep(CONTROL_PERIOD)
+        return self.docker_client.containers.get(job_name).status == "exited"
+
+
     def get_memcached_cpu_usage(self, cpu_per_core) -> float:
+        if self.memcached_sampler is not None:
+            if self.sampler is None:
+                # no background sampling, measure since the previous control step
+                self.memcached_sampler.sample()
+                usage = self.memcached_sampler.instantaneous()
+            else:
+                usage = self.memcached_sampler.ewma()
+            if usage is not None:
+                return usage
+        return self.get_memcached_host_cpu_usage(cpu_per_core)
+
+
+    # busy time of memcached's cores, including any batch job sharing them
+    def get_memcached_host_cpu_usage(self, cpu_per_core) -> float:
         if self.memcached_num_cores == 1:
             return cpu_per_core[0]
         else: # memcached has 2 cores: 0,1
@@ -218,14 +320,16 @@ class Controller:
             command[4] = "splash2x"
 
         try:
-            container = self.docker_client.containers.create(
-                image,
-                command=command,
-                name=job_name,
-                cpuset_cpus=cpuset_cpus,
-                detach=True
-            )
+            with self.metrics.docker_latency.time(operation="create"):
+                container = self.docker_client.containers.create(
+                    image,
+                    command=command,
+                    name=job_name,
+                    cpuset_cpus=cpuset_cpus,
+                    detach=True
+                )
             print("Container created, name:", container.name)
+            return container
         except docker.errors.APIError as e:
             print("Docker error:", e.explanation)
 
@@ -241,13 +345,18 @@ class Controller:
     
 
     def update_container(self, job_name: str, cpuset_cpus: str):
-        self.docker_client.containers.get(job_name).update(cpuset_cpus=cpuset_cpus)
+        with self.metrics.actuation_latency.time(operation="cpuset"):
+            self.actuator.set_cpuset(job_name, cpuset_cpus)
+        self.metrics.set_cores(job_name, cpuset_cpus.split(","))
+        if self.state is not None:
+            self.state.set_cpuset(job_name, cpuset_cpus)
 
 
     def pause_container(self, job_name: str):
         print(f"pausing container: {job_name}")
         self.logger.job_pause(self.get_job_from_container_name(job_name))
-        self.docker_client.containers.get(job_name).pause()
+        with self.metrics.actuation_latency.time(operation="pause"):
+            self.actuator.pause(job_name)
 
 
     def pause_containers(self, containers: list[str]):
@@ -258,67 +367,228 @@ class Controller:
     def unpause_container(self, job_name: str):
         print("unpausing")
         self.logger.job_unpause(self.get_job_from_container_name(job_name))
-        self.docker_client.containers.get(job_name).unpause()
+        with self.metrics.actuation_latency.time(operation="unpause"):
+            self.actuator.unpause(job_name)
+
+
+    def _on_container_created(self, container):
+        if self.state is not None:
+            self.state.seed([container])
+
+
+    # blocks until the job's image is pulled and its container exists; no-op without a provisioner
+    def wait_until_provisioned(self, job_name: str):
+        if self.provisioner is None:
+            return
+        self.provisioner.wait_ready(job_name)
+        if self.first_job is None:
+            self.first_job = job_name
+
+
+    def start_job(self, job_name: str):
+        self.wait_until_provisioned(job_name)
+        with self.metrics.docker_latency.time(operation="start"):
+            self.docker_client.api.start(job_name)
+        self.metrics.set_cores(job_name, self.container_info[job_name]["cpuset_cpus"].split(","))
+        self.logger.job_start(self.get_job_from_container_name(job_name),
+                              self.container_info[job_name]["cpuset_cpus"].split(","),
+                              self.container_info[job_name]["num_threads"])
+        print(f"started container for job: {job_name}")
+
+
+    def end_job(self, job_name: str):
+        print(f"job {job_name} finished")
+        self.metrics.set_cores(job_name, [])
+        self.logger.job_end(self.get_job_from_container_name(job_name))
+
+
+    # one policy decision for the jobs currently running; core 1 is shared with the three core jobs
+    def control_step(self, running_jobs: list, cpu_per_core: list):
+        now = time.monotonic()
+        self.metrics.step_started(now)
+        with self.metrics.step_duration.time():
+            memcached_cpu = self.get_memcached_cpu_usage(cpu_per_core)
+            host_memcached_cpu = self.get_memcached_host_cpu_usage(cpu_per_core)
+            demand = memcached_cpu
+            if self.forecaster is not None:
+                demand = self.forecast_memcached_cpu(now, memcached_cpu)
+            self.metrics.memcached_cpu.set(memcached_cpu)
+            self.metrics.memcached_demand.set(demand)
+            self.metrics.memcached_host_cpu.set(host_memcached_cpu)
+            for core, usage in enumerate(cpu_per_core):
+                self.metrics.core_cpu.set(usage, core=core)
+
+            p95_ms, predicted_p95_ms = None, None
+            if self.slo_feed is not None:
+                report = self.slo_feed.latest()
+                if report is not None:
+                    p95_ms = report.p95_ms
+                    predicted_p95_ms = self.slo_feed.predicted_p95(self.slo_horizon)
+                    self.metrics.memcached_p95.set(p95_ms)
+                    self.metrics.memcached_qps.set(report.qps)
+
+            obs = policies.Observation(now, cpu_per_core, demand, self.memcached_num_cores, running_jobs,
+                                       measured_memcached_cpu=memcached_cpu, host_memcached_cpu=host_memcached_cpu,
+                                       p95_ms=p95_ms, predicted_p95_ms=predicted_p95_ms)
+            for action in self.policy.decide(obs):
+                self.metrics.actions.inc(action=action.kind.value)
+                policies.apply_action(self, action)
+
+
+    def forecast_memcached_cpu(self, now: float, memcached_cpu: float) -> float:
+        self.forecaster.update(now, memcached_cpu)
+        predicted = max(0.0, self.forecaster.forecast(self.forecast_horizon))
+
+        num_leads = len(self.forecast_evaluator.lead_times)
+        memcached = self.get_job_from_container_name("memcached")
+        # errors are aggregated into the mae gauge and one summary line at the end, not logged per step
+        if self.forecast_evaluator.observe(now, memcached_cpu, predicted, self.memcached_num_cores):
+            self.metrics.forecast_mae.set(self.forecast_evaluator.mae())
+        if len(self.forecast_evaluator.lead_times) > num_leads:
+            self.logger.custom_event(memcached, f"forecast lead {self.forecast_evaluator.lead_times[-1]:.2f} s")
+        return predicted
+
+
+    def prepare_run(self):
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+            print(f"serving metrics on http://127.0.0.1:{self.metrics_server.port}/metrics")
+        self.metrics.memcached_cores.set(self.memcached_num_cores)
+        self.metrics.set_cores("memcached", ["0", "1"][:self.memcached_num_cores])
+        if self.provisioner is not None:
+            start_time = time.time()
+            if self.state is not None:
+                # containers are seeded one by one as the provisioner creates them
+                self.state.start()
+                self.state.seed()
+            self.provisioner.start()
+        else:
+            self.pull_images()
+            start_time = time.time()
+            self.create_all_containers()
+            if self.state is not None:
+                # subscribe first, a job starting between the list and the subscription is not lost
+                self.state.start()
+                self.state.seed()
+        if self.state is not None:
+            psutil.cpu_percent(interval=None, percpu=True)
+        if self.slo_feed is not None:
+            self.slo_feed.start()
+        if self.sampler is not None:
+            self.sampler.start()
+            if self.memcached_sampler is not None:
+                self.memcached_sampler.start()
+        elif self.memcached_sampler is not None:
+            self.memcached_sampler.sample()
+        return start_time
+
+
+    def finish_run(self, start_time):
+        end_time = time.time()
+        print(f"took {end_time - start_time} seconds")
+        if self.provisioner is not None:
+            self.provisioner.wait_all()
+            self.provisioner.report(self.first_job)
+        if self.forecaster is not None:
+            print(f"forecast: {self.forecast_evaluator.summary()}")
+        if self.state is not None:
+            self.state.stop()
+        if self.sampler is not None:
+            self.sampler.stop()
+        if self.memcached_sampler is not None:
+            self.memcached_sampler.stop()
+        if self.slo_feed is not None:
+            self.slo_feed.stop()
+        time.sleep(60)
+        if self.forecaster is not None:
+            summary = self.forecast_evaluator.summary()
+            self.logger.custom_event(self.get_job_from_container_name("memcached"),
+                                     f"forecast mae {summary['mae']:.1f} rmse {summary['rmse']:.1f} "
+                                     f"over {summary['samples']} samples")
+        self.logger.job_end(self.get_job_from_container_name("memcached"))
+        self.logger.end()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
 
 
     def basic_sequential_schedule_with_memcached(self):
-        self.pull_images()
-        start_time = time.time()
-        self.create_all_containers()
+        start_time = self.prepare_run()
 
         for job_name in self.container_info:
             # if job_name in self.filler:
             #     continue
-            container = self.docker_client.containers.get(job_name)
-            container.start()
-            self.logger.job_start(self.get_job_from_container_name(job_name),
-                                  self.container_info[job_name]["cpuset_cpus"].split(","),
-                                  self.container_info[job_name]["num_threads"])
-
-            print(f"started container for job: {job_name}")
+            self.start_job(job_name)
 
             is_running = True
             while is_running:
-                status = self.docker_client.containers.get(job_name).status
-                if status == "exited":
+                if self.wait_for_job(job_name):
                     is_running = False
-                    print(f"job {job_name} finished")
-                    self.logger.job_end(self.get_job_from_container_name(job_name))
+                    self.end_job(job_name)
                 else:
-                    if job_name in self.three_core_jobs:
-                        cpu_per_core = self.get_per_core_cpu_usage()
-                        memcached_cpu = self.get_memcached_cpu_usage(cpu_per_core)
-                        self.logger.log_cpu_utilisation(self.get_job_from_container_name("memcached"), cpu_per_core)
-                        if self.memcached_num_cores == 1:
-                            if memcached_cpu > 60:
-                                self.expand_memcached_to_2_cores()
-                        else:
-                            if memcached_cpu < 80:
-                                self.constrain_memcached_to_1_core()
-                                self.add_core(job_name, "1")
-                            elif memcached_cpu <= 140:
-                                self.add_core(job_name, "1")
-                            elif memcached_cpu > 191:# 764 with 18-
-                                self.remove_core(job_name, "1")
-                    else:
-                        if self.memcached_num_cores == 1:
-                            self.expand_memcached_to_2_cores()
-                        cpu_per_core = self.get_per_core_cpu_usage()
-                        self.logger.log_cpu_utilisation(self.get_job_from_container_name("memcached"), cpu_per_core)
-
-
-        end_time = time.time()
-        print(f"took {end_time - start_time} seconds")
-        time.sleep(60)
-        self.logger.job_end(self.get_job_from_container_name("memcached"))
-        self.logger.end()
-
+                    cpu_per_core = self.get_per_core_cpu_usage()
+                    self.logger.log_cpu_utilisation(self.get_job_from_container_name("memcached"), cpu_per_core)
+                    self.control_step([job_name], cpu_per_core)
+
+        self.finish_run(start_time)
+
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log_file", help="Where the scheduler log is written")
+    parser.add_argument("--event-driven", action="store_true", default=False,
+                        help="Track container state from the docker events stream instead of polling")
+    parser.add_argument("--sample-period", type=float, default=None,
+                        help="Sample /proc/stat in the background every SAMPLE_PERIOD seconds (e.g. 0.05) "
+                             "instead of blocking on psutil for a second; control still runs once a second")
+    parser.add_argument("--actuation", choices=["docker", "cgroup"], default="docker",
+                        help="Change cpusets and pause jobs through the docker API or by writing the cgroup files directly")
+    parser.add_argument("--async", dest="run_async", action="store_true", default=False,
+                        help="Run sampling, memcached management, jobs and logging as concurrent asyncio tasks")
+    parser.add_argument("--max-concurrent-jobs", type=int, default=2,
+                        help="How many batch jobs may run at once with --async")
+    parser.add_argument("--policy", choices=policies.POLICIES, default="hysteresis",
+                        help="Scheduling policy that decides memcached cores and core 1 sharing")
+    parser.add_argument("--forecast-horizon", type=float, default=None,
+                        help="Grant memcached cores on its CPU forecast this many seconds ahead (Holt linear trend)")
+    parser.add_argument("--perf-model", nargs="+", default=None, metavar="CSV",
+                        help="Pick job cores and threads from speedup fits of these part2b output files")
+    parser.add_argument("--parallel-provisioning", action="store_true", default=False,
+                        help="Pull only missing images, concurrently, and start each job as soon as its image is ready")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve control loop metrics in Prometheus text format on localhost:METRICS_PORT/metrics")
+    parser.add_argument("--memcached-cpu", choices=["host", "process"], default="host",
+                        help="Measure memcached as the busy time of its cores (host) or from its own threads in "
+                             "/proc/<pid>/task (process), which ignores batch jobs sharing core 1")
+    parser.add_argument("--mcperf-file", default=None,
+                        help="Tail this mcperf output file and grant memcached cores when p95 approaches the SLO")
+    parser.add_argument("--mcperf-port", type=int, default=None,
+                        help="Same as --mcperf-file, reading mcperf output streamed to this TCP port "
+                             "(e.g. tail -F results.txt | nc <server> <port> on the client-measure VM)")
+    parser.add_argument("--slo-ms", type=float, default=slo_feed.SLO_P95_MS, help="p95 latency objective in ms")
+    parser.add_argument("--slo-horizon", type=float, default=10,
+                        help="How many seconds ahead the p95 trend is extrapolated")
+    parser.add_argument("--log-backend", choices=["text", "buffered"], default="text",
+                        help="Write every log event directly (text) or batch them on a background thread (buffered)")
+    parser.add_argument("--log-format", choices=["text", "jsonl"], default="text",
+                        help="Buffered backend only: the usual text lines, or json lines with monotonic and epoch ns")
+    return parser.parse_args()
 
 
 def main():
-    log_file = sys.argv[1]
-    c = Controller(log_file)
-    c.basic_sequential_schedule_with_memcached()
+    args = parse_args()
+    c = Controller(args.log_file, event_driven=args.event_driven, sample_period=args.sample_period,
+                   actuation_backend=args.actuation, policy=args.policy,
+                   forecast_horizon=args.forecast_horizon, runtime_csvs=args.perf_model,
+                   parallel_provisioning=args.parallel_provisioning, metrics_port=args.metrics_port,
+                   memcached_cpu_source=args.memcached_cpu,
+                   mcperf_source=slo_feed.make_source(args.mcperf_file, args.mcperf_port),
+                   slo_ms=args.slo_ms, slo_horizon=args.slo_horizon,
+                   log_backend=args.log_backend, log_format=args.log_format)
+    if args.run_async:
+        asyncio.run(async_controller.AsyncController(c, max_concurrent_jobs=args.max_concurrent_jobs).run())
+    else:
+        c.basic_sequential_schedule_with_memcached()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+import math
+import os
+import threading
+import time
+from collections import deque
+
+
+PROC_STAT = "/proc/stat"
+
+
+def read_proc_stat() -> str:
+    with open(PROC_STAT, "r") as f:
+        return f.read()
+
+
+# returns [(busy, total)] jiffies for cpu0, cpu1, ... (the aggregate "cpu" line is skipped)
+def parse_proc_stat(text: str) -> list:
+    cores = []
+    for line in text.splitlines():
+        if not line.startswith("cpu") or line.startswith("cpu "):
+            continue
+        fields = [int(v) for v in line.split()[1:9]]
+        # user nice system idle iowait irq softirq steal, guest time is already part of user
+        idle = fields[3] + fields[4]
+        total = sum(fields)
+        cores.append((total - idle, total))
+    return cores
+
+
+class CpuSampler:
+    def __init__(self, period: float = 0.1, history: int = 128, alpha: float = 0.3, read_stat=read_proc_stat):
+        self.period = period
+        self.alpha = alpha
+        self.read_stat = read_stat
+        # ring buffer of (monotonic ts, [per core %])
+        self.samples = deque(maxlen=history)
+        self._prev = None
+        self._ewma = None
+        self._lock = threading.Lock()
+        # set once the first delta (the second snapshot) is in
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # takes one raw /proc/stat snapshot; the thread calls this, tests can call it directly
+    def feed(self, text: str, ts: float = None) -> None:
+        current = parse_proc_stat(text)
+        if ts is None:
+            ts = time.monotonic()
+
+        with self._lock:
+            prev, self._prev = self._prev, current
+            if prev is None or len(prev) != len(current):
+                return
+
+            usage = []
+            for (busy0, total0), (busy1, total1) in zip(prev, current):
+                d_total = total1 - total0
+                usage.append(100.0 * (busy1 - busy0) / d_total if d_total > 0 else 0.0)
+
+            if self._ewma is None:
+                self._ewma = list(usage)
+            else:
+                self._ewma = [self.alpha * u + (1 - self.alpha) * e for u, e in zip(usage, self._ewma)]
+            self.samples.append((ts, usage))
+        self._ready.set()
+
+    # blocks until there is a sample, False if there is none after timeout seconds
+    def wait_ready(self, timeout: float = None) -> bool:
+        return self._ready.wait(timeout)
+
+    def start(self):
+        self.feed(self.read_stat())
+        self._thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        next_tick = time.monotonic() + self.period
+        while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+            self.feed(self.read_stat())
+            next_tick += self.period
+
+    def instantaneous(self) -> list:
+        with self._lock:
+            return list(self.samples[-1][1]) if self.samples else []
+
+    def ewma(self) -> list:
+        with self._lock:
+            return list(self._ewma) if self._ewma is not None else []
+
+    def window_max(self, window: float) -> list:
+        num_samples = max(1, math.ceil(window / self.period))
+        with self._lock:
+            recent = list(self.samples)[-num_samples:]
+        if not recent:
+            return []
+        return [max(core) for core in zip(*(usage for _, usage in recent))]
+
+
+# utime + stime in clock ticks from one /proc/<pid>/task/<tid>/stat line (fields 14 and 15)
+def parse_task_stat(text: str) -> int:
+    fields = text.rpartition(")")[2].split()
+    return int(fields[11]) + int(fields[12])
+
+
+class ProcessCpuSampler:
+    # CPU used by one process, summed over its threads, in percent of one core (200 = two busy cores).
+    # Unlike the per-core view this does not count other work sharing the process's cores.
+    def __init__(self, pid_lookup, period: float = 0.1, alpha: float = 0.3, proc_root: str = "/proc",
+                 clock_ticks: int = None):
+        self.pid_lookup = pid_lookup
+        self.period = period
+        self.alpha = alpha
+        self.proc_root = proc_root
+        self.clock_ticks = clock_ticks if clock_ticks is not None else os.sysconf("SC_CLK_TCK")
+        self.pid = None
+        self._prev = None
+        self._usage = None
+        self._ewma = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _task_ticks(self) -> dict:
+        task_dir = os.path.join(self.proc_root, str(self.pid), "task")
+        ticks = dict()
+        for tid in os.listdir(task_dir):
+            try:
+                with open(os.path.join(task_dir, tid, "stat"), "r") as f:
+                    ticks[tid] = parse_task_stat(f.read())
+            except (FileNotFoundError, ProcessLookupError):
+                # the thread exited after the listing
+                continue
+        return ticks
+
+    # {tid: ticks} for the current process, None while it is not running
+    def read_ticks(self):
+        for _ in range(2):
+            if self.pid is None:
+                pid = self.pid_lookup()
+                if not pid or str(pid) == "0":
+                    return None
+                self.pid = int(pid)
+                self._prev = None
+            try:
+                return self._task_ticks()
+            except FileNotFoundError:
+                # the process restarted, look the pid up again once
+                self.pid = None
+        return None
+
+    # takes one {tid: ticks} snapshot; the thread calls this through sample(), tests can call it directly
+    def feed(self, ticks: dict, ts: float = None) -> None:
+        if ts is None:
+            ts = time.monotonic()
+        with self._lock:
+            prev, self._prev = self._prev, (ts, ticks)
+            if prev is None or ts <= prev[0]:
+                return
+            prev_ts, prev_ticks = prev
+            # threads that exited since the last sample drop out, new ones count from their start
+            used = sum(t - prev_ticks.get(tid, 0) for tid, t in ticks.items())
+            usage = max(0.0, 100.0 * used / self.clock_ticks / (ts - prev_ts))
+            self._usage = usage
+            self._ewma = usage if self._ewma is None else self.alpha * usage + (1 - self.alpha) * self._ewma
+
+    def sample(self) -> None:
+        ticks = self.read_ticks()
+        if ticks is not None:
+            self.feed(ticks)
+
+    def start(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="process-cpu-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        next_tick = time.monotonic() + self.period
+        while not self._stop.wait(max(0.0, next_tick - time.monotonic())):
+            self.sample()
+            next_tick += self.period
+
+    def instantaneous(self):
+        with self._lock:
+            return self._usage
+
+    def ewma(self):
+        with self._lock:
+            return self._ewma
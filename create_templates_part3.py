@@ -1,5 +1,7 @@
 import os
 
+import manifests
+
 jobs = ["blackscholes", "canneal", "dedup", "ferret", "freqmine", "radix", "vips"] 
 
 for job in jobs:
@@ -14,6 +16,8 @@ for job in jobs:
 
     schemas = schemas.replace("-n 8", "-n <n>")
     schemas = schemas.replace("\"parsec\"", "<node_label>")
+    # fails if a replace above matched nothing
+    manifests.Template(schemas, jobname, required=("n", "node_label"))
 
     script_dir = os.path.dirname(__file__)
     rel_path = f"parsec-benchmarks/part3/{jobname}-template.yaml"
@@ -0,0 +1,83 @@
+import math
+from collections import deque
+
+
+class HoltForecaster:
+    # Holt's linear trend on irregularly spaced samples; the trend is per second.
+    # beta=0 degrades to a plain EWMA.
+    def __init__(self, alpha: float = 0.5, beta: float = 0.3):
+        self.alpha = alpha
+        self.beta = beta
+        self.level = None
+        self.trend = 0.0
+        self.last_time = None
+
+    def update(self, now: float, value: float) -> None:
+        if self.level is None:
+            self.level = value
+            self.last_time = now
+            return
+
+        dt = now - self.last_time
+        if dt <= 0:
+            return
+        prev_level = self.level
+        self.level = self.alpha * value + (1 - self.alpha) * (prev_level + self.trend * dt)
+        self.trend = self.beta * (self.level - prev_level) / dt + (1 - self.beta) * self.trend
+        self.last_time = now
+
+    def forecast(self, horizon: float) -> float:
+        if self.level is None:
+            return 0.0
+        return self.level + self.trend * horizon
+
+
+class ForecastEvaluator:
+    # scores forecasts once their target time has been observed, and measures how much earlier
+    # the forecast crossed the threshold than the measurement did
+    def __init__(self, horizon: float, threshold: float):
+        self.horizon = horizon
+        self.threshold = threshold
+        self.pending = deque()
+        self.errors = []
+        self.abs_error_sum = 0.0
+        self.lead_times = []
+        self._forecast_crossed_at = None
+        self._prev_actual = None
+
+    # returns the forecast errors that resolved with this sample. threshold is per memcached core:
+    # with two cores actual and predicted are the sum over both, so the threshold doubles
+    def observe(self, now: float, actual: float, predicted: float, cores: int = 1) -> list:
+        threshold = self.threshold * cores
+        resolved = []
+        while self.pending and self.pending[0][0] <= now:
+            _, forecast = self.pending.popleft()
+            resolved.append(actual - forecast)
+        self.errors.extend(resolved)
+        self.abs_error_sum += sum(abs(e) for e in resolved)
+        self.pending.append((now + self.horizon, predicted))
+
+        if predicted > threshold and self._forecast_crossed_at is None:
+            self._forecast_crossed_at = now
+        crossed = actual > threshold and (self._prev_actual is None or self._prev_actual <= threshold)
+        if crossed:
+            # a forecast that only crosses together with (or after) the measurement gained nothing
+            crossed_at = self._forecast_crossed_at if self._forecast_crossed_at is not None else now
+            self.lead_times.append(now - crossed_at)
+        if actual <= threshold and predicted <= threshold:
+            self._forecast_crossed_at = None
+        self._prev_actual = actual
+        return resolved
+
+    def mae(self) -> float:
+        return self.abs_error_sum / len(self.errors) if self.errors else 0.0
+
+    def summary(self) -> dict:
+        n = len(self.errors)
+        return {
+            "samples": n,
+            "mae": self.mae(),
+            "rmse": math.sqrt(sum(e * e for e in self.errors) / n) if n else 0.0,
+            "crossings": len(self.lead_times),
+            "mean_lead_time": sum(self.lead_times) / len(self.lead_times) if self.lead_times else 0.0,
+        }
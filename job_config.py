@@ -0,0 +1,41 @@
+# default placement of the batch jobs on the memcached server (4 cores, memcached on 0 and 1)
+CONTAINER_INFO = {
+    "canneal": {
+        "image": "anakli/cca:parsec_canneal",
+        "cpuset_cpus": "2,3",
+        "num_threads": 2
+    },
+    "blackscholes": {
+        "image": "anakli/cca:parsec_blackscholes",
+        "cpuset_cpus": "1,2,3",
+        "num_threads": 3
+    },
+    "dedup": {
+        "image": "anakli/cca:parsec_dedup",
+        "cpuset_cpus": "2,3",
+        "num_threads": 2
+    },
+    "ferret": {
+        "image": "anakli/cca:parsec_ferret",
+        "cpuset_cpus": "1,2,3",
+        "num_threads": 3
+    },
+    "freqmine": {
+        "image": "anakli/cca:parsec_freqmine",
+        "cpuset_cpus": "1,2,3",
+        "num_threads": 3
+    },
+    "radix": {  # MUST BE ON 2 CORES ONLY, altfel face ca simion
+        "image": "anakli/cca:splash2x_radix",
+        "cpuset_cpus": "2,3",
+        "num_threads": 2
+    },
+    "vips": {
+        "image": "anakli/cca:parsec_vips",
+        "cpuset_cpus": "1,2,3",
+        "num_threads": 3
+    }
+}
+
+# jobs that borrow core 1 from memcached whenever memcached can spare it
+THREE_CORE_JOBS = ["blackscholes", "vips", "ferret", "freqmine"]
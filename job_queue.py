@@ -0,0 +1,139 @@
+import threading
+import time
+
+import k8s_watch
+
+
+# Starts the part 3 batch jobs from per-node queues as completion events free their cores, instead
+# of polling kubectl for every pending job. config is {job: (node, cpuset, threads)} like part3.py's;
+# a node runs one job per cpuset at a time, jobs on different (even overlapping) cpusets side by side.
+
+def parse_cpuset(cpuset: str) -> frozenset:
+    # taskset style: "0,1", "0-3" or "0,2-3"
+    cores = set()
+    for part in cpuset.split(","):
+        first, _, last = part.partition("-")
+        cores.update(range(int(first), int(last or first) + 1))
+    return frozenset(cores)
+
+
+class NodeQueues:
+    # one FIFO per core set of the node. Queue heads start in job order; only jobs on the same core set
+    # exclude each other (the old slot behaviour the hand-tuned part 3 layouts rely on). With
+    # exclusive_cores overlapping core sets exclude each other too, and a head that has to wait for
+    # busy cores keeps later jobs off those cores, so a 4 core job is not starved by 2 core ones.
+    def __init__(self, node: str, order: dict, exclusive_cores: bool = False):
+        self.node = node
+        self.order = order
+        self.exclusive_cores = exclusive_cores
+        self.queues = dict()
+        self.running = dict()
+
+    def add(self, job: str, cpuset: str) -> None:
+        self.queues.setdefault(cpuset, []).append(job)
+
+    def release(self, job: str) -> None:
+        self.running.pop(job)
+
+    def startable(self) -> list:
+        busy = set()
+        for cpuset in self.running.values():
+            busy |= parse_cpuset(cpuset)
+        busy_sets = set(self.running.values())
+        started = []
+        heads = [(queue[0], cpuset) for cpuset, queue in self.queues.items() if queue]
+        for _, cpuset in sorted(heads, key=lambda head: self.order[head[0]]):
+            cores = parse_cpuset(cpuset)
+            blocked = cpuset in busy_sets or (self.exclusive_cores and cores & busy)
+            busy |= cores
+            busy_sets.add(cpuset)
+            if blocked:
+                continue
+            job = self.queues[cpuset].pop(0)
+            self.running[job] = cpuset
+            started.append(job)
+        return started
+
+
+class JobQueueScheduler:
+    def __init__(self, config: dict, order: list, submit, exclusive_cores: bool = False, clock=time.monotonic):
+        self.config = config
+        self.submit = submit
+        self.clock = clock
+        self.nodes = dict()
+        ranks = {job: i for i, job in enumerate(order)}
+        for job in order:
+            node, cpuset, _ = config[job]
+            self.nodes.setdefault(node, NodeQueues(node, ranks, exclusive_cores)).add(job, cpuset)
+        self.total = len(order)
+        self.running = set()
+        self.completed = dict()
+        self.failed = set()
+        # (job, time, failed) completions not yet handled by run(), appended from the watch thread
+        self.finished = []
+        self.condition = threading.Condition()
+        # seconds from a job's cores freeing up to the submission of the next job on that node
+        self.start_latency = []
+
+    # k8s_watch listener
+    def job_event(self, event_type: str, job: dict) -> None:
+        if event_type == "DELETED":
+            return
+        failed = k8s_watch.job_failed(job)
+        if failed or k8s_watch.job_completed(job):
+            self.complete(job["metadata"]["name"], failed)
+
+    def complete(self, job: str, failed: bool = False) -> None:
+        with self.condition:
+            if job not in self.running or any(name == job for name, _, _ in self.finished):
+                return
+            self.finished.append((job, self.clock(), failed))
+            self.condition.notify()
+
+    def _dispatch(self, freed: dict) -> None:
+        started = [(node, job) for node, queues in self.nodes.items() for job in queues.startable()]
+        if not started:
+            return
+        with self.condition:
+            self.running.update(job for _, job in started)
+        # submit(jobs) creates every job that can start now in one batch
+        self.submit([job for _, job in started])
+        now = self.clock()
+        for node, job in started:
+            if node in freed:
+                self.start_latency.append(now - freed[node])
+            print(f"Scheduled {job} on {node} cores {self.config[job][1]}")
+
+    def run(self, timeout: float = None) -> dict:
+        # submits every job and returns {job: completion time} once all of them finished
+        deadline = None if timeout is None else self.clock() + timeout
+        self._dispatch(dict())
+        while len(self.completed) < self.total:
+            with self.condition:
+                while not self.finished:
+                    remaining = None if deadline is None else deadline - self.clock()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"jobs still running after {timeout} s: {sorted(self.running)}")
+                    self.condition.wait(remaining)
+                finished, self.finished = self.finished, []
+                for job, _, _ in finished:
+                    self.running.discard(job)
+
+            freed = dict()
+            for job, at, failed in finished:
+                node = self.config[job][0]
+                self.nodes[node].release(job)
+                self.completed[job] = at
+                freed[node] = min(at, freed.get(node, at))
+                if failed:
+                    self.failed.add(job)
+                print(f"{job} {'failed' if failed else 'completed'}")
+            self._dispatch(freed)
+        return self.completed
+
+    def report(self) -> None:
+        if self.start_latency:
+            print(f"next job submitted {sum(self.start_latency) / len(self.start_latency) * 1000:.0f} ms on average "
+                  f"and at most {max(self.start_latency) * 1000:.0f} ms after its cores freed up")
+        if self.failed:
+            print(f"failed jobs: {', '.join(sorted(self.failed))}")
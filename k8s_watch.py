@@ -0,0 +1,413 @@
+import json
+import queue
+import socket
+import subprocess
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Follows jobs and pods through the Kubernetes watch API instead of polling kubectl get. Events come
+# from `kubectl get -w` (no setup, uses the kubeconfig) or straight from an API server over HTTP,
+# e.g. a `kubectl proxy` or FakeApiServer.
+
+COLLECTIONS = {
+    "jobs": "/apis/batch/v1/namespaces/{namespace}/jobs",
+    "pods": "/api/v1/namespaces/{namespace}/pods",
+    "services": "/api/v1/namespaces/{namespace}/services",
+}
+
+
+def job_completed(job: dict) -> bool:
+    # the "1/1" in kubectl get jobs
+    return (job.get("status") or {}).get("succeeded", 0) >= 1
+
+
+def job_failed(job: dict) -> bool:
+    conditions = (job.get("status") or {}).get("conditions") or []
+    return any(c.get("type") == "Failed" and c.get("status") == "True" for c in conditions)
+
+
+def pod_ready(pod: dict) -> bool:
+    # the "1/1" in kubectl get pods: every container is ready
+    statuses = (pod.get("status") or {}).get("containerStatuses") or []
+    return len(statuses) > 0 and all(s.get("ready") for s in statuses)
+
+
+class KubectlWatchSource:
+    def __init__(self, resource: str, selector: str = None, env: dict = None):
+        self.argv = ["kubectl", "get", resource, "--watch", "--output-watch-events", "-o", "json"]
+        if selector is not None:
+            self.argv += ["-l", selector]
+        self.env = env
+        self.process = None
+        self._stop = threading.Event()
+
+    def events(self):
+        decoder = json.JSONDecoder()
+        while not self._stop.is_set():
+            self.process = subprocess.Popen(self.argv, stdout=subprocess.PIPE, text=True, env=self.env)
+            buffer = ""
+            for line in self.process.stdout:
+                buffer += line
+                # kubectl pretty prints every event, an event can only end on a top level "}"
+                if not line.startswith("}"):
+                    continue
+                try:
+                    event, end = decoder.raw_decode(buffer.lstrip())
+                except json.JSONDecodeError:
+                    continue
+                buffer = ""
+                yield event
+            self.process.wait()
+            # the API server ends watches after a few minutes, kubectl then exits; watch again
+            self._stop.wait(1)
+
+    def close(self):
+        self._stop.set()
+        if self.process is not None:
+            self.process.terminate()
+
+
+class HttpWatchSource:
+    def __init__(self, api_server: str, resource: str, selector: str = None, namespace: str = "default",
+                 timeout_seconds: int = 300):
+        query = {"watch": "true", "timeoutSeconds": str(timeout_seconds)}
+        if selector is not None:
+            query["labelSelector"] = selector
+        self.url = (api_server.rstrip("/") + COLLECTIONS[resource].format(namespace=namespace)
+                    + "?" + urllib.parse.urlencode(query))
+        self._stop = threading.Event()
+
+    def events(self):
+        while not self._stop.is_set():
+            try:
+                with urllib.request.urlopen(self.url) as response:
+                    for line in response:
+                        if line.strip():
+                            yield json.loads(line)
+            except OSError as e:
+                if self._stop.is_set():
+                    return
+                print(f"watch {self.url} failed: {e}, retrying")
+                self._stop.wait(1)
+
+    # closing the response would block on the reading thread; the watch ends with the stream, at
+    # the latest after timeout_seconds
+    def close(self):
+        self._stop.set()
+
+
+def make_source(resource: str, api_server: str = None, selector: str = None, env: dict = None):
+    if api_server is not None:
+        return HttpWatchSource(api_server, resource, selector)
+    return KubectlWatchSource(resource, selector, env)
+
+
+class ResourceWatch:
+    # the latest state of every object of one resource, by name; wait_for blocks until an object
+    # satisfies a predicate. A name is reused by every run of the same job, so forget() it before
+    # deleting: events still arriving for the old object are then ignored.
+    def __init__(self, source):
+        self.source = source
+        self.objects = dict()
+        self.forgotten = set()
+        self.condition = threading.Condition()
+        self.listeners = []
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="k8s-watch", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.source.close()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def _run(self):
+        for event in self.source.events():
+            self.apply(event)
+
+    def apply(self, event: dict) -> None:
+        # ERROR (e.g. an expired resource version) and BOOKMARK carry no object state
+        if event.get("type") not in ("ADDED", "MODIFIED", "DELETED"):
+            return
+        metadata = event["object"]["metadata"]
+        with self.condition:
+            if metadata.get("uid") in self.forgotten:
+                return
+            if event["type"] == "DELETED":
+                self.objects.pop(metadata["name"], None)
+            else:
+                self.objects[metadata["name"]] = event["object"]
+            self.condition.notify_all()
+        for listener in self.listeners:
+            listener(event["type"], event["object"])
+
+    # listener(event type, object) runs on the watch thread for every event, it must not block
+    def add_listener(self, listener) -> None:
+        self.listeners.append(listener)
+
+    def forget(self, name: str) -> None:
+        with self.condition:
+            obj = self.objects.pop(name, None)
+            if obj is not None:
+                self.forgotten.add(obj["metadata"].get("uid"))
+
+    def wait_for(self, name: str, predicate, failed=None, timeout: float = None) -> dict:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                obj = self.objects.get(name)
+                if obj is not None:
+                    if failed is not None and failed(obj):
+                        raise RuntimeError(f"{name} failed")
+                    if predicate(obj):
+                        return obj
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"{name} did not become ready within {timeout} s")
+                self.condition.wait(remaining)
+
+
+def _matches(obj: dict, selector: str) -> bool:
+    if not selector:
+        return True
+    labels = obj["metadata"].get("labels") or {}
+    return all(labels.get(key) == value for key, value in (term.split("=", 1) for term in selector.split(",")))
+
+
+class FakeApiServer:
+    # just enough of the API server to test the watches and cluster.ApiBackend against: lists, gets,
+    # creates and deletes pods, jobs and services, and serves pod logs set with set_logs. With
+    # ?watch=true a collection streams newline-delimited events, starting with an ADDED for every
+    # existing object like a real watch without a resourceVersion. A created job gets one pod.
+    def __init__(self, port: int = 0, host: str = "127.0.0.1", namespace: str = "default"):
+        self.objects = {resource: dict() for resource in COLLECTIONS}
+        self.paths = {COLLECTIONS[resource].format(namespace=namespace): resource for resource in COLLECTIONS}
+        self.logs = dict()
+        self.job_seconds = None
+        self.pod_ready_after = 0.0
+        self.watchers = []
+        self.lock = threading.Lock()
+        self.uid = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive and no Nagle delay on the separately written headers and body, like the real API server
+            protocol_version = "HTTP/1.1"
+
+            def setup(handler):
+                super().setup()
+                handler.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _route(handler):
+                url = urllib.parse.urlparse(handler.path)
+                query = {key: values[0] for key, values in urllib.parse.parse_qs(url.query).items()}
+                path = url.path
+                subresource = None
+                if path.endswith("/log"):
+                    path, subresource = path[:-len("/log")], "log"
+                if path in server.paths:
+                    return server.paths[path], None, subresource, query
+                collection, _, name = path.rpartition("/")
+                return server.paths.get(collection), name, subresource, query
+
+            def _send(handler, status: int, body, content_type: str = "application/json"):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                handler.send_response(status)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def _not_found(handler, name):
+                handler._send(404, {"kind": "Status", "status": "Failure", "reason": "NotFound",
+                                    "message": f"{name} not found", "code": 404})
+
+            def do_GET(handler):
+                resource, name, subresource, query = handler._route()
+                if resource is None:
+                    handler._not_found(handler.path)
+                    return
+                selector = query.get("labelSelector", "")
+                if name is not None:
+                    with server.lock:
+                        obj = server.objects[resource].get(name)
+                        logs = server.logs.get(name, "")
+                    if obj is None:
+                        handler._not_found(name)
+                    elif subresource == "log":
+                        handler._send(200, logs.encode(), "text/plain")
+                    else:
+                        handler._send(200, obj)
+                    return
+                if query.get("watch") != "true":
+                    with server.lock:
+                        items = [obj for obj in server.objects[resource].values() if _matches(obj, selector)]
+                    handler._send(200, {"kind": "List", "items": items})
+                    return
+
+                handler.send_response(200)
+                handler.send_header("Content-Type", "application/json")
+                handler.send_header("Connection", "close")
+                handler.end_headers()
+                handler.close_connection = True
+                events = queue.Queue()
+                with server.lock:
+                    for obj in server.objects[resource].values():
+                        events.put({"type": "ADDED", "object": obj})
+                    server.watchers.append((resource, events))
+                try:
+                    while True:
+                        event = events.get()
+                        if event is None:
+                            return
+                        if _matches(event["object"], selector):
+                            handler.wfile.write(json.dumps(event).encode() + b"\n")
+                            handler.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server.lock:
+                        server.watchers.remove((resource, events))
+
+            def do_POST(handler):
+                resource, name, _, _ = handler._route()
+                body = handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+                if resource is None or name is not None:
+                    handler._not_found(handler.path)
+                    return
+                if "yaml" in handler.headers.get("Content-Type", ""):
+                    # only the fake needs a yaml parser, the clients send manifests as they are
+                    import yaml
+                    obj = yaml.safe_load(body)
+                else:
+                    obj = json.loads(body)
+                if obj["metadata"]["name"] in server.objects[resource]:
+                    handler._send(409, {"kind": "Status", "status": "Failure", "reason": "AlreadyExists",
+                                        "message": f"{obj['metadata']['name']} already exists", "code": 409})
+                    return
+                obj = server.put(resource, obj)
+                if resource == "jobs":
+                    server.put("pods", {"apiVersion": "v1", "kind": "Pod",
+                                        "metadata": {"name": f"{obj['metadata']['name']}-{obj['metadata']['uid']}",
+                                                     "labels": {"job-name": obj["metadata"]["name"]}},
+                                        "status": {}})
+                handler._send(201, obj)
+                server._started(resource, obj)
+
+            def do_DELETE(handler):
+                resource, name, _, query = handler._route()
+                # delete options, e.g. the propagation policy; all deletes propagate here
+                handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+                if resource is None:
+                    handler._not_found(handler.path)
+                    return
+                if name is None:
+                    with server.lock:
+                        names = [n for n, obj in server.objects[resource].items()
+                                 if _matches(obj, query.get("labelSelector", ""))]
+                    deleted = [server.delete(resource, n) for n in names]
+                    handler._send(200, {"kind": "List", "items": [obj for obj in deleted if obj is not None]})
+                    return
+                obj = server.delete(resource, name)
+                if obj is None:
+                    handler._not_found(name)
+                else:
+                    handler._send(200, obj)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.server.serve_forever, name="fake-api-server", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        with self.lock:
+            for _, events in self.watchers:
+                events.put(None)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _publish(self, resource: str, event: dict) -> None:
+        for watched, events in self.watchers:
+            if watched == resource:
+                events.put(event)
+
+    # creates or replaces an object; objects are plain dicts with at least metadata.name
+    def put(self, resource: str, obj: dict) -> dict:
+        with self.lock:
+            name = obj["metadata"]["name"]
+            existing = self.objects[resource].get(name)
+            if existing is None:
+                self.uid += 1
+                obj["metadata"]["uid"] = str(self.uid)
+            else:
+                obj["metadata"]["uid"] = existing["metadata"]["uid"]
+            self.objects[resource][name] = obj
+            self._publish(resource, {"type": "ADDED" if existing is None else "MODIFIED", "object": obj})
+        return obj
+
+    # deleting a job deletes its pods, like kubectl's background propagation
+    def delete(self, resource: str, name: str):
+        with self.lock:
+            obj = self.objects[resource].pop(name, None)
+            if obj is not None:
+                self._publish(resource, {"type": "DELETED", "object": obj})
+        if obj is not None and resource == "jobs":
+            with self.lock:
+                pods = [p for p, pod in self.objects["pods"].items() if _matches(pod, f"job-name={name}")]
+            for pod in pods:
+                self.delete("pods", pod)
+        return obj
+
+    def set_logs(self, pod: str, logs: str) -> None:
+        with self.lock:
+            self.logs[pod] = logs
+
+    # runs what is created like a kubelet would: a pod becomes ready after pod_ready_after seconds, a
+    # job completes after job_seconds(job) seconds and its pod logs the runtime like `time` does
+    def simulate(self, job_seconds, pod_ready_after: float = 0.0) -> None:
+        self.job_seconds = job_seconds
+        self.pod_ready_after = pod_ready_after
+
+    def _started(self, resource: str, obj: dict) -> None:
+        if self.job_seconds is None:
+            return
+        if resource == "pods":
+            threading.Timer(self.pod_ready_after, self._set_status,
+                            (resource, obj, {"containerStatuses": [{"ready": True}]})).start()
+        elif resource == "jobs":
+            seconds = self.job_seconds(obj)
+            threading.Timer(seconds, self._finish_job, (obj, seconds)).start()
+
+    def _set_status(self, resource: str, obj: dict, status: dict) -> None:
+        with self.lock:
+            current = self.objects[resource].get(obj["metadata"]["name"])
+        # deleted, or replaced by a newer object of the same name
+        if current is None or current["metadata"]["uid"] != obj["metadata"]["uid"]:
+            return
+        self.put(resource, dict(current, status=status))
+
+    def _finish_job(self, job: dict, seconds: float) -> None:
+        with self.lock:
+            pods = [p for p, pod in self.objects["pods"].items() if _matches(pod, f"job-name={job['metadata']['name']}")]
+        minutes, rest = divmod(seconds, 60)
+        for pod in pods:
+            self.set_logs(pod, f"real\t{int(minutes)}m{rest:.3f}s\nuser\t{int(minutes)}m{rest:.3f}s\nsys\t0m0.000s\n")
+        self._set_status("jobs", job, {"succeeded": 1})
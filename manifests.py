@@ -0,0 +1,86 @@
+import os
+import re
+import threading
+
+
+# Renders the *-template.yaml job manifests in memory. Each template is read and split at its
+# placeholders once, renders are memoised per parameter tuple and go straight to cluster.Cluster,
+# nothing is written back into the tree (so concurrent runs cannot overwrite each other's yamls).
+
+PLACEHOLDERS = ("n", "node_label", "cores")
+
+_PLACEHOLDER = re.compile(r"<([A-Za-z_]+)>")
+_CPUSET = re.compile(r"^\d+(-\d+)?(,\d+(-\d+)?)*$")
+_LABEL_VALUE = re.compile(r"^[A-Za-z0-9]([-A-Za-z0-9_.]*[A-Za-z0-9])?$")
+
+
+def check_value(placeholder: str, value) -> str:
+    match placeholder:
+        case "n":
+            if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+                raise ValueError(f"<n> must be a positive thread count, got {value!r}")
+        case "cores":
+            if not isinstance(value, str) or not _CPUSET.match(value):
+                raise ValueError(f"<cores> must be a taskset cpu list like 0,1 or 0-3, got {value!r}")
+        case "node_label":
+            if not isinstance(value, str) or len(value) > 63 or not _LABEL_VALUE.match(value):
+                raise ValueError(f"<node_label> must be a label value, got {value!r}")
+    return str(value)
+
+
+class Template:
+    # text split into literal parts and placeholder names: [literal, name, literal, name, ..., literal]
+    def __init__(self, text: str, name: str = "template", required: tuple = ()):
+        self.name = name
+        unknown = sorted({p for p in _PLACEHOLDER.findall(text) if p not in PLACEHOLDERS})
+        if unknown:
+            raise ValueError(f"{name}: unknown placeholders {', '.join(f'<{p}>' for p in unknown)}")
+        self.parts = re.split(r"<(" + "|".join(PLACEHOLDERS) + r")>", text)
+        self.placeholders = tuple(p for p in PLACEHOLDERS if p in self.parts[1::2])
+        missing = [p for p in required if p not in self.placeholders]
+        if missing:
+            raise ValueError(f"{name}: missing placeholders {', '.join(f'<{p}>' for p in missing)}")
+
+    def render(self, values: dict) -> str:
+        missing = [p for p in self.placeholders if values.get(p) is None]
+        if missing:
+            raise ValueError(f"{self.name}: no value for {', '.join(f'<{p}>' for p in missing)}")
+        strings = {p: check_value(p, values[p]) for p in self.placeholders}
+        return "".join(part if i % 2 == 0 else strings[part] for i, part in enumerate(self.parts))
+
+
+class TemplateRenderer:
+    # directory holds {name}-template.yaml files, relative paths are resolved next to this module
+    def __init__(self, directory: str, suffix: str = "-template.yaml"):
+        self.directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+        self.suffix = suffix
+        self.templates = dict()
+        self.rendered = dict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def template(self, name: str) -> Template:
+        with self.lock:
+            if name not in self.templates:
+                with open(os.path.join(self.directory, name + self.suffix)) as f:
+                    self.templates[name] = Template(f.read(), name)
+            return self.templates[name]
+
+    def render(self, name: str, n: int = None, node_label: str = None, cores: str = None) -> str:
+        template = self.template(name)
+        values = {"n": n, "node_label": node_label, "cores": cores}
+        # only the placeholders the template uses tell renders apart
+        key = (name,) + tuple(values[p] for p in template.placeholders)
+        with self.lock:
+            if key in self.rendered:
+                self.hits += 1
+                return self.rendered[key]
+        manifest = template.render(values)
+        with self.lock:
+            self.misses += 1
+            self.rendered[key] = manifest
+        return manifest
+
+    def report(self) -> None:
+        print(f"{len(self.templates)} templates parsed, {self.misses} manifests rendered, {self.hits} cache hits")
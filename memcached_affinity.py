@@ -0,0 +1,74 @@
+import os
+import time
+
+
+# "0-1,3" -> {0, 1, 3}
+def parse_cpu_list(cpu_list: str) -> set:
+    cpus = set()
+    for part in cpu_list.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.update(range(int(lo), int(hi) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+class MemcachedAffinity:
+    def __init__(self, pid_lookup, proc_root="/proc", setaffinity=os.sched_setaffinity):
+        # pid_lookup is only called when the cache is empty or the process restarted
+        self.pid_lookup = pid_lookup
+        self.proc_root = proc_root
+        self.setaffinity = setaffinity
+        self.pid = None
+        self.start_time = None
+        self.tids = []
+
+    def _read_start_time(self, pid):
+        try:
+            with open(os.path.join(self.proc_root, str(pid), "stat"), "r") as f:
+                stat = f.read()
+        except FileNotFoundError:
+            return None
+        # comm can contain spaces, the fields after it are fixed; starttime is field 22
+        return int(stat.rpartition(")")[2].split()[19])
+
+    def _list_tids(self, pid) -> list:
+        return sorted(int(tid) for tid in os.listdir(os.path.join(self.proc_root, str(pid), "task")))
+
+    def resolve(self):
+        pid = self.pid_lookup()
+        if not pid or str(pid) == "0":
+            self.pid = None
+            self.tids = []
+            return None
+        self.pid = int(pid)
+        self.start_time = self._read_start_time(self.pid)
+        self.tids = self._list_tids(self.pid)
+        return self.pid
+
+    def is_stale(self) -> bool:
+        return self.pid is None or self._read_start_time(self.pid) != self.start_time
+
+    # returns how long the actuation took in seconds, or None if memcached is not running
+    def set_affinity(self, cpu_list: str):
+        begin = time.perf_counter()
+        if self.is_stale() and self.resolve() is None:
+            return None
+
+        cpus = parse_cpu_list(cpu_list)
+        try:
+            self._apply(cpus)
+        except ProcessLookupError:
+            # a thread went away between listing and applying, the task list is out of date
+            if self.resolve() is None:
+                return None
+            self._apply(cpus)
+        return time.perf_counter() - begin
+
+    def _apply(self, cpus: set):
+        for tid in self.tids:
+            self.setaffinity(tid, cpus)
@@ -0,0 +1,210 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# seconds; docker calls are in the 10-100 ms range, affinity and cgroup writes well below 1 ms
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = dict()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def get(self, **labels):
+        return self.values.get(self._key(labels))
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self.lock:
+            # per label set: [count per bucket (last is +Inf), sum]
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        counts, _ = self.values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    le = _format_labels(self.labelnames, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                plain = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{plain} {total}")
+                lines.append(f"{self.name}_count{plain} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = dict()
+
+    def _register(self, metric: _Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    # Prometheus text exposition format 0.0.4
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    # serves the registry on http://host:port/metrics from a daemon thread
+    def __init__(self, registry: Registry, port: int, host: str = "127.0.0.1"):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = registry.render().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            # scrapes every few seconds would drown the controller output
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+
+CORES = ["0", "1", "2", "3"]
+
+
+class ControlLoopMetrics:
+    # the metrics the Controller publishes; one instance per run
+    def __init__(self, registry: Registry = None):
+        self.registry = registry if registry is not None else Registry()
+        r = self.registry
+        self.loop_period = r.histogram("controller_loop_period_seconds",
+                                       "Time between the starts of consecutive control steps")
+        self.step_duration = r.histogram("controller_step_duration_seconds",
+                                         "Time spent deciding and applying one control step")
+        self.docker_latency = r.histogram("controller_docker_call_seconds",
+                                          "Latency of docker API calls", ("operation",))
+        self.actuation_latency = r.histogram("controller_actuation_seconds",
+                                             "Latency of cpuset, pause and affinity changes", ("operation",))
+        self.actions = r.counter("controller_actions_total", "Policy actions applied", ("action",))
+        self.core_owner = r.gauge("controller_core_owner",
+                                  "1 if the job may run on the core, 0 otherwise", ("core", "job"))
+        self.memcached_cores = r.gauge("controller_memcached_cores", "Cores memcached is pinned to")
+        self.memcached_cpu = r.gauge("controller_memcached_cpu_percent", "Measured memcached CPU utilisation")
+        self.memcached_host_cpu = r.gauge("controller_memcached_host_cpu_percent",
+                                          "Busy time of memcached's cores, including jobs sharing them")
+        self.memcached_demand = r.gauge("controller_memcached_demand_percent",
+                                        "Memcached CPU the policy acted on (the forecast when enabled)")
+        self.forecast_mae = r.gauge("controller_forecast_mae_percent",
+                                    "Mean absolute error of the memcached CPU forecasts resolved so far")
+        self.memcached_p95 = r.gauge("controller_memcached_p95_ms", "Last p95 latency reported by mcperf")
+        self.memcached_qps = r.gauge("controller_memcached_qps", "Last QPS reported by mcperf")
+        self.core_cpu = r.gauge("controller_core_cpu_percent", "Host CPU utilisation per core", ("core",))
+        self.last_step = None
+
+    def step_started(self, now: float) -> None:
+        if self.last_step is not None:
+            self.loop_period.observe(now - self.last_step)
+        self.last_step = now
+
+    def set_cores(self, job: str, cores: list) -> None:
+        for core in CORES:
+            self.core_owner.set(1 if core in cores else 0, core=core, job=job)
@@ -1,9 +1,14 @@
 import os
 import subprocess
 import re
-import time
+import argparse
+import glob
 from datetime import datetime
 
+import cluster
+import k8s_watch
+import sweep
+
 env = os.environ.copy()
 
 env["PROJECT"] = "cca-eth-2025-group-008"
@@ -14,30 +19,6 @@ jobs = ["blackscholes", "canneal", "dedup", "ferret", "freqmine", "radix", "vips
 
 NUM_RUNS = 1
 
-def is_job_completed(kubectl_output):
-    lines = kubectl_output.strip().splitlines()
-    if len(lines) < 2:
-        return False 
-
-    job_info = lines[1]
-    parts = job_info.split()
-
-    completions = parts[2]
-
-    return completions == "1/1"
-
-def is_pod_ready(kubectl_output):
-    lines = kubectl_output.strip().splitlines()
-    if len(lines) < 2:
-        return False 
-
-    pod_info = lines[1]
-    parts = pod_info.split()
-
-    readiness = parts[1]
-
-    return readiness == "1/1"
-
 def extract_times(output):
     match = re.search(r"real\s+(\d+)m([\d.]+)s\s+user\s+(\d+)m([\d.]+)s\s+sys\s+(\d+)m([\d.]+)s", output)
 
@@ -51,14 +32,28 @@ def extract_times(output):
 
     return real_time, user_time, sys_time
 
-def write_run_data(filename, interference, job_name, real_time, user_time, sys_time):
-    line = f"{interference},{job_name},{real_time},{user_time},{sys_time}\n"
+def write_run_data(filename, interference, job_name, real_time, user_time, sys_time, node, run):
+    line = f"{interference},{job_name},{real_time},{user_time},{sys_time},{node},{run}\n"
     with open(filename, "a") as f:
         f.write(line)
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api-server", default=None, metavar="URL",
+                        help="Talk to and watch the cluster through this API server (e.g. a kubectl proxy)")
+    parser.add_argument("--k8s", choices=["api", "kubectl"], default="api",
+                        help="Call the API server directly (falls back to kubectl without a usable kubeconfig) or run kubectl")
+    parser.add_argument("--prior", nargs="*", default=None, metavar="CSV",
+                        help="Earlier part2a outputs to order the sweep by expected runtime (default: part2a-output-*.csv)")
+    parser.add_argument("--resume", default=None, metavar="CSV",
+                        help="Append to this output and skip the cells it already has")
+    return parser.parse_args()
+
 if __name__ == '__main__':
     # Init steps
 
+    args = parse_args()
+
     subprocess.run(["gcloud", "auth", "application-default", "login"], check=True)
     subprocess.run(["gcloud", "init"], check=True)
     subprocess.run(["kops", "create", "-f", "part2a.yaml"], env=env, check=True)
@@ -68,60 +63,40 @@ if __name__ == '__main__':
 
     output = subprocess.check_output(["kubectl", "get", "nodes", "-o", "wide"], env=env, text=True)
     lines = output.strip().split("\n")
-    for line in lines[1:]:
-        if "parsec-server" in line:
-            parsec_node_name = line.split()[0]
-            break
+    parsec_nodes = [line.split()[0] for line in lines[1:] if "parsec-server" in line]
+    if not parsec_nodes:
+        raise RuntimeError("no parsec-server node in the cluster, nothing to run the sweep on")
 
-    subprocess.run(["kubectl", "label", "nodes", parsec_node_name, "cca-project-nodetype=parsec"], env=env, check=True)
+    # every parsec node is a shard of the sweep with its own interference pod
+    for shard, parsec_node_name in enumerate(parsec_nodes):
+        subprocess.run(["kubectl", "label", "nodes", parsec_node_name, "cca-project-nodetype=parsec",
+                        f"{sweep.SHARD_LABEL}={shard}", "--overwrite"], env=env, check=True)
 
     current_time = datetime.now()
     formatted_time = current_time.strftime("%d-%m-%Y-%H-%M")    
+    output_file = args.resume or f"part2a-output-{formatted_time}.csv"
+
+    prior = sweep.load_prior(args.prior if args.prior is not None else glob.glob("part2a-output-*.csv"))
+    groups = sweep.plan(intereferences, jobs, NUM_RUNS, prior, sweep.done_cells(output_file))
+
+    k8s = cluster.make_cluster(args.k8s, args.api_server, env)
+
+    # job completion and pod readiness arrive as watch events, no polling
+    jobs_watch = k8s_watch.ResourceWatch(k8s_watch.make_source("jobs", args.api_server, env=env))
+    jobs_watch.start()
+    pods_watch = k8s_watch.ResourceWatch(k8s_watch.make_source("pods", args.api_server, env=env))
+    pods_watch.start()
 
     # Run the processes
-    for interference in intereferences:
-        if interference is not None:
-            int_name = f"ibench-{interference}" 
-            subprocess.run(["kubectl", "create", "-f" f"interference_parsec/ibench-{interference}.yaml"], env=env, check=True)
-
-            output = subprocess.check_output(["kubectl", "get", "pods", "--selector=name="+int_name], env=env, text=True)
-            while not is_pod_ready(output):
-                print("Interference not ready yet...")
-                time.sleep(30)
-                output = subprocess.check_output(["kubectl", "get", "pods", "--selector=name="+int_name], env=env, text=True)
-
-        for job in jobs:
-            job_name = f"parsec-{job}"
-
-            for i in range(NUM_RUNS):
-                
-                subprocess.run(["kubectl", "create", "-f", f"parsec-benchmarks/part2a/{job_name}.yaml"], env=env, check=True)
-
-                output = subprocess.check_output(["kubectl", "get", "jobs"], env=env, text=True)
-                while not is_job_completed(output):
-                    print("Job not completed yet...")
-                    time.sleep(30)
-                    output = subprocess.check_output(["kubectl", "get", "jobs"], env=env, text=True)
-
-                pod_name = subprocess.check_output([
-                        "kubectl", "get", "pods",
-                        "--selector=job-name=" + job_name,
-                        "--output=jsonpath={.items[*].metadata.name}"
-                    ], env=env, text=True).strip()
-                metrics_output = subprocess.check_output(["kubectl", "logs", pod_name], env=env, text=True)
-                
-                r,u,s = extract_times(metrics_output) # here the run times are returned
-
-                subprocess.run(["kubectl", "delete", "job", job_name], env=env, check=True)
-                
-                write_run_data(f"part2a-output-{formatted_time}.csv", interference, job, r, u, s)
-             
-        if interference is not None:
-            subprocess.run(["kubectl", "delete", "pod", int_name], env=env, check=True)
+    sweep.ShardedSweep(k8s, jobs_watch, pods_watch, parsec_nodes, output_file, extract_times, write_run_data).run(groups)
+
+    jobs_watch.stop()
+    pods_watch.stop()
 
     # Make sure there are no witnesses
-    subprocess.run(["kubectl", "delete", "jobs", "--all"])
-    subprocess.run(["kubectl", "delete", "pods", "--all"])
+    k8s.delete_all("jobs")
+    k8s.delete_all("pods")
+    k8s.report()
 
     # subprocess.run(["kops", "delete", "cluster", "--name", f"part2a.k8s.local", "--yes"], check=True)
     # print("Successfully deleted cluster!")
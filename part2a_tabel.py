@@ -7,7 +7,7 @@ if __name__ == "__main__":
 
     with open("part2a-output-26-04-2025-19-35.csv", "r") as f:
         for line in f:
-            interference, workload, real_time, _, _ = line.split(",")
+            interference, workload, real_time = line.split(",")[:3]
             workloads[workload][interference] = float(real_time)
 
     print("\t\t\t",end=" ")
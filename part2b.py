@@ -1,42 +1,26 @@
 import os
 import subprocess
 import re
-import time
+import argparse
 from datetime import datetime
 
+import cluster
+import k8s_watch
+import manifests
+import perf_model
+
 env = os.environ.copy()
 
 env["PROJECT"] = "cca-eth-2025-group-008"
 env["KOPS_STATE_STORE"] = "gs://cca-eth-2025-group-008-dbociat"
 
 threads = [4, 8]
+adaptive_threads = [1, 2, 4, 8]
 jobs = ["blackscholes", "canneal", "dedup", "ferret", "freqmine", "radix", "vips"] 
 
 NUM_RUNS = 1
 
-def is_job_completed(kubectl_output):
-    lines = kubectl_output.strip().splitlines()
-    if len(lines) < 2:
-        return False 
-
-    job_info = lines[1]
-    parts = job_info.split()
-
-    completions = parts[2]
-
-    return completions == "1/1"
-
-def is_pod_ready(kubectl_output):
-    lines = kubectl_output.strip().splitlines()
-    if len(lines) < 2:
-        return False 
-
-    pod_info = lines[1]
-    parts = pod_info.split()
-
-    readiness = parts[1]
-
-    return readiness == "1/1"
+templates = manifests.TemplateRenderer("parsec-benchmarks/part2b")
 
 def extract_times(output):
     match = re.search(r"real\s+(\d+)m([\d.]+)s\s+user\s+(\d+)m([\d.]+)s\s+sys\s+(\d+)m([\d.]+)s", output)
@@ -56,26 +40,49 @@ def write_run_data(filename, no_threads, job_name, real_time, user_time, sys_tim
     with open(filename, "a") as f:
         f.write(line)
 
-def update_template(filename, num_threads):
-    script_dir = os.path.dirname(__file__)
-    rel_path = f"parsec-benchmarks/part2b/{filename}-template.yaml"
-    abs_file_path = os.path.join(script_dir, rel_path)
+def sort_run_data(filename):
+    # plot_part2b.py normalizes by each job's first row, so keep the file ordered by thread count
+    with open(filename) as f:
+        lines = f.readlines()
+    lines.sort(key=lambda line: int(line.split(",")[0]))
+    with open(filename, "w") as f:
+        f.writelines(lines)
 
-    with open(abs_file_path) as f:
-        schemas = f.read()
+def run_job(k8s, jobs_watch, job, no_threads):
+    job_name = f"parsec-{job}"
+    k8s.create(templates.render(job_name, n=no_threads))
 
-    schemas = schemas.replace("<n>", str(num_threads))
+    jobs_watch.wait_for(job_name, k8s_watch.job_completed, failed=k8s_watch.job_failed)
+    print(f"{job_name} completed")
 
-    script_dir = os.path.dirname(__file__)
-    rel_path = f"parsec-benchmarks/part2b/{filename}.yaml"
-    abs_file_path = os.path.join(script_dir, rel_path)
-
-    with open(abs_file_path, "w") as f:
-        f.write(schemas)
+    pod_name = k8s.pod_names("job-name=" + job_name)[0]
+    metrics_output = k8s.logs(pod_name)
+    
+    r,u,s = extract_times(metrics_output) # here the run times are returned
+
+    jobs_watch.forget(job_name)
+    k8s.delete("jobs", job_name)
+    return r, u, s
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api-server", default=None, metavar="URL",
+                        help="Talk to and watch the cluster through this API server (e.g. a kubectl proxy)")
+    parser.add_argument("--k8s", choices=["api", "kubectl"], default="api",
+                        help="Call the API server directly (falls back to kubectl without a usable kubeconfig) or run kubectl")
+    parser.add_argument("--adaptive", action="store_true", default=False,
+                        help="Fit the speedup model after every run and only measure the (job, threads) points it is unsure about")
+    parser.add_argument("--threads", type=int, nargs="+", default=None,
+                        help=f"Thread counts to measure (default: {threads}, adaptive: {adaptive_threads})")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="Adaptive: stop a job once every thread count is predicted to within this fraction")
+    return parser.parse_args()
 
 if __name__ == '__main__':
     # Init steps
 
+    args = parse_args()
+
     subprocess.run(["gcloud", "auth", "application-default", "login"], check=True)
     subprocess.run(["gcloud", "init"], check=True)
     subprocess.run(["kops", "create", "-f", "part2b.yaml"], env=env, check=True)
@@ -95,39 +102,38 @@ if __name__ == '__main__':
     current_time = datetime.now()
     formatted_time = current_time.strftime("%d-%m-%Y-%H-%M")    
 
-    # Run the processes
-    for no_threads in threads:
-        for job in jobs:
-            job_name = f"parsec-{job}"
+    k8s = cluster.make_cluster(args.k8s, args.api_server, env)
 
+    # job completion and pod readiness arrive as watch events, no polling
+    jobs_watch = k8s_watch.ResourceWatch(k8s_watch.make_source("jobs", args.api_server, env=env))
+    jobs_watch.start()
+
+    output_file = f"part2b-output-{formatted_time}.csv"
+
+    # Run the processes
+    if args.adaptive:
+        sweep = perf_model.AdaptiveSweep(jobs, args.threads or adaptive_threads, args.tolerance)
+        while (point := sweep.next_point()) is not None:
+            job, no_threads = point
             for i in range(NUM_RUNS):
-                
-                update_template(job_name, no_threads) 
-
-                subprocess.run(["kubectl", "create", "-f", f"parsec-benchmarks/part2b/{job_name}.yaml"], env=env, check=True)
-
-                output = subprocess.check_output(["kubectl", "get", "jobs"], env=env, text=True)
-                while not is_job_completed(output):
-                    print("Job not completed yet...")
-                    time.sleep(30)
-                    output = subprocess.check_output(["kubectl", "get", "jobs"], env=env, text=True)
-
-                pod_name = subprocess.check_output([
-                        "kubectl", "get", "pods",
-                        "--selector=job-name=" + job_name,
-                        "--output=jsonpath={.items[*].metadata.name}"
-                    ], env=env, text=True).strip()
-                metrics_output = subprocess.check_output(["kubectl", "logs", pod_name], env=env, text=True)
-                
-                r,u,s = extract_times(metrics_output) # here the run times are returned
-
-                subprocess.run(["kubectl", "delete", "job", job_name], env=env, check=True)
-                
-                write_run_data(f"part2b-output-{formatted_time}.csv", no_threads, job, r, u, s)
+                r,u,s = run_job(k8s, jobs_watch, job, no_threads)
+                sweep.add(job, no_threads, r)
+                write_run_data(output_file, no_threads, job, r, u, s)
+        sweep.report()
+    else:
+        for no_threads in args.threads or threads:
+            for job in jobs:
+                for i in range(NUM_RUNS):
+                    r,u,s = run_job(k8s, jobs_watch, job, no_threads)
+                    write_run_data(output_file, no_threads, job, r, u, s)
+    sort_run_data(output_file)
+
+    jobs_watch.stop()
 
     # Make sure there are no witnesses
-    subprocess.run(["kubectl", "delete", "jobs", "--all"])
-    subprocess.run(["kubectl", "delete", "pods", "--all"])
+    k8s.delete_all("jobs")
+    k8s.delete_all("pods")
+    k8s.report()
 
     subprocess.run(["kops", "delete", "cluster", "--name", f"part2b.k8s.local", "--yes"], env=env, check=True)
     # print("Successfully deleted cluster!")
@@ -1,10 +1,17 @@
 import os
 import subprocess
 import re
-import time
 import argparse
 from datetime import datetime
-from collections import defaultdict
+
+import json
+
+import cluster
+import job_queue
+import k8s_watch
+import manifests
+import perf_model
+import remote
 
 env = os.environ.copy()
 
@@ -19,6 +26,7 @@ nodes = ["node-a-2core", "node-b-2core", "node-c-4core", "node-d-4core"]
 # node-b-2core - n2-highcpu-2 - 2 cpus, 2 gb
 # node-c-4core - c3-highcpu-4 - 4 cpus, 8 gb
 # node-d-4core - n2-standard-4 - 4 cpus, 16 gb
+NODE_CORES = {nodes[0]: 2, nodes[1]: 2, nodes[2]: 4, nodes[3]: 4}
 
 config = {
     "radix" : (nodes[0],"0", 1),
@@ -52,34 +60,12 @@ config = {
 
 NUM_RUNS = 1
 
+templates = manifests.TemplateRenderer("part3")
+
 def log_run_results(parsec_output, memcached_output):
     pass
 
 
-def is_job_completed(kubectl_output):
-    lines = kubectl_output.strip().splitlines()
-    if len(lines) < 2:
-        return False 
-
-    job_info = lines[1]
-    parts = job_info.split()
-
-    completions = parts[2]
-
-    return completions == "1/1"
-
-def is_pod_ready(kubectl_output):
-    lines = kubectl_output.strip().splitlines()
-    if len(lines) < 2:
-        return False 
-
-    pod_info = lines[1]
-    parts = pod_info.split()
-
-    readiness = parts[1]
-
-    return readiness == "1/1"
-
 def extract_times(output):
     match = re.search(r"real\s+(\d+)m([\d.]+)s\s+user\s+(\d+)m([\d.]+)s\s+sys\s+(\d+)m([\d.]+)s", output)
 
@@ -98,28 +84,38 @@ def write_run_data(filename, no_threads, job_name, real_time, user_time, sys_tim
     with open(filename, "a") as f:
         f.write(line)
 
-def update_template(filename, node_label, cores, num_threads):
-    script_dir = os.path.dirname(__file__)
-    rel_path = f"part3/{filename}-template.yaml"
-    abs_file_path = os.path.join(script_dir, rel_path)
+def render(job):
+    # the job's manifest for its (node, cores, threads) in config
+    node, cores, num_threads = config[job]
+    return templates.render(job, n=num_threads, node_label=node, cores=cores)
 
-    with open(abs_file_path) as f:
-        schemas = f.read()
 
-    schemas = schemas.replace("<n>", str(num_threads))
-    schemas = schemas.replace("<node_label>", node_label)
-    schemas = schemas.replace("<cores>", cores)
+def setup_client(pool, client, name, no_setup, agent_threads=None):
+    if not no_setup:
+        pool.put(client, "update_mcperf.sh")
+        print(f"Uploaded shell script to client {name}")
+
+        pool.run(client, "chmod +x ~/update_mcperf.sh && ~/update_mcperf.sh")
+        print(f"Updated mcperf in client {name}")
+
+    if agent_threads is not None:
+        pool.popen(client, f"cd memcache-perf-dynamic && ./mcperf -T {agent_threads} -A", stdout=subprocess.DEVNULL)
+        print(f"Started mcperf in client {name}")
 
-    script_dir = os.path.dirname(__file__)
-    rel_path = f"part3/{filename}.yaml"
-    abs_file_path = os.path.join(script_dir, rel_path)
 
-    with open(abs_file_path, "w") as f:
-        f.write(schemas)
-        
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("--no-setup", action="store_true", default=False, help="Runs without the one time setup")
+    parser.add_argument("--plan", nargs="+", default=None, metavar="CSV",
+                        help="Replace the hand-tuned config with one planned from speedup fits of these part2b csvs")
+    parser.add_argument("--ssh", choices=["multiplexed", "gcloud"], default="multiplexed",
+                        help="Keep one ssh connection per VM, or run a gcloud compute ssh/scp per remote step")
+    parser.add_argument("--exclusive-cores", action="store_true", default=False,
+                        help="Only run jobs with disjoint cpusets on a node at the same time, not just different ones")
+    parser.add_argument("--api-server", default=None, metavar="URL",
+                        help="Talk to and watch the cluster through this API server (e.g. a kubectl proxy)")
+    parser.add_argument("--k8s", choices=["api", "kubectl"], default="api",
+                        help="Call the API server directly (falls back to kubectl without a usable kubeconfig) or run kubectl")
     return parser.parse_args()
 
 
@@ -128,6 +124,16 @@ if __name__ == '__main__':
 
     args = parse_args()
 
+    if args.plan:
+        model = perf_model.PerformanceModel.from_csvs(args.plan)
+        memcached_node, memcached_cores, _ = config["memcached"]
+        planned, jobs, makespan = perf_model.plan_part3(model, jobs, NODE_CORES,
+                                                        {memcached_node: [int(c) for c in memcached_cores.split(",")]})
+        config.update(planned)
+        for job in jobs:
+            print(f"Planned {job}: {config[job]}")
+        print(f"Predicted makespan: {makespan:.1f} s")
+
     # if not args.no_setup:
         # subprocess.run(["gcloud", "auth", "application-default", "login"], check=True)
         # subprocess.run(["gcloud", "init"], check=True)
@@ -157,126 +163,73 @@ if __name__ == '__main__':
     print("A: ", client_agent_a, client_agent_a_internal_ip)
     print("B: ", client_agent_b, client_agent_b_internal_ip)
 
-    for job in jobs:
-        update_template(job, config[job][0], config[job][1], config[job][2])
-    update_template("memcached", config["memcached"][0], config["memcached"][1], config["memcached"][2])
-
-    if not args.no_setup:
-        subprocess.run(["gcloud", "compute", "scp", "update_mcperf.sh",  f"ubuntu@{client_agent_a}:~/", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing"])
-        print("Uploaded shell script to client A")
-
-        subprocess.run(["gcloud", "compute", "ssh", f"ubuntu@{client_agent_a}", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing", "--command", "chmod +x ~/update_mcperf.sh && ~/update_mcperf.sh"])
-        print("Updated mcperf in client A")
-
-    subprocess.Popen(["gcloud", "compute", "ssh", f"ubuntu@{client_agent_a}", "--zone", "europe-west1-b", 
-                    "--ssh-key-file", "~/.ssh/cloud-computing", "--quiet", "--command", "cd memcache-perf-dynamic && ./mcperf -T 2 -A"], stdout=subprocess.DEVNULL)
-    print("Started mcperf in client A")
+    # a bad config fails here, before anything runs on the cluster
+    for job in jobs + ["memcached"]:
+        render(job)
 
-    if not args.no_setup:
-        subprocess.run(["gcloud", "compute", "scp", "update_mcperf.sh",  f"ubuntu@{client_agent_b}:~/", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing"])
-        print("Uploaded shell script to client B")
+    pool = remote.RemotePool(multiplexed=args.ssh == "multiplexed")
+    k8s = cluster.make_cluster(args.k8s, args.api_server, env)
 
-        subprocess.run(["gcloud", "compute", "ssh", f"ubuntu@{client_agent_b}", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing", "--command", "chmod +x ~/update_mcperf.sh && ~/update_mcperf.sh"])
-        print("Updated mcperf in client B")
-    
-    subprocess.Popen(["gcloud", "compute", "ssh", f"ubuntu@{client_agent_b}", "--zone", "europe-west1-b", 
-                    "--ssh-key-file", "~/.ssh/cloud-computing", "--quiet", "--command", "cd memcache-perf-dynamic && ./mcperf -T 4 -A"], stdout=subprocess.DEVNULL)
-    print("Started mcperf in client B")
-
-    if not args.no_setup:
-        subprocess.run(["gcloud", "compute", "scp", "update_mcperf.sh",  f"ubuntu@{client_measure}:~/", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing"])
-        print("Uploaded shell script to client Measure")
-
-        subprocess.run(["gcloud", "compute", "ssh", f"ubuntu@{client_measure}", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing", "--command", "chmod +x ~/update_mcperf.sh && ~/update_mcperf.sh"])
-        print("Updated mcperf in client Measure")
+    # the clients are set up independently of each other
+    pool.parallel(lambda: setup_client(pool, client_agent_a, "A", args.no_setup, agent_threads=2),
+                  lambda: setup_client(pool, client_agent_b, "B", args.no_setup, agent_threads=4),
+                  lambda: setup_client(pool, client_measure, "Measure", args.no_setup))
         
     for i in range(NUM_RUNS):        
-        subprocess.run(["kubectl", "create", "-f", f"part3/memcached.yaml"], env=env, check=True)
-        subprocess.run(["kubectl", "expose", "pod", "some-memcached", "--name", "some-memcached-11211",
-                        "--type", "LoadBalancer", "--port", "11211", "--protocol", "TCP"], env=env, check=True)
-
-        output = subprocess.check_output(["kubectl", "get", "pods", "--selector=name=some-memcached", "-o", "wide"], env=env, text=True)
-        while not is_pod_ready(output):
-            print("Memcached not ready yet...")
-            time.sleep(30)
-            output = subprocess.check_output(["kubectl", "get", "pods", "--selector=name=some-memcached", "-o", "wide"], env=env, text=True)
-        
-        lines = output.strip().split("\n")
-        for line in lines:
-            print(line)
-            if "memcache" in line:
-                memcached_ip = line.split()[5]
+        pods_watch = k8s_watch.ResourceWatch(k8s_watch.make_source("pods", args.api_server, "name=some-memcached", env))
+        pods_watch.start()
+        k8s.create(render("memcached"))
+        k8s.expose("some-memcached", "some-memcached-11211", 11211, "LoadBalancer", "TCP")
+
+        memcached_ip = pods_watch.wait_for("some-memcached", k8s_watch.pod_ready)["status"]["podIP"]
+        pods_watch.stop()
         print("MEMCACHED_IP: ", memcached_ip)
 
         print("Memcached running!")
 
-        subprocess.run(["gcloud", "compute", "ssh", f"ubuntu@{client_measure}", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing", "--command", f"cd memcache-perf-dynamic && ./mcperf -s {memcached_ip} --loadonly"])
-        subprocess.Popen(["gcloud", "compute", "ssh", f"ubuntu@{client_measure}", "--zone", "europe-west1-b", 
-                        "--ssh-key-file", "~/.ssh/cloud-computing", "--command", f"cd memcache-perf-dynamic && ./mcperf -s {memcached_ip} -a {client_agent_a_internal_ip} \
-                            -a {client_agent_b_internal_ip} --noload -T 6 -C 4 -D 4 -Q 1000 -c 4 -t 10 --scan 30000:30500:5 > results.txt"], stdout=subprocess.DEVNULL)
+        pool.run(client_measure, f"cd memcache-perf-dynamic && ./mcperf -s {memcached_ip} --loadonly")
+        pool.popen(client_measure, f"cd memcache-perf-dynamic && ./mcperf -s {memcached_ip} -a {client_agent_a_internal_ip} \
+                            -a {client_agent_b_internal_ip} --noload -T 6 -C 4 -D 4 -Q 1000 -c 4 -t 10 --scan 30000:30500:5 > results.txt", stdout=subprocess.DEVNULL)
         print("Started mcperf in client Measure")
 
         # Run the processes
-    
-        completed_jobs = set()
-        RUNNING_JOBS = defaultdict(lambda: "")
-
-        while True:
-            for job in jobs:
-                if job in completed_jobs: continue
-
-                if RUNNING_JOBS[(config[job][0], config[job][1])] == "":
-                    print("Scheduled: ", job)
-                    subprocess.run(["kubectl", "create", "-f", f"part3/{job}.yaml"], env=env, check=True)
-                    RUNNING_JOBS[(config[job][0], config[job][1])] = job
-                else:
-                    running_job = RUNNING_JOBS[(config[job][0], config[job][1])]
-                    result = subprocess.run(
-                        ["kubectl", "get", "job", running_job, "-o", "jsonpath={.status.succeeded}"],
-                        capture_output=True, text=True
-                    )
-
-                    if result.stdout.strip() == "1":
-                        print(running_job, "completed")
-                        completed_jobs.add(running_job)
-                        
-                        if job in completed_jobs: continue
-
-                        print("Scheduled: ", job)
-                        subprocess.run(["kubectl", "create", "-f", f"part3/{job}.yaml"], env=env, check=True)
-                        RUNNING_JOBS[(config[job][0], config[job][1])] = job
-                    else:
-                        continue
-
-            if len(completed_jobs) == len(jobs): break
-            
+        # jobs start from per-node queues as soon as the completion of a job frees its cores
+        scheduler = job_queue.JobQueueScheduler(
+            config, jobs,
+            submit=lambda batch: k8s.create_many([render(job) for job in batch]),
+            exclusive_cores=args.exclusive_cores)
+        # a fresh watch per run, the previous run's jobs are deleted by now
+        jobs_watch = k8s_watch.ResourceWatch(k8s_watch.make_source("jobs", args.api_server, env=env))
+        jobs_watch.add_listener(scheduler.job_event)
+        jobs_watch.start()
+        scheduler.run()
+        jobs_watch.stop()
+        scheduler.report()
+
         with open(f"results-jobs-{i}-{formatted_time}.json", "w") as outfile:
-            subprocess.run(["kubectl", "get", "pods", "-o", "json"], env=env, stdout=outfile, check=True)
+            json.dump({"apiVersion": "v1", "kind": "List", "items": k8s.list("pods")}, outfile, indent=4)
         
         # with open(f"results-config-{formatted_time}.txt", "w") as outfile:
         #     for job in jobs:
         #         outfile.write(config[job])
         subprocess.run(["python3", "get_time.py", f"results-jobs-{i}-{formatted_time}.json"], check=True)
    
-        subprocess.run(["gcloud", "compute", "scp", f"ubuntu@{client_measure}:~/memcache-perf-dynamic/results.txt", f"memcached_results_{i}_{formatted_time}.txt", "--zone", "europe-west1-b", 
-                "--ssh-key-file", "~/.ssh/cloud-computing"])
+        pool.get(client_measure, "~/memcache-perf-dynamic/results.txt", f"memcached_results_{i}_{formatted_time}.txt")
 
         log_run_results(f"results-jobs-{i}.json", f"memcached_results_{formatted_time}.txt")
 
         # Make sure there are no witnesses
-        subprocess.run(["kubectl", "delete", "jobs", "--all"])
-        subprocess.run(["kubectl", "delete", "pods", "--all"])
-        subprocess.run(["kubectl", "delete", "services", "some-memcached-11211"])
+        k8s.delete_all("jobs")
+        k8s.delete_all("pods")
+        k8s.delete("services", "some-memcached-11211")
 
         print("Finished run ", i)
 
+    pool.report()
+    pool.close()
+    k8s.report()
+    templates.report()
+
 
     # subprocess.run(["kops", "delete", "cluster", "--name", f"part3.k8s.local", "--yes"], check=True)
     # print("Successfully deleted cluster!")
@@ -0,0 +1,274 @@
+import argparse
+import csv
+import itertools
+import math
+from collections import defaultdict
+
+
+class SpeedupFit:
+    # runtime(n) for n threads on n cores, either
+    #   amdahl:    T1 * ((1 - p) + p / n)
+    #   gustafson: T1 / (n - alpha * (n - 1))
+    def __init__(self, kind: str, t1: float, param: float, sse: float):
+        self.kind = kind
+        self.t1 = t1
+        self.param = param
+        self.sse = sse
+
+    def runtime(self, n: float) -> float:
+        if self.kind == "amdahl":
+            return self.t1 * ((1 - self.param) + self.param / n)
+        return self.t1 / (n - self.param * (n - 1))
+
+    def __repr__(self):
+        name = "p" if self.kind == "amdahl" else "alpha"
+        return f"{self.kind}(T1={self.t1:.1f}s, {name}={self.param:.3f}, sse={self.sse:.2f})"
+
+
+def _sse(fit: SpeedupFit, points: list) -> float:
+    return sum((fit.runtime(n) - t) ** 2 for n, t in points)
+
+
+def fit_amdahl(points: list) -> SpeedupFit:
+    # T(n) = a + b / n is linear in 1/n
+    xs = [1 / n for n, _ in points]
+    ys = [t for _, t in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    b = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var if var else 0.0
+    a = mean_y - b * mean_x
+    t1 = a + b
+    p = min(1.0, max(0.0, b / t1)) if t1 > 0 else 0.0
+    fit = SpeedupFit("amdahl", t1, p, 0.0)
+    fit.sse = _sse(fit, points)
+    return fit
+
+
+def fit_gustafson(points: list) -> SpeedupFit:
+    t1 = dict(points).get(1)
+    if t1 is None:
+        return None
+    # S(n) = n - alpha (n - 1), least squares for alpha on the measured speedups
+    num = sum((n - t1 / t) * (n - 1) for n, t in points)
+    den = sum((n - 1) ** 2 for n, _ in points)
+    alpha = min(1.0, max(0.0, num / den)) if den else 0.0
+    fit = SpeedupFit("gustafson", t1, alpha, 0.0)
+    fit.sse = _sse(fit, points)
+    return fit
+
+
+class PerformanceModel:
+    def __init__(self, measurements: dict):
+        # {job: [(threads, real seconds)]}, repeated runs averaged
+        self.measurements = measurements
+        self.fits = dict()
+        for job, points in measurements.items():
+            candidates = [f for f in (fit_amdahl(points), fit_gustafson(points)) if f is not None]
+            self.fits[job] = min(candidates, key=lambda f: f.sse)
+
+    @classmethod
+    def from_csvs(cls, paths: list):
+        runs = defaultdict(lambda: defaultdict(list))
+        for path in paths:
+            with open(path) as csv_file:
+                for row in csv.reader(csv_file, delimiter=','):
+                    runs[row[1]][int(row[0])].append(float(row[2]))
+        measurements = {job: sorted((n, sum(ts) / len(ts)) for n, ts in by_threads.items())
+                        for job, by_threads in runs.items()}
+        return cls(measurements)
+
+    # extra threads beyond the cores a job holds do not add parallelism; cores may be fractional
+    def predict_runtime(self, job: str, threads: int, cores: float) -> float:
+        return self.fits[job].runtime(max(1, min(threads, cores)))
+
+
+def _relative_rms(fit: SpeedupFit, points: list) -> float:
+    return math.sqrt(sum(((fit.runtime(n) - t) / t) ** 2 for n, t in points) / len(points))
+
+
+def _plausible_fits(points: list, noise: float) -> list:
+    # the fits the measurements cannot tell apart yet: each model that fits all points about as well
+    # as the best one (or within noise), on all points and, from three points on, on every
+    # leave-one-out subset
+    subsets = [points]
+    if len(points) >= 3:
+        subsets += [points[:i] + points[i + 1:] for i in range(len(points))]
+    by_kind = {"amdahl": fit_amdahl, "gustafson": fit_gustafson}
+    full = {kind: fit(points) for kind, fit in by_kind.items() if len(points) >= 2 or kind == "gustafson"}
+    rms = {kind: _relative_rms(fit, points) for kind, fit in full.items() if fit is not None}
+    limit = 2 * max(min(rms.values(), default=0.0), noise)
+    fits = []
+    for kind in (kind for kind, error in rms.items() if error <= limit):
+        fits += [by_kind[kind](subset) for subset in subsets if len(subset) >= 2 or kind == "gustafson"]
+    return [f for f in fits if f is not None]
+
+
+class AdaptiveSweep:
+    # Chooses the part 2b measurements one at a time. Each job starts at its lowest and highest
+    # candidate thread count; after that the next point is the unmeasured (job, threads) where the
+    # plausible fits disagree most relative to run-to-run noise, i.e. the largest expected information
+    # gain 0.5 * log(1 + spread^2 / noise^2) for a Gaussian prediction. A job is done once it has three
+    # points and every unmeasured candidate is predicted to within tolerance (relative half spread).
+    def __init__(self, jobs: list, candidates: list, tolerance: float = 0.05, noise: float = 0.02):
+        self.jobs = jobs
+        self.candidates = sorted(candidates)
+        self.tolerance = tolerance
+        self.noise = noise
+        self.runs = {job: defaultdict(list) for job in jobs}
+
+    def add(self, job: str, threads: int, real: float) -> None:
+        self.runs[job][threads].append(real)
+
+    def points(self, job: str) -> list:
+        return sorted((n, sum(ts) / len(ts)) for n, ts in self.runs[job].items())
+
+    def _noise(self, job: str) -> float:
+        # relative standard deviation of repeated runs, never below the configured floor
+        spreads = [(ts, sum(ts) / len(ts)) for ts in self.runs[job].values() if len(ts) > 1]
+        if not spreads:
+            return self.noise
+        var = sum(sum((t - mean) ** 2 for t in ts) / (len(ts) - 1) / mean ** 2 for ts, mean in spreads) / len(spreads)
+        return max(self.noise, math.sqrt(var))
+
+    def uncertainty(self, job: str) -> dict:
+        # {unmeasured threads: (predicted runtime, relative half spread)}, spread inf without a fit
+        points = self.points(job)
+        fits = _plausible_fits(points, self._noise(job)) if points else []
+        result = dict()
+        for n in self.candidates:
+            if n in self.runs[job]:
+                continue
+            predictions = [f.runtime(n) for f in fits]
+            if len(predictions) < 2:
+                result[n] = (predictions[0] if predictions else float("nan"), float("inf"))
+                continue
+            mean = sum(predictions) / len(predictions)
+            result[n] = (mean, (max(predictions) - min(predictions)) / 2 / mean)
+        return result
+
+    def done(self, job: str) -> bool:
+        # two points fit either model exactly, so their agreement says nothing yet
+        if len(self.runs[job]) < min(3, len(self.candidates)):
+            return False
+        return all(spread <= self.tolerance for _, spread in self.uncertainty(job).values())
+
+    def next_point(self):
+        # (job, threads) to measure next, None once every job is done
+        best, best_gain = None, -1.0
+        for job in self.jobs:
+            measured = self.runs[job]
+            seeds = [n for n in (self.candidates[0], self.candidates[-1]) if n not in measured]
+            if seeds:
+                return job, seeds[0]
+            if self.done(job):
+                continue
+            noise = self._noise(job)
+            for n, (_, spread) in self.uncertainty(job).items():
+                gain = 0.5 * math.log1p((spread / noise) ** 2) if math.isfinite(spread) else float("inf")
+                if gain > best_gain:
+                    best, best_gain = (job, n), gain
+        return best
+
+    def model(self) -> PerformanceModel:
+        return PerformanceModel({job: self.points(job) for job in self.jobs if self.runs[job]})
+
+    def report(self) -> None:
+        measured = sum(len(self.runs[job]) for job in self.jobs)
+        print(f"measured {measured} of {len(self.jobs) * len(self.candidates)} (job, threads) points")
+        model = self.model()
+        for job in self.jobs:
+            predicted = ", ".join(f"{n}:~{t:.1f}" for n, (t, _) in sorted(self.uncertainty(job).items()))
+            print(f"{job:>12}: {model.fits[job]}" + (f"  predicted {predicted}" if predicted else ""))
+
+
+# thread counts a job can run with, all others are fine; splash2x radix needs a power of two
+ALLOWED_THREADS = {"radix": {1, 2, 4, 8}}
+
+
+def allows_threads(job: str, threads: int) -> bool:
+    return threads in ALLOWED_THREADS.get(job, {threads})
+
+
+def plan_controller_jobs(model: PerformanceModel, jobs: list, base_cores: list, shared_cores: list,
+                         shared_fraction: float = 0.5, min_gain: float = 0.15) -> dict:
+    # the controller runs one job at a time on base_cores; a job also gets the cores it shares
+    # with memcached only if the model predicts at least min_gain shorter runtime from them.
+    # memcached keeps part of a shared core, so it only counts as shared_fraction of a core
+    plan = dict()
+    for job in jobs:
+        base = model.predict_runtime(job, len(base_cores), len(base_cores))
+        cores = base_cores + shared_cores
+        shared = model.predict_runtime(job, len(cores), len(base_cores) + shared_fraction * len(shared_cores))
+        if shared > base * (1 - min_gain) or not allows_threads(job, len(cores)):
+            cores = base_cores
+        if not allows_threads(job, len(cores)):
+            raise ValueError(f"{job} cannot run with {len(cores)} threads on cores {','.join(cores)}")
+        plan[job] = {"cpuset_cpus": ",".join(sorted(cores)), "num_threads": len(cores)}
+    return plan
+
+
+def _node_layouts(free_cores: list) -> list:
+    # every split of the free cores into contiguous blocks, each block runs its jobs one after another
+    layouts = []
+    for cuts in itertools.product([False, True], repeat=len(free_cores) - 1):
+        blocks, block = [], [free_cores[0]]
+        for core, cut in zip(free_cores[1:], cuts):
+            if cut:
+                blocks.append(block)
+                block = []
+            block.append(core)
+        blocks.append(block)
+        layouts.append(blocks)
+    return layouts
+
+
+def plan_part3(model: PerformanceModel, jobs: list, nodes: dict, reserved: dict = None) -> tuple:
+    # nodes: {node: num_cores}, reserved: {node: [cores]} (e.g. memcached's core).
+    # Longest-processing-time-first over every combination of per-node core layouts, a job only goes to
+    # blocks whose size it allows as thread count.
+    # Returns ({job: (node, cores, threads)}, job start order, predicted makespan).
+    reserved = reserved or dict()
+    per_node = []
+    for node, num_cores in nodes.items():
+        free = [c for c in range(num_cores) if c not in reserved.get(node, [])]
+        per_node.append([[(node, block) for block in layout] for layout in _node_layouts(free)] if free else [[]])
+
+    order = sorted(jobs, key=lambda job: model.predict_runtime(job, 1, 1), reverse=True)
+    best = (None, None, float("inf"))
+    for layout in itertools.product(*per_node):
+        slots = [slot for node_slots in layout for slot in node_slots]
+        ready = [0.0] * len(slots)
+        config = dict()
+        for job in order:
+            finish = [ready[i] + model.predict_runtime(job, len(block), len(block))
+                      if allows_threads(job, len(block)) else float("inf") for i, (_, block) in enumerate(slots)]
+            i = min(range(len(slots)), key=lambda k: finish[k])
+            # no block of this layout fits the job
+            if finish[i] == float("inf"):
+                break
+            ready[i] = finish[i]
+            node, block = slots[i]
+            config[job] = (node, ",".join(str(c) for c in block), len(block))
+        if len(config) < len(order):
+            continue
+        makespan = max(ready)
+        if makespan < best[2]:
+            best = (config, order, makespan)
+    if best[0] is None:
+        raise ValueError(f"no core layout of {nodes} fits the allowed thread counts of {', '.join(jobs)}")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("csvs", nargs="+", help="part2b output csv files (threads,job,real,user,sys)")
+    args = parser.parse_args()
+
+    model = PerformanceModel.from_csvs(args.csvs)
+    for job, fit in sorted(model.fits.items()):
+        measured = ", ".join(f"{n}:{t:.1f}" for n, t in model.measurements[job])
+        print(f"{job:>12}: {fit}  measured {measured}")
+
+
+if __name__ == "__main__":
+    main()
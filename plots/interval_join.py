@@ -0,0 +1,85 @@
+import numpy as np
+
+
+# Aggregates timestamped samples over [start, end] windows (both ends inclusive), e.g. CPU samples
+# over mcperf load intervals, in O((samples + intervals) log samples). Windows must be sorted and
+# must not overlap, which holds for the intervals of one mcperf run. Empty windows give NaN for every
+# aggregation except count, which gives 0.
+
+AGGREGATIONS = ("max", "min", "mean", "sum", "count", "percentile")
+
+
+def _segments(ts: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> tuple:
+    if np.any(ends < starts) or np.any(starts[1:] <= ends[:-1]):
+        raise ValueError("intervals must be sorted and must not overlap")
+    lo = np.searchsorted(ts, starts, side="left")
+    hi = np.searchsorted(ts, ends, side="right")
+    return lo, hi
+
+
+def interval_join(ts, values, starts, ends, agg: str = "max", q: float = None) -> np.ndarray:
+    ts = np.asarray(ts)
+    values = np.asarray(values, dtype=np.float64)
+    starts = np.asarray(starts)
+    ends = np.asarray(ends)
+    if agg not in AGGREGATIONS:
+        raise ValueError(f"unknown aggregation {agg}")
+    if agg == "percentile" and q is None:
+        raise ValueError("percentile needs q")
+
+    order = np.argsort(ts, kind="stable")
+    ts, values = ts[order], values[order]
+    lo, hi = _segments(ts, starts, ends)
+    counts = hi - lo
+    empty = counts == 0
+    result = np.full(len(starts), np.nan)
+    if agg == "count":
+        return counts.astype(np.float64)
+    if len(values) == 0:
+        return result
+
+    if agg in ("mean", "sum"):
+        prefix = np.concatenate(([0.0], np.cumsum(values)))
+        sums = prefix[hi] - prefix[lo]
+        if agg == "sum":
+            result[~empty] = sums[~empty]
+            return result
+        return np.divide(sums, counts, out=result, where=~empty)
+
+    if agg in ("max", "min"):
+        ufunc = np.maximum if agg == "max" else np.minimum
+        # reduceat over [lo0, hi0, lo1, hi1, ...], every other result is one window; the padding
+        # element keeps hi == len(values) a valid index
+        padded = np.append(values, np.nan)
+        bounds = np.stack([lo, hi], axis=1).ravel()
+        reduced = ufunc.reduceat(padded, bounds)[::2]
+        result[~empty] = reduced[~empty]
+        return result
+
+    # percentile: sort the samples of each window next to each other, then interpolate linearly
+    # between the two closest ranks like np.percentile does
+    segment = np.repeat(np.arange(len(starts)), counts)
+    members = np.arange(counts.sum()) + np.repeat(lo - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    ranked = values[members][np.lexsort((values[members], segment))]
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = first + q / 100 * np.maximum(counts - 1, 0)
+    below = np.floor(position).astype(np.int64)
+    above = np.minimum(below + 1, first + counts - 1)
+    frac = position - below
+    nonempty = ~empty
+    result[nonempty] = (ranked[below[nonempty]] * (1 - frac[nonempty]) +
+                        ranked[above[nonempty]] * frac[nonempty])
+    return result
+
+
+def rolling_mean(values, window: int) -> np.ndarray:
+    # trailing mean over the last `window` values including the current one, shorter at the start;
+    # NaNs are skipped
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    n = counts[end] - counts[start]
+    return np.divide(sums[end] - sums[start], n, out=np.full(len(values), np.nan), where=n > 0)
@@ -1,6 +1,8 @@
 import json
 import matplotlib.pyplot as plt
 
+import results_cache
+
 
 NUM_RUNS = 3
 
@@ -16,27 +18,20 @@ MARKERS = {
 
 
 def parse(data_file_path: str) -> dict:
-    raw_data = None
-    with open(data_file_path, "r") as f:
-        raw_data = f.readlines()
+    columns = results_cache.load_mcperf(data_file_path)
+    section_names = columns["section_names"].tolist()
     
     parsed_data = {}
-    current_task = None
-    for line in raw_data:
-        split = line.split()
-        if len(split) > 0 and split[0] == "task":
-            split = split[1:]
-            current_task = " ".join(split)
-            parsed_data[current_task] = {"avg": []}
-        if len(split) > 0 and split[0] == "read":
-            target = split[-1]
-            num_q = float(split[-2])
-            p95 = float(split[12])
-            if target not in parsed_data[current_task].keys():
-                parsed_data[current_task][target] = [[p95], [num_q]]
-            else:
-                parsed_data[current_task][target][0].append(p95)
-                parsed_data[current_task][target][1].append(num_q)
+    for task in section_names[1:]:
+        parsed_data[task] = {"avg": []}
+    for section, target, num_q, p95 in zip(columns["section"].tolist(), columns["target"].tolist(),
+                                           columns["QPS"].tolist(), columns["p95"].tolist()):
+        current_task = section_names[section]
+        if target not in parsed_data[current_task].keys():
+            parsed_data[current_task][target] = [[p95], [num_q]]
+        else:
+            parsed_data[current_task][target][0].append(p95)
+            parsed_data[current_task][target][1].append(num_q)
     
     for task in parsed_data:
         for target in parsed_data[task]:
@@ -49,7 +44,7 @@ def parse(data_file_path: str) -> dict:
     return parsed_data
 
 
-def plot(parsed_data: dict):
+def plot(parsed_data: dict, output: str = None):
     plt.figure(figsize=(12, 7))
     # print(json.dumps(parsed_data, indent=2))
     
@@ -62,8 +57,10 @@ def plot(parsed_data: dict):
     plt.title("memcached measured part 1\n3 runs")
     plt.legend()
     plt.grid(True)
-    plt.show()
-    # plt.savefig("plot_a.png")
+    if output is None:
+        plt.show()
+    else:
+        plt.savefig(output)
 
 
 def main():
@@ -40,7 +40,7 @@ def get_data(data_path: Path) -> dict:
     return data
 
 
-def plot(parsed_data: dict):
+def plot(parsed_data: dict, output: str = None):
     plt.figure(figsize=(12, 7))
 
     for job_name in parsed_data.keys():
@@ -51,7 +51,10 @@ def plot(parsed_data: dict):
     plt.title("speedup vs number of threads")
     plt.legend()
     plt.grid(True)
-    plt.show()
+    if output is None:
+        plt.show()
+    else:
+        plt.savefig(output, dpi=300)
 
 
 def main():
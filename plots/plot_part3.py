@@ -6,6 +6,8 @@ from pathlib import Path
 import matplotlib.pyplot as plt
 import numpy as np
 
+import results_cache
+
 
 MCPERF_OUTPUT_PATH = Path("./data/part3/memcached_results.txt")
 JSON_OUTPUT_PATH = Path("./data/part3/res.json")
@@ -22,26 +24,20 @@ JOB_COLORS = {
 
 
 def parse_mcperf_output(data_file_path: Path) -> tuple:
-    raw_data = None
-    with open(data_file_path, "r") as f:
-        raw_data = f.readlines()
+    columns = results_cache.load_mcperf(data_file_path)
     
+    time_reference = int(columns["ts_start"][0])
     parsed_data = []
-    time_reference = int(raw_data[1].split()[-2])
-    for line in raw_data[1:]:
-        split = line.split()
-        p95 = float(split[12])
-        ts_start = (int(split[-2] ) - time_reference) / 1000
-        ts_end = (int(split[-1]) - time_reference) / 1000
+    for p95, ts_start, ts_end in zip(columns["p95"].tolist(), columns["ts_start"].tolist(), columns["ts_end"].tolist()):
         parsed_data.append(
             {
                 "p95": p95,
-                "ts_start": ts_start,
-                "ts_end": ts_end
+                "ts_start": (ts_start - time_reference) / 1000,
+                "ts_end": (ts_end - time_reference) / 1000
             }
         )
 
-    end_time_reference = int(raw_data[-1].split()[-1])
+    end_time_reference = int(columns["ts_end"][-1])
     print(end_time_reference)
 
     return parsed_data, time_reference, end_time_reference
@@ -102,7 +98,8 @@ def parse_jobs_json(jobs_json_path: Path, time_reference, end_time_reference) ->
     return parsed_data
 
 
-def plot(mcperf_data: list, jobs_data: list, time_reference: int, end_time_reference):
+# output_prefix saves the two figures as <prefix>_latency.png and <prefix>_jobs.png instead of showing them
+def plot(mcperf_data: list, jobs_data: list, time_reference: int, end_time_reference, output_prefix: str = None):
     plt.figure(figsize=(14, 8))
 
     bar_starts = [entry["ts_start"] for entry in mcperf_data]
@@ -124,7 +121,10 @@ def plot(mcperf_data: list, jobs_data: list, time_reference: int, end_time_refer
 
 
     plt.legend()
-    plt.show()
+    if output_prefix is None:
+        plt.show()
+    else:
+        plt.savefig(f"{output_prefix}_latency.png", dpi=300)
 
 
     plt.figure(figsize=(14, 4))
@@ -157,7 +157,10 @@ def plot(mcperf_data: list, jobs_data: list, time_reference: int, end_time_refer
     plt.xlabel("Time [s]")
     plt.yticks([])
 
-    plt.show()
+    if output_prefix is None:
+        plt.show()
+    else:
+        plt.savefig(f"{output_prefix}_jobs.png", dpi=300)
 
 def main():
     mcperf_data, time_reference, end_time_reference = parse_mcperf_output(MCPERF_OUTPUT_PATH)
@@ -1,13 +1,16 @@
 import os
-import math
-import csv
 import argparse
 import sys
+import warnings
 
 from pathlib import Path
 
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
+import numpy as np
+
+import results_cache
+from interval_join import interval_join, rolling_mean
 
 
 MCPERF_OUTPUT_1A_PATH = Path("./data/part4/1a/")
@@ -16,69 +19,63 @@ NUM_RUNS = 3
 
 
 class McperfResultData:
-    def __init__(self, num_runs: int):
-        self.num_runs = num_runs
-        self.qps = [[] for _ in range(num_runs)]
-        self.qps_averages = None
-        self.p95 = [[] for _ in range(num_runs)]
-        self.p95_averages = None
-        self.qps_errors = None
-        self.p95_errors = None
-    
-    def add_qps(self, run: int, val: float):
-        self.qps[run].append(val)
-    
-    def add_p95(self, run: int, val: float):
-        self.p95[run].append(val)
-
-    def compute_averages_and_errors(self, std_dev=True):
-        num_points = len(self.qps[0])
-        self.qps_averages = [0 for _ in range(num_points)]
-        self.p95_averages = [0 for _ in range(num_points)]
-        self.qps_errors = [0 for _ in range(num_points)]
-        self.p95_errors = [0 for _ in range(num_points)]
-
-        if self.num_runs == 1:
-            self.qps_averages = self.qps[0]
-            self.p95_averages = self.p95[0]
-            return 
-
-        for run in range(self.num_runs):
-            for i in range(num_points):
-                self.qps_averages[i] += self.qps[run][i]
-                self.p95_averages[i] += self.p95[run][i]
-        
-        self.qps_averages = [val / self.num_runs for val in self.qps_averages]
-        self.p95_averages = [val / self.num_runs for val in self.p95_averages]
-
-        if not std_dev: # error is max deviation
-            for run in range(self.num_runs):
-                for i in range(num_points):
-                    qps_diff = abs(self.qps_averages[i] - self.qps[run][i])
-                    if qps_diff > self.qps_errors[i]:
-                        self.qps_errors[i] = qps_diff
-
-                    p95_diff = abs(self.p95_averages[i] - self.p95[run][i])
-                    if p95_diff > self.p95_errors[i]:
-                        self.p95_errors[i] = p95_diff
-        else:
-            for i in range(num_points):
-                qps_vals = [self.qps[run][i] for run in range(self.num_runs)]
-                p95_vals = [self.p95[run][i] for run in range(self.num_runs)]
-
-                qps_mean = self.qps_averages[i]
-                p95_mean = self.p95_averages[i]
-
-                qps_var = sum((val - qps_mean) ** 2 for val in qps_vals) / (self.num_runs - 1)
-                p95_var = sum((val - p95_mean) ** 2 for val in p95_vals) / (self.num_runs - 1)
-
-                self.qps_errors[i] = math.sqrt(qps_var)
-                self.p95_errors[i] = math.sqrt(p95_var)
-
-                    
-    def get_plot_values(self) -> tuple:
-        self.compute_averages_and_errors()
-        return self.qps_averages, self.p95_averages, self.qps_errors, self.p95_errors
+    # runs are aligned on the target QPS, so runs may have different or missing load points;
+    # a point missing from a run is left out of that point's statistics
+    def __init__(self, num_bootstrap: int = 1000, seed: int = 0):
+        self.runs = {}  # run -> (target, qps, p95) arrays
+        self.num_bootstrap = num_bootstrap
+        self.rng = np.random.default_rng(seed)
+        self.targets = None
+        self.qps = None  # runs x targets, NaN where a run has no point
+        self.p95 = None
+
+    def add_run(self, run: int, target, qps, p95):
+        self.runs[run] = (np.asarray(target, dtype=np.float64), np.asarray(qps, dtype=np.float64),
+                          np.asarray(p95, dtype=np.float64))
+        self.targets = None
+
+    @property
+    def num_runs(self) -> int:
+        return len(self.runs)
+
+    def align(self):
+        if self.targets is not None:
+            return
+        self.targets = np.unique(np.concatenate([target for target, _, _ in self.runs.values()]))
+        self.qps = np.full((self.num_runs, len(self.targets)), np.nan)
+        self.p95 = np.full((self.num_runs, len(self.targets)), np.nan)
+        for i, (target, qps, p95) in enumerate(self.runs.values()):
+            columns = np.searchsorted(self.targets, target)
+            self.qps[i, columns] = qps
+            self.p95[i, columns] = p95
+
+    def _errors(self, values: np.ndarray, mean: np.ndarray, error: str) -> np.ndarray:
+        count = np.sum(~np.isnan(values), axis=0)
+        if error == "std":
+            squares = np.nansum((values - mean) ** 2, axis=0)
+            return np.sqrt(np.divide(squares, count - 1, out=np.zeros_like(mean), where=count > 1))
+        if error == "maxdev":
+            return np.nanmax(np.abs(values - mean), axis=0)
+        if error == "ci":
+            # 95% percentile bootstrap over runs; returned as (below, above) distances for errorbar
+            picks = self.rng.integers(0, len(values), size=(self.num_bootstrap, len(values)))
+            # resamples that only picked runs missing a point give NaN for it
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                means = np.nanmean(values[picks], axis=1)
+                low, high = np.nanpercentile(means, [2.5, 97.5], axis=0)
+            return np.nan_to_num(np.stack([mean - low, high - mean]))
+        raise ValueError(f"unknown error kind {error}")
+
+    # error is "std", "maxdev" (max deviation from the mean) or "ci" (bootstrap 95% interval)
+    def compute_averages_and_errors(self, error: str = "std") -> tuple:
+        self.align()
+        qps_mean = np.nanmean(self.qps, axis=0)
+        p95_mean = np.nanmean(self.p95, axis=0)
+        return qps_mean, p95_mean, self._errors(self.qps, qps_mean, error), self._errors(self.p95, p95_mean, error)
+
+    def get_plot_values(self, error: str = "std") -> tuple:
+        return self.compute_averages_and_errors(error)
 
 
 def parse_mcperf_output(output_path: Path) -> dict:
@@ -86,75 +83,49 @@ def parse_mcperf_output(output_path: Path) -> dict:
     results = {} # key is a tuple of the form (num_threads, num_cores) and value is ResultData
 
     for file_result in file_results:
+        # skips the results_cache directory
+        if file_result.startswith("."):
+            continue
         split = file_result.split("-")
         if split[0] != "cpu":
             threads = int(split[2][-1])
             cores = int(split[3][-1])
             num_run = int(split[4][-1]) - 1
             if (threads, cores) not in results:
-                results[(threads, cores)] = McperfResultData(NUM_RUNS)
+                results[(threads, cores)] = McperfResultData()
             current_file = os.path.join(output_path, file_result)
-            with open(current_file, "r") as f:
-                lines = f.readlines()
-                for line in lines:
-                    line_split = line.split()
-                    if line_split[0] == "read":
-                        p95 = float(line_split[12])
-                        qps = float(line_split[16])
-                        results[(threads, cores)].add_qps(num_run, qps)
-                        results[(threads, cores)].add_p95(num_run, float(p95 / 1000))
+            columns = results_cache.load_mcperf(current_file)
+            results[(threads, cores)].add_run(num_run, columns["target"], columns["QPS"], columns["p95"] / 1000)
 
     return results
 
 
-def parse_cpu_util_output(data_file_path: Path) -> list:
-    reader = None
+def parse_cpu_util_output(data_file_path: Path) -> tuple:
     # format:
-    # [(ts, cpu)]
-    data = []
-    with open(data_file_path) as csv_file:
-        split = data_file_path.split("-")
-        num_cpus = int(split[3][0])
-        reader = csv.reader(csv_file, delimiter=',')
-        for row in reader:
-            # print(row)
-            if "time" not in row[0].lower():
-                total_cpu = float(row[1])
-                if total_cpu < 1.0:
-                    continue
-
-                ts = int(row[0])
-                if num_cpus == 1:   
-                    cpu = float(row[2])
-                elif num_cpus == 2:
-                    cpu = float(row[2]) + float(row[3])
-                # data["times"].append(ts)
-                # data["cpu"].append(cpu)
-                data.append((ts, cpu))
-    return data
-
-
-def parse_mcperf_timestamps(data_file_path: Path) -> list:
-    intervals = [] # list of tuples: (ts_start, ts_end)
-
-    with open(data_file_path, "r") as f:
-        lines = f.readlines()
-        for line in lines:
-            line_split = line.split()
-            if line_split[0] == "read":
-                ts_start = int(line_split[-2])
-                ts_end = int(line_split[-1])
-                intervals.append((ts_start, ts_end))
-    
-    return intervals
-
-
-def get_cpu_usage(data_path: Path) -> dict:
+    # (ts array, cpu array)
+    split = data_file_path.split("-")
+    num_cpus = int(split[3][0])
+    columns = results_cache.load_cpu_utilisation(data_file_path)
+    # samples with (almost) nothing running are dropped, memcached runs on the first num_cpus cores
+    busy = columns["total"] >= 1.0
+    return columns["ts"][busy], columns["cpu"][busy, :num_cpus].sum(axis=1)
+
+
+def parse_mcperf_timestamps(data_file_path: Path) -> tuple:
+    # (ts_start array, ts_end array)
+    columns = results_cache.load_mcperf(data_file_path)
+    return columns["ts_start"], columns["ts_end"]
+
+
+# agg is how the samples of one load interval are combined: max, mean or percentile (with q)
+def get_cpu_usage(data_path: Path, agg: str = "max", q: float = None, window: int = 4) -> dict:
     files = os.listdir(data_path)
     results = {}
 
     # parse files
     for file in files:
+        if file.startswith("."):
+            continue
         split = file.split("-")
         file_path = os.path.join(data_path, file)
         
@@ -182,59 +153,37 @@ def get_cpu_usage(data_path: Path) -> dict:
 
             results[(num_threads, num_cores)][num_run]["mcperf_timestamps"] = parsed_timestamps
 
-    # match cpu usage timestamps with mcperf load intervals
-    max_len = 0
+    # match cpu usage timestamps with mcperf load intervals, one value per interval and run
     for key in results:
-        cpu_usages = [[] for _ in range(NUM_RUNS)]
-        for num_run in results[key]:
-            idx = 0
-            for ts_start, ts_end in results[key][num_run]["mcperf_timestamps"]:
-                for ts, cpu in results[key][num_run]["cpu_util_timestamps"]:
-                    if ts >= ts_start and ts <= ts_end:
-                        if num_run > 0 and len(cpu_usages[num_run]) >= len(cpu_usages[num_run - 1]):
-                            break 
-                        if len(cpu_usages[num_run]) <= idx:
-                            cpu_usages[num_run].append(cpu)
-                        else:
-                            if cpu > cpu_usages[num_run][idx]:
-                                cpu_usages[num_run][idx] = cpu
-                idx += 1
-                        
-
-        if NUM_RUNS > 0:
-            for num_run in range(0, NUM_RUNS):
-                current_len = len(cpu_usages[num_run]) 
-                if current_len > max_len:
-                    max_len = current_len
-            for num_run in range(0, NUM_RUNS):
-                len_diff = abs(len(cpu_usages[num_run]) - max_len)
-                for _ in range(len_diff):
-                    cpu_usages[num_run].insert(0, 0)
-
-        # compute average 
-        cpu_usage_averages = [0 for _ in range(len(cpu_usages[0]))]
-        for i in range(len(cpu_usages[0])):
-            for num_run in range(NUM_RUNS):
-                cpu_usage_averages[i] += cpu_usages[num_run][i]
-        cpu_usage_averages = [val / NUM_RUNS for val in cpu_usage_averages]
-
-        # smoothen the curve
-        moving_averages = [cpu_usage_averages[0]]
-        for i in range(1, len(cpu_usage_averages)):
-             moving_averages.append(sum(cpu_usage_averages[max(0, i - 4):i]) / (i - max(0, i - 4)))
-
-        results[key]["cpu_usage"] = moving_averages
-        # results[key]["cpu_usage"] = cpu_usage_averages
+        per_run = []
+        for num_run in sorted(results[key]):
+            ts, cpu = results[key][num_run]["cpu_util_timestamps"]
+            starts, ends = results[key][num_run]["mcperf_timestamps"]
+            per_run.append(interval_join(ts, cpu, starts, ends, agg=agg, q=q))
+
+        # runs are aligned on the interval index (the same target QPS sequence); intervals a run
+        # has no samples for are left out of the average
+        num_intervals = max(len(usage) for usage in per_run)
+        cpu_usages = np.full((len(per_run), num_intervals), np.nan)
+        for num_run, usage in enumerate(per_run):
+            cpu_usages[num_run, :len(usage)] = usage
+        cpu_usage_averages = np.nanmean(cpu_usages, axis=0)
+
+        # smoothen the curve: every point after the first is the mean of the `window` intervals before it
+        moving_averages = np.concatenate((cpu_usage_averages[:1], rolling_mean(cpu_usage_averages, window)[:-1]))
+
+        results[key]["cpu_usage"] = moving_averages.tolist()
+        # results[key]["cpu_usage"] = cpu_usage_averages.tolist()
 
     return results
 
 
-def plot_41a(results: dict):
+def plot_41a(results: dict, error: str = "std", output: str = None):
     plt.figure(figsize=(14, 8))
     ax = plt.gca()
 
     for k in results:
-        x, y, xerr, yerr = results[k].get_plot_values()
+        x, y, xerr, yerr = results[k].get_plot_values(error)
         threads_label = "1 thread" if k[0] == 1 else "2 threads"
         cores_label = "1 core" if k[1] == 1 else "2 cores"
         plt.errorbar(x, y, yerr, xerr, capsize=4, elinewidth=1.5, markersize=4, label=f"{threads_label}, {cores_label}")
@@ -252,58 +201,68 @@ def plot_41a(results: dict):
     plt.grid(True)
     plt.tight_layout()
     plt.legend()
-    plt.show()
+    if output is None:
+        plt.show()
+    else:
+        plt.savefig(output, dpi=300)
 
 
 def plot_41d(mcperf_results: dict, cpu_usage_results: dict):
     for threads, cores in mcperf_results:
-        qps, p95, _, _ = mcperf_results[(threads, cores)].get_plot_values()
-        cpu_usage = cpu_usage_results[(threads, cores)]["cpu_usage"]
+        plot_41d_config(mcperf_results[(threads, cores)], cpu_usage_results[(threads, cores)]["cpu_usage"],
+                        threads, cores, f"part4_1d_{threads}_threads_{cores}_cores.png")
 
-        fig, ax1 = plt.subplots(figsize=(14, 8))
-        fig.set_dpi(300)
-        line1, = ax1.plot(qps, p95, "go-",  label='p95')
-        ax1.set_xlabel('QPS', fontsize=14)
-        ax1.set_ylabel('p95 [ms]', rotation=0, labelpad=40, fontsize=12)
-        ax1.tick_params(axis='y')
 
-        ax2 = ax1.twinx()
-        line2, = ax2.plot(qps, cpu_usage, "bs--", label='Cpu Usage')
-        ax2.set_ylabel('Cpu Usage', rotation=0, labelpad=40, fontsize=12)
-        ax2.tick_params(axis='y')
+def plot_41d_config(mcperf_result: McperfResultData, cpu_usage: list, threads: int, cores: int, output: str):
+    qps, p95, _, _ = mcperf_result.get_plot_values()
 
-        ax1.xaxis.set_major_locator(ticker.MultipleLocator(10000))
-        ax1.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x / 1000)}k"))
+    fig, ax1 = plt.subplots(figsize=(14, 8))
+    fig.set_dpi(300)
+    line1, = ax1.plot(qps, p95, "go-",  label='p95')
+    ax1.set_xlabel('QPS', fontsize=14)
+    ax1.set_ylabel('p95 [ms]', rotation=0, labelpad=40, fontsize=12)
+    ax1.tick_params(axis='y')
 
-        ax1.yaxis.set_major_locator(ticker.MultipleLocator(0.1))
-        ax1.yaxis.set_major_formatter(ticker.FormatStrFormatter("%.1f"))
+    ax2 = ax1.twinx()
+    line2, = ax2.plot(qps, cpu_usage, "bs--", label='Cpu Usage')
+    ax2.set_ylabel('Cpu Usage', rotation=0, labelpad=40, fontsize=12)
+    ax2.tick_params(axis='y')
 
-        ax2.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x)}%"))
-        ax2.set_ylim(0, cores * 100)
+    ax1.xaxis.set_major_locator(ticker.MultipleLocator(10000))
+    ax1.xaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x / 1000)}k"))
 
-        slo_line = ax1.axhline(y=0.8, color='red', linestyle='--', linewidth=1, label='SLO (0.8 ms)')
+    ax1.yaxis.set_major_locator(ticker.MultipleLocator(0.1))
+    ax1.yaxis.set_major_formatter(ticker.FormatStrFormatter("%.1f"))
 
-        ax1.tick_params(axis='y', labelsize=12)
-        ax1.tick_params(axis='x', labelsize=11)
-        ax2.tick_params(axis='y', labelsize=12)
+    ax2.yaxis.set_major_formatter(ticker.FuncFormatter(lambda x, _: f"{int(x)}%"))
+    ax2.set_ylim(0, cores * 100)
 
-        ax1.grid(True, which='both', axis='both')
+    slo_line = ax1.axhline(y=0.8, color='red', linestyle='--', linewidth=1, label='SLO (0.8 ms)')
 
-        handles = [line1, slo_line, line2]
-        labels = [h.get_label() for h in handles]
-        ax1.legend(handles, labels, loc='upper left', fontsize=12)
+    ax1.tick_params(axis='y', labelsize=12)
+    ax1.tick_params(axis='x', labelsize=11)
+    ax2.tick_params(axis='y', labelsize=12)
 
-        plt.xlim(0, 230000)
-        # plt.title(f"p95 and CPU Usage Versus QPS\n{threads} threads, {cores} cores\nAveraged over {NUM_RUNS} runs")
-        fig.tight_layout()  # To prevent label cutoff
+    ax1.grid(True, which='both', axis='both')
+
+    handles = [line1, slo_line, line2]
+    labels = [h.get_label() for h in handles]
+    ax1.legend(handles, labels, loc='upper left', fontsize=12)
+
+    plt.xlim(0, 230000)
+    # plt.title(f"p95 and CPU Usage Versus QPS\n{threads} threads, {cores} cores\nAveraged over {NUM_RUNS} runs")
+    fig.tight_layout()  # To prevent label cutoff
 
-        #plt.show()
-        plt.savefig(f"part4_1d_{threads}_threads_{cores}_cores.png", dpi=400)
+    #plt.show()
+    plt.savefig(output, dpi=400)
+    plt.close(fig)
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--part", "-p", help="Subpart for which to plot. Can be '1a' or '1d'.")
+    parser.add_argument("--error", choices=["std", "maxdev", "ci"], default="std",
+                        help="Error bars: standard deviation, max deviation or bootstrap 95%% CI over runs")
     args = parser.parse_args()
 
     if args.part is None:
@@ -316,7 +275,7 @@ def main():
         plot_41d(mcperf_results, cpu_usage_results)
     elif args.part == "1a":
         results = parse_mcperf_output(MCPERF_OUTPUT_1A_PATH)
-        plot_41a(results)
+        plot_41a(results, args.error)
     else:
         parser.print_help()
 
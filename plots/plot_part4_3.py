@@ -4,7 +4,8 @@ from matplotlib.ticker import FuncFormatter
 import numpy as np
 import pandas as pd
 from collections import defaultdict
-from datetime import datetime, timezone
+
+import results_cache
 
 JOB_COLORS = {
     "blackscholes": "#CCA000",
@@ -44,39 +45,29 @@ with open("../part4/results/subpart2/results-part4.2-16-05-2025-03-11.txt", "r")
     ts_end = int(lines[4].split()[-1])
     timestamps = [ts_start + offset for offset in interval_offsets]
 
-    for line in lines:
-         #print(line)
-         split = line.split()
-         if split and split[0] == "read":
-              p95.append(float(split[12]) / 1000)
-              qps.append(float(split[16]))
-
-
-with open("../part4/results/subpart2/container-runtime-16-05-2025-03-11.txt", "r") as f:
-        lines = f.readlines()
-        dt = datetime.fromisoformat((lines[0].split())[0]) 
-        dt = dt.replace(tzinfo=timezone.utc)
-        start_time_reference =  ts_start / 1000 # dt.timestamp()
+mcperf = results_cache.load_mcperf("../part4/results/subpart2/results-part4.2-16-05-2025-03-11.txt")
+p95 = (mcperf["p95"] / 1000).tolist()
+qps = mcperf["QPS"].tolist()
 
-        for line in lines[1:]:
-            lines_split = line.split()
 
-            timestamp = lines_split[0]
+log = results_cache.load_scheduler_log("../part4/results/subpart2/container-runtime-16-05-2025-03-11.txt")
+start_time_reference =  ts_start / 1000 # log["time"][0]
+event_names = log["event_names"].tolist()
+job_names = log["job_names"].tolist()
 
-            dt = datetime.fromisoformat(timestamp)
-            dt = dt.replace(tzinfo=timezone.utc)
-            started_at_ts = dt.timestamp()
+# the first event is the scheduler start
+for started_at_ts, event, job, args in zip(log["time"][1:].tolist(), log["event"][1:].tolist(),
+                                           log["job"][1:].tolist(), log["args"][1:].tolist()):
+    event, job = event_names[event], job_names[job]
 
-            if lines_split[1] == "cpu": continue
-
-            if lines_split[1] == "start":
-                 actions[lines_split[2]].append((started_at_ts-start_time_reference, int(lines_split[-1])))
-                
-            if lines_split[1] == "end":
-                 actions[lines_split[2]].append((started_at_ts-start_time_reference, -1))
-            
-            if lines_split[1] == "update_cores":
-                 actions[lines_split[2]].append((started_at_ts-start_time_reference, len(lines_split[-1].split(","))))
+    if event == "start":
+         actions[job].append((started_at_ts-start_time_reference, int(args.split()[-1])))
+        
+    if event == "end":
+         actions[job].append((started_at_ts-start_time_reference, -1))
+    
+    if event == "update_cores":
+         actions[job].append((started_at_ts-start_time_reference, len(args.split(","))))
 
 # for job in jobs:
 #      for action in actions[job]:
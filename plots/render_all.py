@@ -0,0 +1,233 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import runpy
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+
+# Renders every report figure headless (Agg) in a process pool. A figure is skipped when the hash
+# of its inputs (data files and the plotting code) matches the one recorded for its outputs in
+# output/.render-manifest.json. Run from the plots directory like the plot scripts themselves.
+
+PLOTS_DIR = Path(__file__).resolve().parent
+MANIFEST_PATH = Path("./output/.render-manifest.json")
+PART4_CODE = ["plot_part4.py", "results_cache.py", "interval_join.py"]
+
+
+class Figure:
+    # parses: (results_cache loader, path) pairs the render reads, for warming shared ones up front
+    def __init__(self, name: str, inputs: list, outputs: list, render, args: tuple, parses: list = ()):
+        self.name = name
+        self.inputs = [str(path) for path in inputs]
+        self.outputs = [str(path) for path in outputs]
+        self.render = render
+        self.args = args
+        self.parses = list(parses)
+
+    def input_hash(self) -> str:
+        digest = hashlib.sha256(self.name.encode())
+        for path in sorted(self.inputs):
+            digest.update(path.encode())
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+
+# renderers run in the worker processes, they import the plot scripts only after the backend is set
+
+def render_41a(data_path: str, output: str):
+    import plot_part4
+    plot_part4.plot_41a(plot_part4.parse_mcperf_output(data_path), output=output)
+
+
+def render_41d(data_path: str, threads: int, cores: int, output: str):
+    import plot_part4
+    mcperf_result = plot_part4.parse_mcperf_output(data_path)[(threads, cores)]
+    cpu_usage = plot_part4.get_cpu_usage(data_path)[(threads, cores)]["cpu_usage"]
+    plot_part4.plot_41d_config(mcperf_result, cpu_usage, threads, cores, output)
+
+
+def render_2b(data_path: str, output: str):
+    import plot_part2b
+    plot_part2b.plot(plot_part2b.get_data(data_path), output=output)
+
+
+def render_part1(data_path: str, output: str):
+    import plot_part1
+    plot_part1.plot(plot_part1.parse(data_path), output=output)
+
+
+def render_part3(mcperf_path: str, jobs_path: str, output_prefix: str):
+    import plot_part3
+    mcperf_data, time_reference, end_time_reference = plot_part3.parse_mcperf_output(mcperf_path)
+    jobs_data = plot_part3.parse_jobs_json(jobs_path, time_reference, end_time_reference)
+    plot_part3.plot(mcperf_data, jobs_data, time_reference, end_time_reference, output_prefix=output_prefix)
+
+
+def render_script(script: str):
+    runpy.run_path(script, run_name="__main__")
+
+
+def _part4_parses(data_dir: Path) -> list:
+    # plot_part4 parses every run file of the directory, not just one configuration's
+    return [("load_cpu_utilisation" if p.name.startswith("cpu") else "load_mcperf", str(p))
+            for p in sorted(data_dir.iterdir()) if p.is_file() and not p.name.startswith(".")]
+
+
+def discover() -> list:
+    figures = []
+
+    data_1a = Path("./data/part4/1a/")
+    if data_1a.is_dir():
+        inputs = sorted(p for p in data_1a.iterdir() if p.is_file() and not p.name.startswith("."))
+        figures.append(Figure("part4_1a", inputs + PART4_CODE, ["./output/part4/part4_1a.png"],
+                              render_41a, (str(data_1a), "./output/part4/part4_1a.png"), _part4_parses(data_1a)))
+
+    data_1d = Path("./data/part4/1d/")
+    if data_1d.is_dir():
+        inputs = sorted(p for p in data_1d.iterdir() if p.is_file() and not p.name.startswith("."))
+        configs = sorted({(int(m.group(1)), int(m.group(2))) for p in inputs
+                          for m in [re.search(r"threads(\d)-cores(\d)", p.name)] if m})
+        for threads, cores in configs:
+            # the mcperf and cpu-utilisation files of this configuration
+            config_inputs = [p for p in inputs if f"threads{threads}-cores{cores}" in p.name
+                             or f"{threads}threads-{cores}cpu" in p.name]
+            output = f"./output/part4/part4_1d_{threads}_threads_{cores}_cores.png"
+            figures.append(Figure(f"part4_1d_{threads}_{cores}", config_inputs + PART4_CODE, [output],
+                                  render_41d, (str(data_1d), threads, cores, output), _part4_parses(data_1d)))
+
+    part2b = Path("./data/part2/part2b-output-28-04-2025-19-16.csv")
+    if part2b.is_file():
+        figures.append(Figure("part2b", [part2b, "plot_part2b.py"], ["./output/part2/part2b.png"],
+                              render_2b, (str(part2b), "./output/part2/part2b.png")))
+
+    part1 = Path("data.txt")
+    if part1.is_file():
+        figures.append(Figure("part1", [part1, "plot_part1.py", "results_cache.py"], ["./output/part1/plot_a.png"],
+                              render_part1, (str(part1), "./output/part1/plot_a.png")))
+
+    part3_mcperf = Path("./data/part3/memcached_results.txt")
+    part3_jobs = Path("./data/part3/res.json")
+    if part3_mcperf.is_file() and part3_jobs.is_file():
+        figures.append(Figure("part3", [part3_mcperf, part3_jobs, "plot_part3.py", "results_cache.py"],
+                              ["./output/part3/part3_latency.png", "./output/part3/part3_jobs.png"],
+                              render_part3, (str(part3_mcperf), str(part3_jobs), "./output/part3/part3")))
+
+    # plot_part4_3 is a script with its inputs hard-coded, it saves both figures itself
+    script = Path("plot_part4_3.py")
+    part4_3_inputs = [Path("../part4/results/subpart2/results-part4.2-16-05-2025-03-11.txt"),
+                      Path("../part4/results/subpart2/container-runtime-16-05-2025-03-11.txt")]
+    if all(p.is_file() for p in part4_3_inputs):
+        figures.append(Figure("part4_3", part4_3_inputs + [script, "results_cache.py"],
+                              ["./output/part4/Plot_4_3_A.png", "./output/part4/Plot_4_3_B.png"],
+                              render_script, (str(script),)))
+
+    return figures
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _render(figure: Figure) -> float:
+    import matplotlib.pyplot as plt
+    for output in figure.outputs:
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    begin = time.perf_counter()
+    figure.render(*figure.args)
+    plt.close("all")
+    return time.perf_counter() - begin
+
+
+def warm_cache(figures: list) -> None:
+    # parses the inputs several renders share once, serially, so the workers only read the cache
+    import results_cache
+    counts = dict()
+    for figure in figures:
+        for parse in figure.parses:
+            counts[parse] = counts.get(parse, 0) + 1
+    shared = [parse for parse, count in counts.items() if count > 1]
+    begin = time.perf_counter()
+    for loader, path in shared:
+        getattr(results_cache, loader)(path)
+    if shared:
+        print(f"warmed the cache for {len(shared)} shared inputs in {time.perf_counter() - begin:.2f} s")
+
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest: dict) -> None:
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def is_current(figure: Figure, input_hash: str, manifest: dict) -> bool:
+    return all(os.path.exists(output) and manifest.get(output) == input_hash for output in figure.outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--force", action="store_true", default=False, help="Render even unchanged figures")
+    parser.add_argument("--only", nargs="+", default=None, help="Only render figures with these names")
+    parser.add_argument("--list", action="store_true", default=False, help="List discovered figures and exit")
+    args = parser.parse_args()
+
+    os.chdir(PLOTS_DIR)
+    os.environ["MPLBACKEND"] = "Agg"
+
+    figures = discover()
+    if args.only is not None:
+        figures = [figure for figure in figures if figure.name in args.only]
+    if args.list:
+        for figure in figures:
+            print(f"{figure.name}: {', '.join(figure.outputs)}")
+        return
+
+    manifest = load_manifest()
+    pending = []
+    for figure in figures:
+        input_hash = figure.input_hash()
+        if not args.force and is_current(figure, input_hash, manifest):
+            print(f"{figure.name:>16}: up to date")
+            continue
+        pending.append((figure, input_hash))
+
+    begin = time.perf_counter()
+    warm_cache([figure for figure, _ in pending])
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), initializer=_init_worker) as pool:
+        futures = {pool.submit(_render, figure): (figure, input_hash) for figure, input_hash in pending}
+        for future in as_completed(futures):
+            figure, input_hash = futures[future]
+            try:
+                took = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{figure.name:>16}: failed: {e!r}")
+                continue
+            for output in figure.outputs:
+                manifest[output] = input_hash
+            print(f"{figure.name:>16}: {took:6.2f} s")
+    save_manifest(manifest)
+
+    print(f"rendered {len(pending) - failed} of {len(figures)} figures in {time.perf_counter() - begin:.2f} s"
+          + (f", {failed} failed" if failed else ""))
+
+
+if __name__ == "__main__":
+    main()
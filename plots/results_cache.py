@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+
+# Parses mcperf output, scheduler logs and cpu-utilisation csvs once into typed column arrays and
+# caches them as .npz in a .cache directory next to the source file, keyed by the content hash.
+# Repeat loads read the npz instead of splitting text.
+
+CACHE_DIR = ".cache"
+CACHE_VERSION = 1
+
+MCPERF_COLUMNS = ["avg", "std", "min", "p5", "p10", "p50", "p67", "p75", "p80", "p85", "p90", "p95", "p99",
+                  "p999", "p9999", "QPS", "target", "ts_start", "ts_end"]
+TS_COLUMNS = ("ts_start", "ts_end")
+NUM_VALUES = len(MCPERF_COLUMNS) - len(TS_COLUMNS)
+SCHEDULER_EVENTS = ["start", "end", "update_cores", "pause", "unpause", "cpu %", "custom"]
+
+
+def _content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def _cached(path, kind: str, parse) -> dict:
+    path = Path(path)
+    cache_dir = path.parent / CACHE_DIR
+    cache_file = cache_dir / f"{path.name}.{kind}.{_content_hash(path)}.v{CACHE_VERSION}.npz"
+    if cache_file.exists():
+        with np.load(cache_file) as npz:
+            return {key: npz[key] for key in npz.files}
+
+    columns = parse(path)
+    cache_dir.mkdir(exist_ok=True)
+    # stale entries for an older version of the same file; other processes may be rendering from the
+    # same file, so never touch the current entry and tolerate entries that vanish under us
+    for old in cache_dir.glob(f"{path.name}.{kind}.*.npz"):
+        if old.name != cache_file.name:
+            try:
+                old.unlink()
+            except FileNotFoundError:
+                pass
+    # a temp file of our own, renamed into place atomically
+    with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=f"{cache_file.name}.", suffix=".tmp", delete=False) as tmp:
+        np.savez(tmp, **columns)
+    os.replace(tmp.name, cache_file)
+    return columns
+
+
+def parse_mcperf(path: Path) -> dict:
+    # one row per "read" line; timestamps are ms since the epoch, -1 where mcperf did not print them.
+    # "task" lines (part 1) split the file into sections, section_names holds their titles.
+    columns = MCPERF_COLUMNS
+    rows, ts_rows, sections = [], [], []
+    section_names = [""]
+    header = {"timestamp_start": -1, "timestamp_end": -1}
+    with open(path, "r") as f:
+        for line in f:
+            split = line.split()
+            if not split:
+                continue
+            if split[0] == "#type":
+                columns = split[1:]
+            elif split[0] == "task":
+                section_names.append(" ".join(split[1:]))
+            elif split[0] == "read":
+                rows.append([float(v) for v in split[1:NUM_VALUES + 1]])
+                ts = [int(v) for v in split[NUM_VALUES + 1:]]
+                ts_rows.append(ts + [-1] * (len(TS_COLUMNS) - len(ts)))
+                sections.append(len(section_names) - 1)
+            else:
+                match = re.match(r"Timestamp (start|end):\s+(\d+)", line)
+                if match:
+                    header[f"timestamp_{match.group(1)}"] = int(match.group(2))
+
+    if columns[:NUM_VALUES] != MCPERF_COLUMNS[:NUM_VALUES]:
+        raise ValueError(f"{path}: unexpected mcperf columns {columns}")
+
+    values = np.array(rows, dtype=np.float64).reshape(-1, NUM_VALUES)
+    timestamps = np.array(ts_rows, dtype=np.int64).reshape(-1, len(TS_COLUMNS))
+    result = {name: values[:, i] for i, name in enumerate(MCPERF_COLUMNS[:NUM_VALUES])}
+    result.update({name: timestamps[:, i] for i, name in enumerate(TS_COLUMNS)})
+    result["section"] = np.array(sections, dtype=np.int32)
+    result["section_names"] = np.array(section_names)
+    result.update({key: np.int64(value) for key, value in header.items()})
+    return result
+
+
+def _epoch_s(timestamp: str) -> float:
+    # the controller logs naive timestamps, the VMs run on UTC
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+def parse_scheduler_log(path: Path) -> dict:
+    # events: time (epoch s), event and job as indices into event_names / job_names, args as text.
+    # "cpu %" events are also unpacked into cpu_time and a (samples x cores) cpu matrix.
+    times, events, jobs, args = [], [], [], []
+    job_names = []
+    cpu_time, cpu = [], []
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("{"):
+                # BufferedSchedulerLogger jsonl
+                record = json.loads(line)
+                ts, event, job, arg = record["epoch_ns"] / 1e9, record["event"], record["job"], record["args"]
+            else:
+                split = line.split()
+                if not split:
+                    continue
+                # "cpu %" is the only event with a space in it
+                n = 3 if split[1] == "cpu" else 2
+                ts, event, job, arg = _epoch_s(split[0]), " ".join(split[1:n]), split[n], " ".join(split[n + 1:])
+            if job not in job_names:
+                job_names.append(job)
+            times.append(ts)
+            events.append(SCHEDULER_EVENTS.index(event))
+            jobs.append(job_names.index(job))
+            args.append(arg)
+            if event == "cpu %":
+                cpu_time.append(ts)
+                cpu.append([float(c) for c in arg.split(",")])
+
+    num_cores = max((len(c) for c in cpu), default=0)
+    cpu_matrix = np.full((len(cpu), num_cores), np.nan)
+    for i, row in enumerate(cpu):
+        cpu_matrix[i, :len(row)] = row
+    return {
+        "time": np.array(times, dtype=np.float64),
+        "event": np.array(events, dtype=np.int8),
+        "job": np.array(jobs, dtype=np.int16),
+        "args": np.array(args, dtype=str),
+        "event_names": np.array(SCHEDULER_EVENTS),
+        "job_names": np.array(job_names, dtype=str),
+        "cpu_time": np.array(cpu_time, dtype=np.float64),
+        "cpu": cpu_matrix,
+    }
+
+
+def parse_cpu_utilisation(path: Path) -> dict:
+    # "Time (s), CPU TOTAL, CPU 0, ..." with ms timestamps; cpu is (samples x cores)
+    data = np.genfromtxt(path, delimiter=",", skip_header=1, dtype=np.float64, ndmin=2)
+    return {
+        "ts": data[:, 0].astype(np.int64),
+        "total": data[:, 1],
+        "cpu": data[:, 2:],
+    }
+
+
+def load_mcperf(path) -> dict:
+    return _cached(path, "mcperf", parse_mcperf)
+
+
+def load_scheduler_log(path) -> dict:
+    return _cached(path, "log", parse_scheduler_log)
+
+
+def load_cpu_utilisation(path) -> dict:
+    return _cached(path, "cpu", parse_cpu_utilisation)
@@ -0,0 +1,199 @@
+from enum import Enum
+
+
+class ActionType(Enum):
+    GROW_MEMCACHED = "grow_memcached"
+    SHRINK_MEMCACHED = "shrink_memcached"
+    ADD_CORE = "add_core"
+    REMOVE_CORE = "remove_core"
+    PAUSE = "pause"
+    UNPAUSE = "unpause"
+    START_NEXT = "start_next"
+
+
+class Action:
+    def __init__(self, kind: ActionType, job_name: str = None, core: str = None):
+        self.kind = kind
+        self.job_name = job_name
+        self.core = core
+
+    def __eq__(self, other):
+        return (self.kind, self.job_name, self.core) == (other.kind, other.job_name, other.core)
+
+    def __repr__(self):
+        return f"Action({self.kind.value}, {self.job_name}, {self.core})"
+
+
+class Observation:
+    # memcached_cpu is what the policy should act on (the forecast when forecasting is enabled),
+    # measured_memcached_cpu is always the last sample. host_memcached_cpu is the busy time of
+    # memcached's cores, which includes batch jobs sharing core 1; it equals the measurement
+    # unless memcached's own threads are accounted. p95_ms / predicted_p95_ms come from the live
+    # mcperf feed and are None without one (or when it went quiet)
+    def __init__(self, now: float, cpu_per_core: list, memcached_cpu: float, memcached_cores: int, running_jobs: list,
+                 measured_memcached_cpu: float = None, host_memcached_cpu: float = None,
+                 p95_ms: float = None, predicted_p95_ms: float = None):
+        self.now = now
+        self.cpu_per_core = cpu_per_core
+        self.memcached_cpu = memcached_cpu
+        self.measured_memcached_cpu = measured_memcached_cpu if measured_memcached_cpu is not None else memcached_cpu
+        self.host_memcached_cpu = host_memcached_cpu if host_memcached_cpu is not None else self.measured_memcached_cpu
+        self.memcached_cores = memcached_cores
+        self.running_jobs = running_jobs
+        self.p95_ms = p95_ms
+        self.predicted_p95_ms = predicted_p95_ms
+
+
+class Policy:
+    # maps one observation to the actions the controller should apply, in order
+    def decide(self, obs: Observation) -> list:
+        raise NotImplementedError
+
+
+class HysteresisPolicy(Policy):
+    # the thresholds the controller has been tuned with; the gaps between them are the hysteresis bands
+    def __init__(self, shared_core_jobs: list, grow_above=60, shrink_below=80, share_up_to=140, reclaim_above=191):
+        self.shared_core_jobs = shared_core_jobs
+        self.grow_above = grow_above
+        self.shrink_below = shrink_below
+        self.share_up_to = share_up_to
+        self.reclaim_above = reclaim_above
+
+    def decide(self, obs: Observation) -> list:
+        sharing_jobs = [job_name for job_name in obs.running_jobs if job_name in self.shared_core_jobs]
+        if not sharing_jobs:
+            if obs.memcached_cores == 1:
+                return [Action(ActionType.GROW_MEMCACHED)]
+            return []
+
+        if obs.memcached_cores == 1:
+            if obs.memcached_cpu > self.grow_above:
+                return [Action(ActionType.GROW_MEMCACHED)]
+            return []
+
+        if obs.memcached_cpu < self.shrink_below:
+            return [Action(ActionType.SHRINK_MEMCACHED)] + [Action(ActionType.ADD_CORE, j, "1") for j in sharing_jobs]
+        if obs.memcached_cpu <= self.share_up_to:
+            return [Action(ActionType.ADD_CORE, j, "1") for j in sharing_jobs]
+        if obs.memcached_cpu > self.reclaim_above:
+            return [Action(ActionType.REMOVE_CORE, j, "1") for j in sharing_jobs]
+        return []
+
+
+class PidPolicy(Policy):
+    # keeps memcached's per-core utilisation near target; the error is expressed in cores.
+    # target < 2 * deadband * 100 / kp, otherwise a shrink lands straight above the grow threshold
+    def __init__(self, shared_core_jobs: list, target=60, kp=1.0, ki=0.5, kd=0.2, deadband=0.35, max_integral=1.0):
+        self.shared_core_jobs = shared_core_jobs
+        self.target = target
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.deadband = deadband
+        self.max_integral = max_integral
+        self.integral = 0.0
+        self.prev_error = None
+        self.prev_time = None
+
+    def reset(self):
+        self.integral = 0.0
+        self.prev_error = None
+
+    def decide(self, obs: Observation) -> list:
+        sharing_jobs = [job_name for job_name in obs.running_jobs if job_name in self.shared_core_jobs]
+        if not sharing_jobs:
+            self.reset()
+            if obs.memcached_cores == 1:
+                return [Action(ActionType.GROW_MEMCACHED)]
+            return []
+
+        error = (obs.memcached_cpu - self.target * obs.memcached_cores) / 100
+        dt = obs.now - self.prev_time if self.prev_time is not None else 0.0
+        self.prev_time = obs.now
+
+        derivative = 0.0
+        if dt > 0:
+            self.integral = max(-self.max_integral, min(self.max_integral, self.integral + error * dt))
+            if self.prev_error is not None:
+                derivative = (error - self.prev_error) / dt
+        self.prev_error = error
+        output = self.kp * error + self.ki * self.integral + self.kd * derivative
+
+        if obs.memcached_cores == 1 and output > self.deadband:
+            self.reset()
+            return [Action(ActionType.GROW_MEMCACHED)] + [Action(ActionType.REMOVE_CORE, j, "1") for j in sharing_jobs]
+        if obs.memcached_cores == 2 and output < -self.deadband:
+            self.reset()
+            return [Action(ActionType.SHRINK_MEMCACHED)] + [Action(ActionType.ADD_CORE, j, "1") for j in sharing_jobs]
+        return []
+
+
+class SloGuardPolicy(Policy):
+    # wraps a CPU policy with the actual objective: when the measured or predicted p95 gets within
+    # grow_at of the SLO memcached gets both cores to itself for at least hold seconds (the latency
+    # drops as soon as it has them, which must not hand core 1 straight back), and it is not shrunk
+    # again until the latency is back below release_below of the SLO
+    def __init__(self, inner: Policy, shared_core_jobs: list, slo_ms=0.8, grow_at=0.8, release_below=0.5, hold=30):
+        self.inner = inner
+        self.shared_core_jobs = shared_core_jobs
+        self.slo_ms = slo_ms
+        self.grow_at = grow_at
+        self.release_below = release_below
+        self.hold = hold
+        self.hold_until = None
+
+    def decide(self, obs: Observation) -> list:
+        actions = self.inner.decide(obs)
+        latencies = [p for p in (obs.p95_ms, obs.predicted_p95_ms) if p is not None]
+        if not latencies:
+            return actions
+        p95 = max(latencies)
+
+        if p95 > self.grow_at * self.slo_ms:
+            self.hold_until = obs.now + self.hold
+            reclaim = [Action(ActionType.REMOVE_CORE, j, "1") for j in obs.running_jobs if j in self.shared_core_jobs]
+            if obs.memcached_cores == 1:
+                return [Action(ActionType.GROW_MEMCACHED)] + reclaim
+            keep = [a for a in actions if a.kind not in (ActionType.SHRINK_MEMCACHED, ActionType.ADD_CORE)]
+            return keep + [a for a in reclaim if a not in keep]
+        if self.hold_until is not None and obs.now < self.hold_until:
+            return [a for a in actions if a.kind not in (ActionType.SHRINK_MEMCACHED, ActionType.ADD_CORE)]
+        if p95 > self.release_below * self.slo_ms:
+            return [a for a in actions if a.kind != ActionType.SHRINK_MEMCACHED]
+        return actions
+
+
+# controller is anything with the Controller actuation methods (the real one or the simulator's)
+def apply_action(controller, action: Action) -> None:
+    match action.kind:
+        case ActionType.GROW_MEMCACHED:
+            controller.expand_memcached_to_2_cores()
+        case ActionType.SHRINK_MEMCACHED:
+            controller.constrain_memcached_to_1_core()
+        case ActionType.ADD_CORE:
+            controller.add_core(action.job_name, action.core)
+        case ActionType.REMOVE_CORE:
+            controller.remove_core(action.job_name, action.core)
+        case ActionType.PAUSE:
+            controller.pause_container(action.job_name)
+        case ActionType.UNPAUSE:
+            controller.unpause_container(action.job_name)
+        case ActionType.START_NEXT:
+            controller.schedule_next_job(action.core)
+
+
+POLICIES = ["hysteresis", "pid"]
+
+
+# slo_ms wraps the policy in an SloGuardPolicy fed by mcperf latency reports
+def make_policy(name: str, shared_core_jobs: list, slo_ms: float = None) -> Policy:
+    match name:
+        case "hysteresis":
+            policy = HysteresisPolicy(shared_core_jobs)
+        case "pid":
+            policy = PidPolicy(shared_core_jobs)
+        case _:
+            raise ValueError(f"unknown policy {name}")
+    if slo_ms is not None:
+        policy = SloGuardPolicy(policy, shared_core_jobs, slo_ms=slo_ms)
+    return policy
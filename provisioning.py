@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+
+
+class Provisioner:
+    # pulls missing images and creates the job containers in the background; each job
+    # becomes ready as soon as its own image is there and its container exists
+    def __init__(self, docker_client, container_info: dict, create_fn, max_workers: int = 4, on_created=None):
+        self.docker_client = docker_client
+        self.container_info = container_info
+        self.create_fn = create_fn
+        self.on_created = on_created
+        # separate pools so container creation waiting on a pull can never starve the pulls
+        self.pull_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pull")
+        self.create_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="create")
+        self.images = dict()
+        self.jobs = dict()
+        self.started_at = None
+        self.ready_at = dict()
+        self.pulled = list()
+
+    def image_present(self, image: str) -> bool:
+        try:
+            local = self.docker_client.images.get(image)
+        except docker.errors.ImageNotFound:
+            return False
+        # an image without a repo digest was built or tagged locally, not pulled from the registry
+        return bool(local.attrs.get("RepoDigests"))
+
+    def _ensure_image(self, image: str) -> None:
+        if self.image_present(image):
+            return
+        print(f"pulling image {image}")
+        self.docker_client.images.pull(image)
+        self.pulled.append(image)
+
+    def _create(self, job_name: str, image_future) -> None:
+        image_future.result()
+        info = self.container_info[job_name]
+        container = self.create_fn(info["image"], job_name, info["cpuset_cpus"], info["num_threads"])
+        if container is not None and self.on_created is not None:
+            self.on_created(container)
+        self.ready_at[job_name] = time.perf_counter()
+
+    def start(self) -> None:
+        self.started_at = time.perf_counter()
+        for job_name, info in self.container_info.items():
+            image = info["image"]
+            if image not in self.images:
+                self.images[image] = self.pull_executor.submit(self._ensure_image, image)
+            self.jobs[job_name] = self.create_executor.submit(self._create, job_name, self.images[image])
+
+    def wait_ready(self, job_name: str) -> None:
+        self.jobs[job_name].result()
+
+    def wait_all(self) -> None:
+        for job_name in self.jobs:
+            self.wait_ready(job_name)
+        self.pull_executor.shutdown()
+        self.create_executor.shutdown()
+
+    def report(self, first_job: str) -> None:
+        print(f"time to first job ({first_job}): {self.ready_at[first_job] - self.started_at:.2f} s")
+        print(f"total provisioning time: {max(self.ready_at.values()) - self.started_at:.2f} s, "
+              f"pulled {len(self.pulled)} of {len(self.images)} images")
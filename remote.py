@@ -0,0 +1,246 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+ZONE = "europe-west1-b"
+SSH_KEY_FILE = "~/.ssh/cloud-computing"
+USER = "ubuntu"
+
+
+class SubprocessRunner:
+    def run(self, argv: list, **kwargs) -> subprocess.CompletedProcess:
+        return subprocess.run(argv, **kwargs)
+
+    def popen(self, argv: list, **kwargs) -> subprocess.Popen:
+        return subprocess.Popen(argv, **kwargs)
+
+
+class FakeProcess:
+    def __init__(self, argv: list):
+        self.args = argv
+        self.returncode = 0
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def terminate(self):
+        pass
+
+    def kill(self):
+        pass
+
+
+class FakeRunner:
+    # records argvs instead of running them; opening a connection (a gcloud call or an ssh master)
+    # sleeps connect_cost, a command over an open master sleeps command_cost
+    def __init__(self, connect_cost: float = 0.5, command_cost: float = 0.01):
+        self.connect_cost = connect_cost
+        self.command_cost = command_cost
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _cost(self, argv: list) -> float:
+        return self.connect_cost if argv[0] == "gcloud" or "-M" in argv else self.command_cost
+
+    def run(self, argv: list, **kwargs) -> subprocess.CompletedProcess:
+        with self.lock:
+            self.calls.append(argv)
+        time.sleep(self._cost(argv))
+        return subprocess.CompletedProcess(argv, 0, "" if kwargs.get("text") else b"", "")
+
+    def popen(self, argv: list, **kwargs) -> FakeProcess:
+        with self.lock:
+            self.calls.append(argv)
+        return FakeProcess(argv)
+
+
+class GcloudSession:
+    # a fresh gcloud compute ssh/scp process, and so a fresh connection, for every call
+    def __init__(self, vm: str, runner, zone: str = ZONE, key_file: str = SSH_KEY_FILE, user: str = USER):
+        self.vm = vm
+        self.runner = runner
+        self.zone = zone
+        self.key_file = key_file
+        self.user = user
+
+    def open(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def _gcloud_args(self) -> list:
+        return ["--zone", self.zone, "--ssh-key-file", self.key_file]
+
+    def ssh_argv(self, command: str, quiet: bool = False) -> list:
+        return (["gcloud", "compute", "ssh", f"{self.user}@{self.vm}"] + self._gcloud_args()
+                + (["--quiet"] if quiet else []) + ["--command", command])
+
+    def scp_argv(self, sources: list, destination: str) -> list:
+        return ["gcloud", "compute", "scp"] + sources + [destination] + self._gcloud_args()
+
+    def remote_path(self, path: str) -> str:
+        return f"{self.user}@{self.vm}:{path}"
+
+
+class MultiplexedSession(GcloudSession):
+    # one ssh ControlMaster per VM, opened through gcloud so it still installs the key and the host
+    # key; commands and scp then reuse the master's connection over its control socket. With an
+    # address (e.g. "localhost" for a local sshd) the master is opened with plain ssh instead.
+    def __init__(self, vm: str, runner, control_dir: str, zone: str = ZONE, key_file: str = SSH_KEY_FILE,
+                 user: str = USER, address: str = None):
+        super().__init__(vm, runner, zone, key_file, user)
+        self.control_path = os.path.join(control_dir, vm)
+        self.address = address
+        self.is_open = False
+
+    def _master_options(self) -> list:
+        return ["-M", "-N", "-f", "-o", f"ControlPath={self.control_path}",
+                "-o", "ServerAliveInterval=30", "-o", "ServerAliveCountMax=10"]
+
+    def _client_options(self) -> list:
+        return ["-o", f"ControlPath={self.control_path}", "-o", "ControlMaster=no", "-o", "BatchMode=yes"]
+
+    def _host(self) -> str:
+        return self.address if self.address is not None else self.vm
+
+    def open(self) -> None:
+        if self.address is None:
+            argv = (["gcloud", "compute", "ssh", f"{self.user}@{self.vm}"] + self._gcloud_args()
+                    + ["--quiet", "--"] + self._master_options())
+        else:
+            argv = (["ssh", "-i", os.path.expanduser(self.key_file), "-o", "StrictHostKeyChecking=accept-new"]
+                    + self._master_options() + [f"{self.user}@{self.address}"])
+        self.runner.run(argv, check=True)
+        self.is_open = True
+
+    def close(self) -> None:
+        if self.is_open:
+            self.runner.run(["ssh"] + self._client_options() + ["-O", "exit", f"{self.user}@{self._host()}"],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            self.is_open = False
+
+    def ssh_argv(self, command: str, quiet: bool = False) -> list:
+        return ["ssh"] + self._client_options() + (["-q"] if quiet else []) + [f"{self.user}@{self._host()}", command]
+
+    def scp_argv(self, sources: list, destination: str) -> list:
+        return ["scp", "-q"] + self._client_options() + sources + [destination]
+
+    def remote_path(self, path: str) -> str:
+        return f"{self.user}@{self._host()}:{path}"
+
+
+class RemotePool:
+    # one session per VM for the whole experiment; run/popen/put/get are safe to call from several
+    # threads, parallel() runs independent steps (zero-argument callables) concurrently
+    def __init__(self, multiplexed: bool = True, runner=None, zone: str = ZONE, key_file: str = SSH_KEY_FILE,
+                 user: str = USER, addresses: dict = None, max_workers: int = 8):
+        self.multiplexed = multiplexed
+        self.runner = runner if runner is not None else SubprocessRunner()
+        self.zone = zone
+        self.key_file = key_file
+        self.user = user
+        self.addresses = addresses if addresses is not None else dict()
+        # unix socket paths are limited to ~100 characters, keep them short
+        self.control_dir = tempfile.mkdtemp(prefix="ssh-") if multiplexed else None
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.sessions = dict()
+        self.lock = threading.Lock()
+        self.session_locks = dict()
+        # per VM: seconds spent opening the connection, operations over it
+        self.setup_time = dict()
+        self.operations = dict()
+        self.call_time = 0.0
+        self.parallel_work = 0.0
+        self.parallel_wall = 0.0
+
+    def session(self, vm: str) -> GcloudSession:
+        with self.lock:
+            session_lock = self.session_locks.setdefault(vm, threading.Lock())
+        # opening one VM's master must not block the others
+        with session_lock:
+            if vm in self.sessions:
+                return self.sessions[vm]
+            if self.multiplexed:
+                session = MultiplexedSession(vm, self.runner, self.control_dir, self.zone, self.key_file,
+                                             self.user, self.addresses.get(vm))
+            else:
+                session = GcloudSession(vm, self.runner, self.zone, self.key_file, self.user)
+            start = time.perf_counter()
+            session.open()
+            with self.lock:
+                self.setup_time[vm] = time.perf_counter() - start
+                self.operations[vm] = 0
+                self.sessions[vm] = session
+            return session
+
+    def _timed(self, vm: str, call, argv: list, **kwargs):
+        start = time.perf_counter()
+        result = call(argv, **kwargs)
+        with self.lock:
+            self.operations[vm] += 1
+            self.call_time += time.perf_counter() - start
+        return result
+
+    def run(self, vm: str, command: str, **kwargs) -> subprocess.CompletedProcess:
+        return self._timed(vm, self.runner.run, self.session(vm).ssh_argv(command), **kwargs)
+
+    # a long running remote command, e.g. an mcperf agent
+    def popen(self, vm: str, command: str, **kwargs):
+        return self._timed(vm, self.runner.popen, self.session(vm).ssh_argv(command, quiet=True), **kwargs)
+
+    def put(self, vm: str, local, remote: str = "~/", **kwargs) -> subprocess.CompletedProcess:
+        session = self.session(vm)
+        sources = [local] if isinstance(local, str) else list(local)
+        return self._timed(vm, self.runner.run, session.scp_argv(sources, session.remote_path(remote)), **kwargs)
+
+    def get(self, vm: str, remote: str, local: str, **kwargs) -> subprocess.CompletedProcess:
+        session = self.session(vm)
+        return self._timed(vm, self.runner.run, session.scp_argv([session.remote_path(remote)], local), **kwargs)
+
+    def parallel(self, *steps) -> list:
+        def timed(step):
+            start = time.perf_counter()
+            try:
+                return step()
+            finally:
+                with self.lock:
+                    self.parallel_work += time.perf_counter() - start
+
+        start = time.perf_counter()
+        futures = [self.executor.submit(timed, step) for step in steps]
+        # wait for every step before raising so none is left running unobserved
+        results = [future.exception() or future.result() for future in futures]
+        self.parallel_wall += time.perf_counter() - start
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def report(self) -> None:
+        opened = sum(self.setup_time.values())
+        operations = sum(self.operations.values())
+        print(f"remote: {len(self.sessions)} sessions opened in {opened:.1f} s, "
+              f"{operations} operations took {self.call_time:.1f} s")
+        if self.multiplexed:
+            # without the pool every operation pays the connection setup once more
+            saved = sum(self.setup_time[vm] * max(0, self.operations[vm] - 1) for vm in self.sessions)
+            print(f"remote: reusing connections saved ~{saved:.1f} s of setup")
+        if self.parallel_work > 0:
+            print(f"remote: {self.parallel_work:.1f} s of independent steps ran in {self.parallel_wall:.1f} s, "
+                  f"saved {self.parallel_work - self.parallel_wall:.1f} s")
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+        for session in self.sessions.values():
+            session.close()
+        if self.control_dir is not None:
+            shutil.rmtree(self.control_dir, ignore_errors=True)
@@ -1,10 +1,12 @@
 import os
-import subprocess
 import re
 import time
 from datetime import datetime
 from collections import defaultdict
 
+import cluster
+import manifests
+
 env = os.environ.copy()
 
 env["PROJECT"] = "cca-eth-2025-group-008"
@@ -45,6 +47,8 @@ config = {
 
 NUM_RUNS = 1
 
+templates = manifests.TemplateRenderer("part3")
+
 def is_job_completed(kubectl_output):
     lines = kubectl_output.strip().splitlines()
     if len(lines) < 2:
@@ -88,25 +92,9 @@ def write_run_data(filename, no_threads, job_name, real_time, user_time, sys_tim
         f.write(line)
 
 def update_template(filename, node_label, cores):
-    script_dir = os.path.dirname(__file__)
-    rel_path = f"part3/{filename}-template.yaml"
-    abs_file_path = os.path.join(script_dir, rel_path)
-
-    with open(abs_file_path) as f:
-        schemas = f.read() 
-    
+    # rendered in memory, nothing is written to part3/
     num_threads = len(cores.split(','))
-
-    schemas = schemas.replace("<n>", str(num_threads))
-    schemas = schemas.replace("<node_label>", node_label)
-    schemas = schemas.replace("<cores>", cores)
-
-    script_dir = os.path.dirname(__file__)
-    rel_path = f"part3/{filename}.yaml"
-    abs_file_path = os.path.join(script_dir, rel_path)
-
-    with open(abs_file_path, "w") as f:
-        f.write(schemas)
+    return templates.render(filename, n=num_threads, node_label=node_label, cores=cores)
 
 if __name__ == '__main__':
     # Init steps
@@ -140,7 +128,7 @@ if __name__ == '__main__':
     #     update_template(job, config[job][0], config[job][1])
     # update_template("memcached", config["memcached"][0], config["memcached"][1])
 
-    # subprocess.run(["kubectl", "create", "-f", f"part3/memcached.yaml"], env=env, check=True)
+    # k8s.create(update_template("memcached", config["memcached"][0], config["memcached"][1]))
     # subprocess.run(["kubectl", "expose", "pod", "some-memcached", "--name", "some-memcached-11211",
     #                 "--type", "LoadBalancer", "--port", "11211", "--protocol", "TCP"], env=env, check=True)
 
@@ -199,6 +187,8 @@ if __name__ == '__main__':
     # print("Started mcperf in client Measure")
 
 
+    k8s = cluster.make_cluster(env=env)
+
     # Run the processes
     for i in range(NUM_RUNS):
         completed_jobs = set()
@@ -206,11 +196,8 @@ if __name__ == '__main__':
 
 
         for job in jobs:
-            result = subprocess.run(
-                ["kubectl", "get", "job", job, "-o", "jsonpath={.status.succeeded}"],
-                capture_output=True, text=True
-            )
-            print(result.stdout.strip())
+            status = (k8s.get("jobs", job) or {}).get("status", {})
+            print(status.get("succeeded", ""))
             
         
             
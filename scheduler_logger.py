@@ -1,5 +1,10 @@
 from datetime import datetime
 from enum import Enum
+import atexit
+import json
+import signal
+import threading
+import time
 import urllib.parse
 
 
@@ -18,13 +23,14 @@ class Job(Enum):
 
 
 class SchedulerLogger:
-    def __init__(self, file):
+    def __init__(self, file, clock=datetime.now):
         self.file = open(file, "w")
+        self.clock = clock
         self._log("start", Job.SCHEDULER)
 
     def _log(self, event: str, job_name: Job, args: str = "") -> None:
         self.file.write(
-            LOG_STRING.format(timestamp=datetime.now().isoformat(), event=event, job_name=job_name.value,
+            LOG_STRING.format(timestamp=self.clock().isoformat(), event=event, job_name=job_name.value,
                               args=args).strip() + "\n")
 
     def job_start(self, job: Job, initial_cores: list[str], initial_threads: int) -> None:
@@ -62,3 +68,113 @@ class SchedulerLogger:
         self._log("end", Job.SCHEDULER)
         self.file.flush()
         self.file.close()
+
+
+class BufferedSchedulerLogger(SchedulerLogger):
+    # events are only recorded on the calling thread (two clock reads and an append); formatting and
+    # writing happen in large batches on a background thread, after flush_interval seconds or once
+    # max_batch events are pending. Each event keeps a monotonic and an epoch timestamp in ns.
+    # log_format "text" writes the SchedulerLogger lines, "jsonl" one json object per event.
+    # Job ends are written right away; SIGTERM (e.g. a pkill of the driver) exits like Ctrl-C does,
+    # so the atexit close() still writes whatever is buffered.
+    def __init__(self, file, log_format: str = "text", flush_interval: float = 1.0, max_batch: int = 4096):
+        if log_format not in ("text", "jsonl"):
+            raise ValueError(f"unknown log format {log_format}")
+        self.file = open(file, "w")
+        self.log_format = log_format
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.batch = []
+        self.closed = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="scheduler-logger", daemon=True)
+        self._thread.start()
+        # the daemon thread dies with the interpreter, whatever is still buffered is written here
+        atexit.register(self.close)
+        # only where nobody else handles SIGTERM, and signal handlers can only be set from the main thread
+        self._sigterm_installed = (threading.current_thread() is threading.main_thread()
+                                   and signal.getsignal(signal.SIGTERM) == signal.SIG_DFL)
+        if self._sigterm_installed:
+            signal.signal(signal.SIGTERM, self._on_sigterm)
+        self._log("start", Job.SCHEDULER)
+
+    @staticmethod
+    def _on_sigterm(signum, frame):
+        raise SystemExit(128 + signum)
+
+    def _log(self, event: str, job_name: Job, args: str = "") -> None:
+        record = (time.monotonic_ns(), time.time_ns(), event, job_name, args)
+        with self._cond:
+            if self.closed:
+                return
+            self.batch.append(record)
+            if len(self.batch) >= self.max_batch:
+                self._cond.notify()
+
+    # the cpu list is joined on the writer thread
+    def log_cpu_utilisation(self, job: Job, cpu: list):
+        self._log("cpu %", job, tuple(cpu))
+
+    def _format(self, record) -> str:
+        monotonic_ns, epoch_ns, event, job_name, args = record
+        if isinstance(args, tuple):
+            args = ",".join([str(c) for c in args])
+        if self.log_format == "jsonl":
+            return json.dumps({"monotonic_ns": monotonic_ns, "epoch_ns": epoch_ns, "event": event,
+                               "job": job_name.value, "args": args}) + "\n"
+        timestamp = datetime.fromtimestamp(epoch_ns / 1e9).isoformat()
+        return LOG_STRING.format(timestamp=timestamp, event=event, job_name=job_name.value, args=args).strip() + "\n"
+
+    # writing a batch under one lock keeps batches in order between the thread and flush(); records
+    # leave the buffer only once written, so an exception (SIGTERM, Ctrl-C) halfway loses none
+    def flush(self) -> None:
+        with self._write_lock:
+            with self._cond:
+                batch = list(self.batch)
+            if batch:
+                self.file.write("".join(self._format(record) for record in batch))
+                self.file.flush()
+                with self._cond:
+                    del self.batch[:len(batch)]
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self.closed and len(self.batch) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                if self.closed:
+                    return
+            self.flush()
+
+    def close(self) -> None:
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+        self.file.close()
+        atexit.unregister(self.close)
+        if self._sigterm_installed and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    def job_end(self, job: Job) -> None:
+        super().job_end(job)
+        self.flush()
+
+    def end(self) -> None:
+        self._log("end", Job.SCHEDULER)
+        self.close()
+
+
+def make_logger(file, backend: str = "text", log_format: str = "text") -> SchedulerLogger:
+    match backend:
+        case "text":
+            if log_format != "text":
+                raise ValueError("the text backend only writes the text format")
+            return SchedulerLogger(file)
+        case "buffered":
+            return BufferedSchedulerLogger(file, log_format=log_format)
+    raise ValueError(f"unknown logger backend {backend}")
@@ -0,0 +1,307 @@
+import argparse
+import bisect
+import copy
+import csv
+import math
+import os
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import forecasting
+import job_config
+import policies
+import scheduler_logger
+import slo_feed
+
+
+SLO_P95_MS = slo_feed.SLO_P95_MS
+QPS_INTERVAL = 10  # seconds, --qps_interval of the dynamic load runs
+
+
+def parse_mcperf_reads(path: str) -> list:
+    # [(p95 ms, measured qps, target qps, ts_start, ts_end)]; the timestamps are None for dynamic runs
+    rows = []
+    with open(path, "r") as f:
+        for line in f:
+            report = slo_feed.parse_read_line(line)
+            if report is not None:
+                rows.append((report.p95_ms, report.qps, report.target, report.ts_start, report.ts_end))
+    return rows
+
+
+class LoadTrace:
+    def __init__(self, ts_start_ms: int, targets: list, interval: float = QPS_INTERVAL):
+        self.ts_start_ms = ts_start_ms
+        self.targets = targets
+        self.interval = interval
+
+    @classmethod
+    def from_mcperf(cls, path: str):
+        with open(path, "r") as f:
+            ts_start_ms = int(re.search(r"Timestamp start:\s+(\d+)", f.read()).group(1))
+        return cls(ts_start_ms, [target for _, _, target, _, _ in parse_mcperf_reads(path)])
+
+    @property
+    def duration(self) -> float:
+        return len(self.targets) * self.interval
+
+    # past the end of the recorded trace the load wraps around
+    def qps_at(self, t: float) -> float:
+        return self.targets[int(t // self.interval) % len(self.targets)]
+
+
+def _interpolate(points: list, x: float) -> float:
+    xs = [p[0] for p in points]
+    i = bisect.bisect_left(xs, x)
+    if i == 0:
+        return points[0][1]
+    if i == len(points):
+        return points[-1][1]
+    (x0, y0), (x1, y1) = points[i - 1], points[i]
+    return y0 + (y1 - y0) * (x - x0) / (x1 - x0)
+
+
+def _parse_cpu_utilisation(path: str, num_cpus: int) -> list:
+    # measure-cpu-utilisation.sh output: ts, total, cpu0, cpu1, ...
+    samples = []
+    with open(path) as csv_file:
+        for row in csv.reader(csv_file, delimiter=','):
+            if "time" in row[0].lower():
+                continue
+            samples.append((int(row[0]), sum(float(c) for c in row[2:2 + num_cpus])))
+    return samples
+
+
+class MemcachedModel:
+    # p95 and memcached cpu as a function of qps with 1 or 2 cores, from the part 4.1d runs
+    # (mcperf results plus measure-cpu-utilisation.sh logs, memcached alone on the machine)
+    def __init__(self, latency: dict, saturation: dict, cpu_fit: dict):
+        self.latency = latency          # cores -> sorted [(qps, p95 ms)]
+        self.saturation = saturation    # cores -> highest qps memcached actually delivered
+        self.cpu_fit = cpu_fit          # cores -> (cpu % per qps, intercept)
+
+    @classmethod
+    def from_runs(cls, directory: str):
+        latency = defaultdict(list)
+        cpu_points = defaultdict(list)
+        for name in sorted(os.listdir(directory)):
+            match = re.match(r"results-part4\.1-threads\d+-cores(\d+)-run(\d+)", name)
+            if match is None:
+                continue
+            cores, run = int(match.group(1)), match.group(2)
+            reads = parse_mcperf_reads(os.path.join(directory, name))
+            latency[cores].extend((qps, p95) for p95, qps, _, _, _ in reads)
+
+            cpu_logs = [n for n in os.listdir(directory) if n.startswith(f"cpu-utilisation-") and f"-{cores}cpu-run{run}-" in n]
+            if not cpu_logs:
+                continue
+            cpu = _parse_cpu_utilisation(os.path.join(directory, cpu_logs[0]), cores)
+            for _, qps, _, ts_start, ts_end in reads:
+                in_window = [c for ts, c in cpu if ts_start <= ts <= ts_end]
+                if in_window:
+                    cpu_points[cores].append((qps, max(in_window)))
+
+        saturation = {cores: max(q for q, _ in points) for cores, points in latency.items()}
+        latency = {cores: sorted(points) for cores, points in latency.items()}
+        cpu_fit = {cores: _linear_fit(points) for cores, points in cpu_points.items()}
+        return cls(latency, saturation, cpu_fit)
+
+    def cpu(self, qps: float, cores: int) -> float:
+        slope, intercept = self.cpu_fit[cores]
+        return max(0.0, min(100.0 * cores, slope * qps + intercept))
+
+    # effective_cores may be fractional when a batch job shares one of memcached's cores
+    def p95(self, qps: float, effective_cores: float) -> float:
+        lo, hi = math.floor(effective_cores), math.ceil(effective_cores)
+        if lo == hi:
+            return self._p95(qps, lo)
+        w = effective_cores - lo
+        return (1 - w) * self._p95(qps, lo) + w * self._p95(qps, hi)
+
+    def _p95(self, qps: float, cores: int) -> float:
+        if qps > self.saturation[cores]:
+            return math.inf
+        return _interpolate(self.latency[cores], qps)
+
+
+def _linear_fit(points: list) -> tuple:
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in points) / var if var else 0.0
+    return slope, mean_y - slope * mean_x
+
+
+class JobModel:
+    # part2b runtimes, {job: [(threads, real seconds)]}; parallelism is capped by the cores a job holds
+    def __init__(self, runtimes: dict):
+        self.runtimes = runtimes
+
+    @classmethod
+    def from_csv(cls, path: str):
+        runtimes = defaultdict(list)
+        with open(path) as csv_file:
+            for row in csv.reader(csv_file, delimiter=','):
+                runtimes[row[1]].append((int(row[0]), float(row[2])))
+        return cls({job: sorted(points) for job, points in runtimes.items()})
+
+    def runtime(self, job: str, threads: int, cores: int) -> float:
+        return _interpolate(self.runtimes[job], min(threads, max(cores, 1)))
+
+
+class SimulatedController:
+    # the actuation surface of controller.Controller on simulated state, driven by the same policies
+    def __init__(self, logger, policy: str, forecast_horizon=None, forecast_threshold=60, slo_ms=None):
+        self.logger = logger
+        self.container_info = copy.deepcopy(job_config.CONTAINER_INFO)
+        self.three_core_jobs = list(job_config.THREE_CORE_JOBS)
+        self.policy = policies.make_policy(policy, self.three_core_jobs, slo_ms=slo_ms)
+        self.memcached_num_cores = 2
+        self.cpusets = dict()
+        self.paused = set()
+        self.forecast_horizon = forecast_horizon
+        self.forecaster = None
+        if forecast_horizon is not None:
+            self.forecaster = forecasting.HoltForecaster()
+            self.forecast_evaluator = forecasting.ForecastEvaluator(forecast_horizon, forecast_threshold)
+
+    def expand_memcached_to_2_cores(self):
+        self.memcached_num_cores = 2
+        self.logger.update_cores(scheduler_logger.Job.MEMCACHED, ["0", "1"])
+
+    def constrain_memcached_to_1_core(self):
+        self.memcached_num_cores = 1
+        self.logger.update_cores(scheduler_logger.Job.MEMCACHED, ["0"])
+
+    def add_core(self, container, core):
+        cores = self.cpusets[container]
+        if str(core) not in cores:
+            self.cpusets[container] = cores + [str(core)]
+            self.logger.update_cores(scheduler_logger.Job(container), self.cpusets[container])
+
+    def remove_core(self, container, core):
+        cores = self.cpusets[container]
+        if str(core) in cores:
+            self.cpusets[container] = [c for c in cores if c != str(core)]
+            self.logger.update_cores(scheduler_logger.Job(container), self.cpusets[container])
+
+    def pause_container(self, job_name: str):
+        self.paused.add(job_name)
+        self.logger.job_pause(scheduler_logger.Job(job_name))
+
+    def unpause_container(self, job_name: str):
+        self.paused.discard(job_name)
+        self.logger.job_unpause(scheduler_logger.Job(job_name))
+
+    def schedule_next_job(self, core: str):
+        pass
+
+    def control_step(self, now: float, running_jobs: list, cpu_per_core: list, p95_ms: float = None):
+        memcached_cpu = cpu_per_core[0] if self.memcached_num_cores == 1 else cpu_per_core[0] + cpu_per_core[1]
+        demand = memcached_cpu
+        if self.forecaster is not None:
+            self.forecaster.update(now, memcached_cpu)
+            demand = max(0.0, self.forecaster.forecast(self.forecast_horizon))
+            self.forecast_evaluator.observe(now, memcached_cpu, demand, self.memcached_num_cores)
+        obs = policies.Observation(now, cpu_per_core, demand, self.memcached_num_cores, running_jobs,
+                                   measured_memcached_cpu=memcached_cpu, p95_ms=p95_ms)
+        for action in self.policy.decide(obs):
+            policies.apply_action(self, action)
+
+
+def simulate(trace: LoadTrace, memcached: MemcachedModel, jobs: JobModel, log_file: str,
+             policy="hysteresis", forecast_horizon=None, period=1.0, slo_guard=False) -> dict:
+    start = datetime.fromtimestamp(trace.ts_start_ms / 1000, timezone.utc).replace(tzinfo=None)
+    now = 0.0
+    logger = scheduler_logger.SchedulerLogger(log_file, clock=lambda: start + timedelta(seconds=now))
+    sim = SimulatedController(logger, policy, forecast_horizon, slo_ms=SLO_P95_MS if slo_guard else None)
+
+    pending = list(sim.container_info)
+    current, progress = None, 0.0
+    violated_intervals = set()
+    makespan = 0.0
+
+    while pending or current is not None:
+        if current is None:
+            current, progress = pending.pop(0), 0.0
+            sim.cpusets[current] = sim.container_info[current]["cpuset_cpus"].split(",")
+            logger.job_start(scheduler_logger.Job(current), sim.cpusets[current], sim.container_info[current]["num_threads"])
+
+        cores = sim.cpusets[current]
+        shares_core_1 = "1" in cores and current not in sim.paused and sim.memcached_num_cores == 2
+        qps = trace.qps_at(now)
+        memcached_cpu = memcached.cpu(qps, sim.memcached_num_cores)
+        # what the controller would read from /proc/stat: a batch job on core 1 fills it up
+        cpu_per_core = [min(100.0, memcached_cpu), max(0.0, memcached_cpu - 100.0), 0.0, 0.0]
+        if shares_core_1:
+            cpu_per_core[1] = 100.0
+        for core in cores:
+            if core in ("2", "3") and current not in sim.paused:
+                cpu_per_core[int(core)] = 100.0
+
+        effective_cores = sim.memcached_num_cores - 0.5 if shares_core_1 else sim.memcached_num_cores
+        p95_ms = memcached.p95(qps, effective_cores)
+        if p95_ms > SLO_P95_MS:
+            violated_intervals.add(int(now // trace.interval))
+
+        logger.log_cpu_utilisation(scheduler_logger.Job.MEMCACHED, [round(c, 1) for c in cpu_per_core])
+        # with the guard the policy sees the latency mcperf would report, as with --mcperf-file
+        sim.control_step(now, [current], cpu_per_core, p95_ms if slo_guard else None)
+
+        rate = 0.0
+        if current not in sim.paused:
+            threads = sim.container_info[current]["num_threads"]
+            rate = 1.0 / jobs.runtime(current, threads, len(sim.cpusets[current]))
+        if progress + rate * period >= 1.0:
+            now += (1.0 - progress) / rate
+            makespan = now
+            logger.job_end(scheduler_logger.Job(current))
+            current = None
+        else:
+            progress += rate * period
+            now += period
+
+    logger.job_end(scheduler_logger.Job.MEMCACHED)
+    logger.end()
+
+    result = {
+        "makespan": makespan,
+        "intervals": math.ceil(makespan / trace.interval),
+        "slo_violations": len(violated_intervals),
+    }
+    if sim.forecaster is not None:
+        result["forecast"] = sim.forecast_evaluator.summary()
+    return result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trace", required=True, help="mcperf dynamic load output, e.g. results-part4.2-*.txt")
+    parser.add_argument("--memcached-runs", default="part4/results/subpart1d",
+                        help="Directory with part 4.1d mcperf results and cpu-utilisation logs")
+    parser.add_argument("--runtimes", default="part2b-output-28-04-2025-19-16.csv", help="part2b output csv")
+    parser.add_argument("--policy", choices=policies.POLICIES, default="hysteresis")
+    parser.add_argument("--forecast-horizon", type=float, default=None)
+    parser.add_argument("--slo-guard", action="store_true", default=False,
+                        help="Also feed the simulated p95 to the policy, like a live mcperf feed")
+    parser.add_argument("--period", type=float, default=1.0, help="Control period in seconds")
+    parser.add_argument("--log", default="simulated-container-runtime.txt", help="Synthetic scheduler log")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = simulate(LoadTrace.from_mcperf(args.trace), MemcachedModel.from_runs(args.memcached_runs),
+                      JobModel.from_csv(args.runtimes), args.log, policy=args.policy,
+                      forecast_horizon=args.forecast_horizon, period=args.period,
+                      slo_guard=args.slo_guard)
+    print(f"makespan: {result['makespan']:.1f} s")
+    print(f"SLO violations: {result['slo_violations']} of {result['intervals']} intervals")
+    if "forecast" in result:
+        print(f"forecast: {result['forecast']}")
+
+
+if __name__ == "__main__":
+    main()
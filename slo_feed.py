@@ -0,0 +1,168 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+
+import forecasting
+
+
+SLO_P95_MS = 0.8
+
+
+class McperfReport:
+    def __init__(self, p95_ms: float, qps: float, target: float, ts_start=None, ts_end=None):
+        self.p95_ms = p95_ms
+        self.qps = qps
+        self.target = target
+        self.ts_start = ts_start
+        self.ts_end = ts_end
+
+    def __repr__(self):
+        return f"McperfReport(p95={self.p95_ms:.3f} ms, qps={self.qps:.0f}, target={self.target:.0f})"
+
+
+# one "read" line of mcperf output, None for headers and anything else; latencies are printed in us
+def parse_read_line(line: str):
+    split = line.split()
+    if len(split) < 18 or split[0] != "read":
+        return None
+    try:
+        ts = (int(split[18]), int(split[19])) if len(split) >= 20 else (None, None)
+        return McperfReport(float(split[12]) / 1000, float(split[16]), float(split[17]), *ts)
+    except ValueError:
+        # a line caught half written
+        return None
+
+
+class FileTailSource:
+    # follows a local mcperf output file like tail -F: waits for it to appear and reopens it when truncated
+    def __init__(self, path: str, poll: float = 0.2, from_start: bool = False):
+        self.path = path
+        self.poll = poll
+        self.from_start = from_start
+        self._stop = threading.Event()
+
+    def lines(self):
+        f = None
+        partial = ""
+        try:
+            while not self._stop.is_set():
+                if f is None:
+                    try:
+                        f = open(self.path, "r")
+                    except FileNotFoundError:
+                        self._stop.wait(self.poll)
+                        continue
+                    if not self.from_start:
+                        f.seek(0, os.SEEK_END)
+                    # a file recreated later is read from its start
+                    self.from_start = True
+
+                chunk = f.readline()
+                if chunk:
+                    partial += chunk
+                    if partial.endswith("\n"):
+                        yield partial
+                        partial = ""
+                    continue
+
+                if os.path.exists(self.path) and os.path.getsize(self.path) < f.tell():
+                    f.close()
+                    f, partial = None, ""
+                    continue
+                self._stop.wait(self.poll)
+        finally:
+            if f is not None:
+                f.close()
+
+    def close(self):
+        self._stop.set()
+
+
+class SocketSource:
+    # accepts line streams on a TCP port, e.g. from the client-measure VM:
+    #   tail -F results.txt | nc <memcached server> <port>
+    def __init__(self, port: int, host: str = "0.0.0.0"):
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.5)
+        self._stop = threading.Event()
+
+    @property
+    def port(self) -> int:
+        return self.server.getsockname()[1]
+
+    def lines(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            # a dropped connection is expected when mcperf is restarted, wait for the next one
+            with conn, conn.makefile("r") as stream:
+                for line in stream:
+                    yield line
+                    if self._stop.is_set():
+                        return
+
+    def close(self):
+        self._stop.set()
+        self.server.close()
+
+
+class McperfFeed:
+    # tails mcperf reports from a source on a background thread and keeps the recent p95/qps stream
+    def __init__(self, source, history: int = 64, max_age: float = 30.0, clock=time.monotonic):
+        self.source = source
+        self.max_age = max_age
+        self.clock = clock
+        # (arrival time, report); mcperf prints one line per qps interval
+        self.reports = deque(maxlen=history)
+        self.trend = forecasting.HoltForecaster(alpha=0.6, beta=0.4)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def feed(self, line: str) -> None:
+        report = parse_read_line(line)
+        if report is None:
+            return
+        now = self.clock()
+        with self._lock:
+            self.reports.append((now, report))
+            self.trend.update(now, report.p95_ms)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="mcperf-feed", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.source.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        for line in self.source.lines():
+            self.feed(line)
+
+    # the last report, None if nothing arrived within max_age seconds
+    def latest(self):
+        with self._lock:
+            if not self.reports or self.clock() - self.reports[-1][0] > self.max_age:
+                return None
+            return self.reports[-1][1]
+
+    def predicted_p95(self, horizon: float):
+        if self.latest() is None:
+            return None
+        with self._lock:
+            return max(0.0, self.trend.forecast(horizon))
+
+
+def make_source(path: str = None, port: int = None):
+    if path is not None:
+        return FileTailSource(path)
+    if port is not None:
+        return SocketSource(port)
+    return None
@@ -0,0 +1,182 @@
+import csv
+import re
+import threading
+import time
+from collections import defaultdict
+
+import cluster
+import k8s_watch
+
+
+# Runs the part 2a interference x job x run matrix on several parsec nodes at once. Every node (a
+# shard) gets its own ibench pod; the cells of one interference run together on one node, so an
+# interference is set up once per group. Groups are handed to whichever node is free next,
+# longest expected first, and within a group the longest jobs go first. Expected runtimes come
+# from earlier part2a csvs. Rows go to one csv as they finish:
+#   interference,job,real,user,sys,node,run
+
+JOB_MANIFEST = "parsec-benchmarks/part2a/parsec-{job}.yaml"
+INTERFERENCE_MANIFEST = "interference_parsec/ibench-{interference}.yaml"
+SHARD_LABEL = "cca-project-shard"
+
+
+class Cell:
+    def __init__(self, interference, job: str, run: int, expected: float):
+        self.interference = interference
+        self.job = job
+        self.run = run
+        self.expected = expected
+
+    def __repr__(self):
+        return f"Cell({self.interference}, {self.job}, run {self.run}, ~{self.expected:.1f} s)"
+
+
+def _interference(value: str):
+    return None if value == "None" else value
+
+
+def load_prior(paths: list) -> dict:
+    # {(interference, job): [real times]} from part2a csvs, with or without the provenance columns
+    prior = defaultdict(list)
+    for path in paths:
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) >= 3:
+                    prior[(_interference(row[0]), row[1])].append(float(row[2]))
+    return prior
+
+
+def expected_runtime(prior: dict, interference, job: str, default: float = 60.0) -> float:
+    if prior.get((interference, job)):
+        times = prior[(interference, job)]
+    else:
+        # the job under any interference, then anything at all
+        times = [t for (_, j), ts in prior.items() if j == job for t in ts]
+        times = times or [t for ts in prior.values() for t in ts]
+    return sum(times) / len(times) if times else default
+
+
+def done_cells(path: str) -> set:
+    # (interference, job, run) already in an output csv, to resume an interrupted sweep
+    try:
+        with open(path, newline="") as f:
+            return {(_interference(row[0]), row[1], int(row[6])) for row in csv.reader(f) if len(row) >= 7}
+    except FileNotFoundError:
+        return set()
+
+
+def plan(interferences: list, jobs: list, runs: int, prior: dict, done: set = frozenset()) -> list:
+    # [(interference, [cells])] for the cells still to run, longest expected group and job first
+    groups = []
+    for interference in interferences:
+        cells = [Cell(interference, job, run, expected_runtime(prior, interference, job))
+                 for job in jobs for run in range(runs) if (interference, job, run) not in done]
+        if cells:
+            cells.sort(key=lambda cell: cell.expected, reverse=True)
+            groups.append((interference, cells))
+    groups.sort(key=lambda group: sum(cell.expected for cell in group[1]), reverse=True)
+    return groups
+
+
+def predicted_makespan(groups: list, shards: int) -> float:
+    # groups go to the node that frees up first, like ShardedSweep hands them out
+    ready = [0.0] * max(1, shards)
+    for _, cells in groups:
+        i = ready.index(min(ready))
+        ready[i] += sum(cell.expected for cell in cells)
+    return max(ready)
+
+
+def shard_manifest(manifest: str, shard: int) -> str:
+    # pins a job or ibench manifest to one parsec node and makes its name unique to that node
+    _, name = cluster.manifest_meta(manifest)
+    manifest = re.sub(rf"^(\s*name:\s*)\"?{re.escape(name)}\"?\s*$", rf"\g<1>{name}-{shard}", manifest, flags=re.M)
+    manifest, pinned = re.subn(r"^(\s*)(cca-project-nodetype:.*)$", rf'\1\2\n\1{SHARD_LABEL}: "{shard}"', manifest,
+                               count=1, flags=re.M)
+    if not pinned:
+        raise ValueError(f"{name} has no cca-project-nodetype node selector to pin it with")
+    return manifest
+
+
+class ShardedSweep:
+    # nodes: the parsec node names, node i labelled cca-project-shard=i. parse_times turns job logs
+    # into (real, user, sys); record(output, interference, job, real, user, sys, node, run) writes a row
+    def __init__(self, k8s: cluster.Cluster, jobs_watch: k8s_watch.ResourceWatch,
+                 pods_watch: k8s_watch.ResourceWatch, nodes: list, output: str, parse_times, record,
+                 job_manifest=None, interference_manifest=None):
+        self.k8s = k8s
+        self.jobs_watch = jobs_watch
+        self.pods_watch = pods_watch
+        self.nodes = nodes
+        self.output = output
+        self.parse_times = parse_times
+        self.record = record
+        self.job_manifest = job_manifest or (lambda job: cluster.load_manifest(JOB_MANIFEST.format(job=job)))
+        self.interference_manifest = interference_manifest or (
+            lambda interference: cluster.load_manifest(INTERFERENCE_MANIFEST.format(interference=interference)))
+        self.groups = []
+        self.lock = threading.Lock()
+        self.errors = []
+        # per node: seconds busy running cells
+        self.busy = defaultdict(float)
+
+    def _next_group(self):
+        with self.lock:
+            return self.groups.pop(0) if self.groups and not self.errors else None
+
+    def _run_cell(self, shard: int, cell: Cell) -> None:
+        manifest = shard_manifest(self.job_manifest(cell.job), shard)
+        _, job_name = cluster.manifest_meta(manifest)
+        self.k8s.create(manifest)
+        self.jobs_watch.wait_for(job_name, k8s_watch.job_completed, failed=k8s_watch.job_failed)
+        pod_name = self.k8s.pod_names("job-name=" + job_name)[0]
+        real, user, sys = self.parse_times(self.k8s.logs(pod_name))
+        self.jobs_watch.forget(job_name)
+        self.k8s.delete("jobs", job_name)
+        with self.lock:
+            self.record(self.output, cell.interference, cell.job, real, user, sys, self.nodes[shard], cell.run)
+
+    def _run_shard(self, shard: int) -> None:
+        try:
+            while (group := self._next_group()) is not None:
+                interference, cells = group
+                start = time.monotonic()
+                pod_name = None
+                if interference is not None:
+                    manifest = shard_manifest(self.interference_manifest(interference), shard)
+                    _, pod_name = cluster.manifest_meta(manifest)
+                    self.k8s.create(manifest)
+                    self.pods_watch.wait_for(pod_name, k8s_watch.pod_ready)
+                    print(f"{self.nodes[shard]}: {pod_name} ready")
+                for cell in cells:
+                    self._run_cell(shard, cell)
+                if pod_name is not None:
+                    self.pods_watch.forget(pod_name)
+                    self.k8s.delete("pods", pod_name)
+                self.busy[self.nodes[shard]] += time.monotonic() - start
+                print(f"{self.nodes[shard]}: finished interference {interference} in {time.monotonic() - start:.0f} s")
+        except Exception as e:
+            # the other nodes finish their group and stop
+            with self.lock:
+                self.errors.append(e)
+            raise
+
+    def run(self, groups: list) -> None:
+        if not self.nodes:
+            raise ValueError("the sweep needs at least one parsec node")
+        self.groups = list(groups)
+        cells = sum(len(cells) for _, cells in groups)
+        print(f"{cells} cells in {len(groups)} interference groups on {len(self.nodes)} nodes, "
+              f"predicted {predicted_makespan(groups, len(self.nodes)):.0f} s "
+              f"(serially {predicted_makespan(groups, 1):.0f} s)")
+        start = time.monotonic()
+        threads = [threading.Thread(target=self._run_shard, args=(shard,), name=f"shard-{shard}")
+                   for shard in range(len(self.nodes))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+        print(f"sweep took {time.monotonic() - start:.0f} s; busy per node: "
+              + ", ".join(f"{node} {seconds:.0f} s" for node, seconds in self.busy.items()))
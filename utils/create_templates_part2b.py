@@ -1,11 +1,16 @@
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import manifests
 
 jobs = ["blackscholes", "canneal", "dedup", "ferret", "freqmine", "radix", "vips"] 
 
 for job in jobs:
     jobname = f"parsec-{job}"
 
-    script_dir = os.path.dirname(__file__)
+    script_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
     rel_path = f"parsec-benchmarks/part2b/{jobname}.yaml"
     abs_file_path = os.path.join(script_dir, rel_path)
 
@@ -13,8 +18,10 @@ for job in jobs:
         schemas = f.read()
 
     schemas = schemas.replace("-n 1", "-n <n>")
+    # fails if the replace above matched nothing
+    manifests.Template(schemas, jobname, required=("n",))
 
-    script_dir = os.path.dirname(__file__)
+    script_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
     rel_path = f"parsec-benchmarks/part2b/{jobname}-template.yaml"
     abs_file_path = os.path.join(script_dir, rel_path)
 